@@ -0,0 +1,303 @@
+# ruff: noqa: T201
+"""
+Benchmark of the Snakemake DAG construction. For each size a synthetic production
+is generated: a DAQ tree of empty files named by get_pattern_tier_daq, the raw
+and dsp tiers named by get_pattern_tier, an ignored_cycles.yaml and a validity
+catalog. Snakemake is then run in dry-run mode for the autogen_output target
+under cProfile, in a fresh interpreter for each size, and the time is broken
+down by hadesflow function. The results are written as JSON so that runs can
+be compared.
+
+    python benchmarks/bench_dag.py --cycles 1000 10000 100000 --output dag.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import pstats
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import yaml
+
+from hadesflow.methods.FileKey import FileKey
+from hadesflow.methods.patterns import get_pattern_tier, get_pattern_tier_daq
+from hadesflow.methods.utils import convert_to_daq_run, convert_to_daq_timestamp
+
+repo = Path(__file__).resolve().parents[1]
+
+measurements = ("th_HS2_top_psa", "am_HS1_lat_dlt")
+n_runs = 5
+n_cycles_per_run = 50
+
+# functions reported in the breakdown, (label, function names, file name pattern)
+functions = (
+    ("get_filelist", ("get_filelist", "get_filelist_full_wildcards"), "build_filelist"),
+    ("build_filelist", ("build_filelist",), "build_filelist"),
+    ("get_par_file", ("get_par_file",), "common.smk"),
+    ("get_config_files", ("get_config_files",), "common.smk"),
+    ("get_log_config", ("get_log_config",), "common.smk"),
+    (
+        "FileKey parsing",
+        ("get_filekey_from_pattern", "get_filekeys_from_pattern", "parse_keypart"),
+        "FileKey",
+    ),
+    ("ignore keys", ("get_ignored_keys",), "build_filelist"),
+    ("glob", ("glob", "glob_many"), "FileIndex"),
+)
+
+rules = {
+    "tier_raw": ["raw_config"],
+    "tier_dsp": ["processing_chain"],
+    "tier_hit": ["config_file"],
+    "pars_dsp_tau": ["tau_config", "processing_chain"],
+    "pars_dsp_peak_selection": ["peak_config", "processing_chain"],
+    "pars_dsp_eopt": ["optimiser_config", "processing_chain"],
+    "pars_hit_qc": ["qc_config"],
+    "pars_hit_ecal": ["ecal_config"],
+    "pars_hit_ecal_am": ["ecal_am_config"],
+    "pars_hit_aoecal": ["aoecal_config"],
+    "pars_hit_lqcal": ["lqcal_config"],
+}
+
+
+def make_setup(workdir):
+    with (repo / "dataflow-config.yaml").open() as f:
+        setup = yaml.safe_load(f)
+    # the synthetic config is not a git repository
+    setup.pop("hades_metadata_version", None)
+    setup["paths"].pop("startup_cache", None)
+    with (workdir / "dataflow-config.yaml").open("w") as f:
+        yaml.safe_dump(setup, f)
+    paths = {key: value.replace("$_", str(workdir)) for key, value in setup["paths"].items()}
+    return {**setup, "paths": paths}
+
+
+def make_config_repo(config_dir):
+    config_dir.mkdir(parents=True)
+    for file in ("dummy.yaml", "logging.yaml"):
+        (config_dir / file).write_text("{}\n")
+    snakemake_rules = {
+        rule: {
+            "inputs": {field: {"__default__": "$_/dummy.yaml"} for field in fields},
+            "options": {"logging": "$_/logging.yaml"},
+        }
+        for rule, fields in rules.items()
+    }
+    (config_dir / "snakemake_rules.yaml").write_text(
+        yaml.safe_dump({"snakemake_rules": snakemake_rules})
+    )
+    validity = [
+        {"valid_from": "20220101T000000Z", "category": "all", "apply": ["snakemake_rules.yaml"]},
+        *(
+            {
+                "valid_from": f"2023{month:02d}01T000000Z",
+                "mode": "reset",
+                "category": meas,
+                "apply": ["snakemake_rules.yaml"],
+            }
+            for meas in measurements
+            for month in range(1, 13, 3)
+        ),
+    ]
+    (config_dir / "validity.yaml").write_text(yaml.safe_dump(validity))
+
+
+def make_keys(n_cycles):
+    n_detectors = max(1, n_cycles // (len(measurements) * n_runs * n_cycles_per_run))
+    start = datetime(2023, 1, 1)
+    keys = []
+    for det in range(n_detectors):
+        for i_meas, meas in enumerate(measurements):
+            for run in range(n_runs):
+                for cycle in range(n_cycles_per_run):
+                    timestamp = start + timedelta(
+                        days=det, hours=4 * (i_meas * n_runs + run), minutes=cycle
+                    )
+                    keys.append(
+                        FileKey(
+                            "char_data",
+                            f"V{det:05d}A",
+                            "c1",
+                            meas,
+                            f"r{run + 1:03d}",
+                            timestamp.strftime("%Y%m%dT%H%M%SZ"),
+                        )
+                    )
+    return keys[:n_cycles]
+
+
+def make_tree(setup, keys):
+    daq_pattern = str(get_pattern_tier_daq(setup))
+    tier_patterns = [
+        str(get_pattern_tier(setup, tier, check_in_cycle=False)) for tier in ("raw", "dsp")
+    ]
+    dirs = set()
+    for key in keys:
+        files = [
+            daq_pattern.format(
+                **key._replace(
+                    run=convert_to_daq_run(key.run),
+                    timestamp=convert_to_daq_timestamp(key.timestamp),
+                )._asdict()
+            ),
+            *(pattern.format(**key._asdict()) for pattern in tier_patterns),
+        ]
+        for file in files:
+            parent = os.path.dirname(file)
+            if parent not in dirs:
+                os.makedirs(parent, exist_ok=True)
+                dirs.add(parent)
+            Path(file).touch()
+
+
+def make_ignored_cycles(config_dir, keys):
+    # single removed cycles plus one outage given as a timestamp range
+    removed = [key.name for key in keys[7::97]]
+    unprocessable = [
+        {"key": "-".join(keys[0][:-1]), "from": keys[1].timestamp, "to": keys[3].timestamp}
+    ]
+    (config_dir / "ignored_cycles.yaml").write_text(
+        yaml.safe_dump({"removed": removed, "unprocessable": unprocessable})
+    )
+
+
+def run_dry_run(workdir, target):
+    profile = workdir / "dag.prof"
+    cmd = [
+        sys.executable,
+        "-m",
+        "cProfile",
+        "-o",
+        str(profile),
+        "-m",
+        "snakemake",
+        "--dry-run",
+        "--cores",
+        "all",
+        "--snakefile",
+        str(repo / "workflow" / "Snakefile"),
+        "--configfile",
+        str(workdir / "dataflow-config.yaml"),
+        "--directory",
+        str(workdir),
+        target,
+    ]
+    env = {**os.environ, "PRODENV": str(workdir)}
+    tic = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, check=False)
+    wall = time.perf_counter() - tic
+    if proc.returncode != 0:
+        print(proc.stdout[-3000:], proc.stderr[-3000:])
+        msg = f"snakemake dry run failed for {workdir}"
+        raise RuntimeError(msg)
+    match = re.search(r"^total\s+(\d+)", proc.stdout, re.MULTILINE)
+    return wall, int(match.group(1)) if match else None, profile
+
+
+def breakdown(profile, n_top=20):
+    """
+    Returns the cumulative time of the reported functions and the functions
+    with the largest own time
+    """
+    stats = pstats.Stats(str(profile)).stats
+    result = {}
+    for label, names, file_pattern in functions:
+        calls = 0
+        cumulative = 0.0
+        for (filename, _, funcname), (primitive, _, _, ct, _) in stats.items():
+            if funcname in names and file_pattern in filename:
+                calls += primitive
+                cumulative += ct
+        result[label] = {"calls": calls, "cumulative_s": round(cumulative, 4)}
+    top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:n_top]
+    return {
+        "functions": result,
+        "top_tottime": [
+            {
+                "function": f"{Path(filename).name}:{lineno}({funcname})",
+                "calls": primitive,
+                "tottime_s": round(tt, 4),
+            }
+            for (filename, lineno, funcname), (primitive, _, tt, _, _) in top
+        ],
+        "total_profiled_s": round(max(ct for (_, _, _, ct, _) in stats.values()), 4),
+    }
+
+
+def compare(results, baseline_file):
+    with Path(baseline_file).open() as f:
+        baseline = {run["cycles"]: run for run in json.load(f)["runs"]}
+    print(f"compared to {baseline_file}:")
+    for run in results["runs"]:
+        ref = baseline.get(run["cycles"])
+        if ref is None:
+            continue
+        print(f"{run['cycles']:>7} cycles: dry run x{run['dry_run_s'] / ref['dry_run_s']:5.2f}")
+        for label, timing in run["functions"].items():
+            ref_s = ref["functions"].get(label, {}).get("cumulative_s")
+            if ref_s:
+                print(f"{label:>20}: x{timing['cumulative_s'] / ref_s:5.2f}")
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--cycles", type=int, nargs="+", default=[1000, 10000, 100000])
+    argparser.add_argument("--tier", default="hit", choices=["raw", "dsp", "hit"])
+    argparser.add_argument("--output", default="bench_dag.json")
+    argparser.add_argument("--workdir", default=None, help="create the synthetic trees here")
+    argparser.add_argument("--baseline", default=None, help="JSON results to compare to")
+    args = argparser.parse_args()
+
+    results = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "tier": args.tier,
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmpdir:
+        for n_cycles in args.cycles:
+            workdir = Path(tmpdir) / f"cycles_{n_cycles}"
+            workdir.mkdir()
+            tic = time.perf_counter()
+            setup = make_setup(workdir)
+            config_dir = Path(setup["paths"]["config"])
+            make_config_repo(config_dir)
+            keys = make_keys(n_cycles)
+            make_tree(setup, keys)
+            make_ignored_cycles(config_dir, keys)
+            t_generate = time.perf_counter() - tic
+
+            wall, n_jobs, profile = run_dry_run(workdir, f"all-char_data-{args.tier}.gen")
+            run = {
+                "cycles": len(keys),
+                "jobs": n_jobs,
+                "generate_s": round(t_generate, 3),
+                "dry_run_s": round(wall, 3),
+                **breakdown(profile),
+            }
+            results["runs"].append(run)
+            print(
+                f"{len(keys):>7} cycles: {n_jobs} jobs, dry run {wall:7.2f} s "
+                f"(tree generated in {t_generate:.1f} s)"
+            )
+            for label, timing in run["functions"].items():
+                print(f"{label:>20}: {timing['cumulative_s']:8.3f} s  {timing['calls']:>8} calls")
+
+    with Path(args.output).open("w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline is not None:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# ruff: noqa: T201
+"""
+Benchmark of the in-memory and streaming modes of the Am energy calibration
+(see hadesflow/scripts/pars/hit/ecal_am_streaming.py). Synthetic dsp files with
+a 59.5 keV peak on a falling continuum are calibrated by each mode in a process
+of its own, reporting the runtime, the peak RSS and the differences of the
+results. The fit is limited to --n-events events so the runtime is dominated by
+the reading.
+
+    python benchmarks/bench_ecal_am.py --rows 2000000 --files 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from lgdo import Array, Table, lh5
+
+from hadesflow.scripts.pars.hit import ecal_am
+from hadesflow.scripts.pars.hit.ecal_am_streaming import streaming_calibration
+
+hit_dict = {"is_valid_cal": {"expression": "bl_std < 10"}}
+peak = 59.5409
+
+
+def make_file(path, n_rows, seed):
+    rng = np.random.default_rng(seed)
+    n_peak = n_rows // 20
+    energy = np.concatenate(
+        [rng.normal(peak, 0.6, n_peak), rng.exponential(40, n_rows - n_peak) + 10]
+    )
+    rng.shuffle(energy)
+    table = Table(
+        col_dict={
+            "cuspEmax": Array(energy / 0.0712 + rng.normal(0, 1, n_rows)),
+            "trapTmax": Array(energy / 0.15),
+            "bl_std": Array(rng.exponential(3, n_rows)),
+            "timestamp": Array(np.sort(rng.uniform(0, 3600, n_rows)) + 1.7e9 + 3600 * seed),
+            "bl_mean": Array(rng.normal(15000, 3, n_rows)),
+            "baseline": Array(rng.normal(15000, 3, n_rows).round()),
+            "tp_0_est": Array(rng.normal(48000, 30, n_rows)),
+        }
+    )
+    lh5.write(table, "dsp", str(path), group="ch000")
+
+
+def calibrate(mode, files, buffer_len, n_events):
+    kwarg_dict = {
+        "energy_params": ["cuspEmax"],
+        "cut_param": "is_valid_cal",
+        "threshold": 100,
+        "n_events": n_events,
+        "buffer_len": buffer_len,
+    }
+    bl_plot_options = {
+        "baseline_stability": {"function": ecal_am.bin_bl_stability, "options": None}
+    }
+    tic = time.perf_counter()
+    if mode == "streaming":
+        streamed = streaming_calibration(
+            files,
+            "ch000/dsp",
+            hit_dict,
+            kwarg_dict,
+            ["cuspEmax_cal"],
+            bl_plot_options=bl_plot_options,
+        )
+        ecal = streamed["calibrations"]["cuspEmax_cal"]
+        baseline = streamed["baseline_plots"]["baseline_stability"]["baseline"]
+    else:
+        data = ecal_am.load_data(
+            files,
+            "ch000/dsp",
+            hit_dict,
+            params=["cuspEmax", "is_valid_cal", "timestamp", "trapTmax"],
+            threshold=100,
+            cal_energy_param="trapTmax",
+        )
+        e_uncal = data.query("is_valid_cal")["cuspEmax"].to_numpy()
+        hist, bins, _ = ecal_am.guess_histogram(
+            e_uncal, np.nanpercentile(e_uncal, 1), np.nanpercentile(e_uncal, 99.9)
+        )
+        ecal = ecal_am.calibrate_energy(
+            e_uncal, "cuspEmax", ecal_am.energy_guess(hist, bins), kwarg_dict
+        )
+        baseline = ecal_am.baseline_tracking_plots(files, "ch000/dsp", bl_plot_options)[
+            "baseline_stability"
+        ]["baseline"]
+    fit = ecal.results["hpge_fit_energy_peaks"]["peak_parameters"][peak]
+    return {
+        "runtime_s": round(time.perf_counter() - tic, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "pars": ecal.pars.tolist(),
+        "mu": fit["parameters"]["mu"],
+        "mu_err": fit["uncertainties"]["mu"],
+        "baseline": baseline.tolist(),
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--rows", type=int, default=2000000)
+    argparser.add_argument("--files", type=int, default=4)
+    argparser.add_argument("--buffer-len", type=int, default=100000)
+    argparser.add_argument("--n-events", type=int, default=20000)
+    argparser.add_argument("--run", choices=["in-memory", "streaming"], help=argparse.SUPPRESS)
+    argparser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.run is not None:
+        files = sorted(str(file) for file in Path(args.dir).glob("*.lh5"))
+        print(json.dumps(calibrate(args.run, files, args.buffer_len, args.n_events)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(args.files):
+            make_file(Path(tmpdir) / f"dsp_{i}.lh5", args.rows, i)
+        for mode in ("in-memory", "streaming"):
+            output = subprocess.run(
+                [sys.executable, __file__, *sys.argv[1:], "--run", mode, "--dir", tmpdir],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[mode] = json.loads(output.splitlines()[-1])
+
+    memory, streaming = results["in-memory"], results["streaming"]
+    print(f"{args.files} files of {args.rows} rows, chunks of {args.buffer_len} rows")
+    print(f"{'mode':>10} {'runtime':>10} {'peak RSS':>10} {'keV/unit':>12} {'59.5 keV peak':>22}")
+    for mode, result in results.items():
+        print(
+            f"{mode:>10} {result['runtime_s']:>8.1f} s {result['max_rss_mb']:>7} MB "
+            f"{result['pars'][1]:>12.8f} {result['mu']:>10.3f} +- {result['mu_err']:.3f}"
+        )
+    print(
+        f"peak difference {abs(memory['mu'] - streaming['mu']) / memory['mu_err']:.2f} sigma, "
+        "largest baseline median difference "
+        f"{np.nanmax(np.abs(np.subtract(memory['baseline'], streaming['baseline']))):.4f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# ruff: noqa: T201
+"""
+Benchmark of the FileKey parsing and path rendering, compares the old per-file
+paths (regex rebuilt for every filename, snakemake expand for every key) with
+the pattern registry and the batch parser/renderer.
+
+    python benchmarks/bench_filekey.py --n-files 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from datetime import datetime, timedelta
+
+from snakemake.io import expand
+
+from hadesflow.methods.FileKey import FileKey, get_file_pattern, regex_from_filepattern
+from hadesflow.methods.patterns import get_pattern_tier
+from hadesflow.methods.utils import convert_to_legend_run, convert_to_legend_timestamp
+
+setup = {"paths": {"tier": "/data/tier", "tier_daq": "/data/daq", "tier_raw": "/data/tier/raw"}}
+
+
+def legacy_get_filekey_from_pattern(filename, pattern):
+    key_pattern_rx = re.compile(regex_from_filepattern(str(pattern)))
+    if key_pattern_rx.match(filename) is None:
+        return None
+    d = key_pattern_rx.match(filename).groupdict()
+    for entry in list(d):
+        if entry not in FileKey._fields:
+            d.pop(entry)
+    for wildcard in FileKey._fields:
+        if wildcard not in d:
+            d[wildcard] = "*"
+    if d["timestamp"][-1] != "Z":
+        d["timestamp"] = convert_to_legend_timestamp(d["timestamp"])
+    if "run" in d["run"]:
+        d["run"] = convert_to_legend_run(d["run"])
+    return FileKey(**d)
+
+
+def make_filenames(n_files):
+    start = datetime(2023, 1, 1)
+    pattern = str(get_pattern_tier(setup, "daq", check_in_cycle=False))
+    return [
+        pattern.format(
+            experiment="char_data",
+            detector=f"V{i % 7:05d}A",
+            campaign="c1",
+            measurement="th_HS2_top_psa",
+            run=f"run{i // 1000:04d}",
+            timestamp=(start + timedelta(minutes=i)).strftime("%y%m%dT%H%M%S"),
+        )
+        for i in range(n_files)
+    ]
+
+
+def timeit(func, repeat):
+    best = None
+    for _ in range(repeat):
+        # start every repetition with cold conversion caches
+        convert_to_legend_timestamp.cache_clear()
+        convert_to_legend_run.cache_clear()
+        tic = time.perf_counter()
+        out = func()
+        toc = time.perf_counter() - tic
+        best = toc if best is None else min(best, toc)
+    return best, out
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--n-files", type=int, default=100000)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    pattern = get_pattern_tier(setup, "daq", check_in_cycle=False)
+    filenames = make_filenames(args.n_files)
+
+    t_legacy, legacy = timeit(
+        lambda: [legacy_get_filekey_from_pattern(f, pattern) for f in filenames], args.repeat
+    )
+    t_single, single = timeit(
+        lambda: [FileKey.get_filekey_from_pattern(f, pattern) for f in filenames], args.repeat
+    )
+    t_batch, batch = timeit(
+        lambda: FileKey.get_filekeys_from_pattern(filenames, pattern), args.repeat
+    )
+
+    if not legacy == single == batch:
+        msg = "parsed keys differ between the legacy, registry and batch paths"
+        raise RuntimeError(msg)
+
+    report("parsing", args, (("legacy", t_legacy), ("registry", t_single), ("batch", t_batch)))
+
+    raw_pattern = get_pattern_tier(setup, "raw", check_in_cycle=False)
+    t_expand, expanded = timeit(
+        lambda: [expand(raw_pattern, **key._asdict())[0] for key in batch], args.repeat
+    )
+    t_render, rendered = timeit(
+        lambda: [key.get_path_from_filekey(raw_pattern)[0] for key in batch], args.repeat
+    )
+    t_render_many, rendered_many = timeit(
+        lambda: get_file_pattern(raw_pattern).render_many(batch), args.repeat
+    )
+
+    if not expanded == rendered == rendered_many:
+        msg = "rendered paths differ between snakemake expand and the compiled pattern"
+        raise RuntimeError(msg)
+
+    report(
+        "rendering",
+        args,
+        (("expand", t_expand), ("render", t_render), ("render_many", t_render_many)),
+    )
+
+
+def report(label, args, timings):
+    print(f"{label}: {args.n_files} files, best of {args.repeat}")
+    t_ref = timings[0][1]
+    for name, t in timings:
+        print(f"{name:>12}: {t:8.3f} s  {1e6 * t / args.n_files:8.2f} us/file  x{t_ref / t:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
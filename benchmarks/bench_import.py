@@ -0,0 +1,74 @@
+# ruff: noqa: T201
+"""
+Benchmark of the start-up time of hadesflow.methods and of the console scripts
+(with --help, so only the imports needed before argument parsing are timed).
+Each command runs in a fresh interpreter, the time of a bare interpreter is
+reported separately and subtracted. hadesflow.methods and the tier scripts
+must stay within --budget-ms of the bare interpreter, the benchmark exits with
+an error otherwise.
+
+    python benchmarks/bench_import.py --repeat 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from importlib.metadata import distribution
+
+
+def run(code, repeat):
+    times = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - tic)
+    return statistics.median(times)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--budget-ms", type=float, default=100)
+    args = argparser.parse_args()
+
+    targets = {
+        "hadesflow.methods": "import hadesflow.methods",
+        "hadesflow.methods.KeyTable": "import hadesflow.methods.KeyTable",
+    }
+    # the key utilities and the tier scripts, run once per job
+    budgeted = {"hadesflow.methods"}
+    for entry_point in distribution("hades_dataflow").entry_points:
+        if entry_point.group != "console_scripts":
+            continue
+        module, func = entry_point.value.split(":")
+        targets[f"{entry_point.name} --help"] = (
+            f"import sys; sys.argv = ['{entry_point.name}', '--help']\n"
+            f"from {module} import {func}\n"
+            f"try:\n    {func}()\nexcept SystemExit:\n    pass"
+        )
+        if module.startswith("hadesflow.scripts.tier."):
+            budgeted.add(f"{entry_point.name} --help")
+
+    baseline = run("pass", args.repeat)
+    print(f"{'python -c pass':>32}: {1e3 * baseline:8.1f} ms (baseline)")
+    over = []
+    for label, code in targets.items():
+        t = run(code, args.repeat)
+        print(f"{label:>32}: {1e3 * t:8.1f} ms  (+{1e3 * (t - baseline):7.1f} ms)")
+        if label in budgeted and 1e3 * (t - baseline) > args.budget_ms:
+            over.append(label)
+    if over:
+        sys.exit(f"over the budget of {args.budget_ms:.0f} ms: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
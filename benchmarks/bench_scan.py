@@ -0,0 +1,90 @@
+# ruff: noqa: T201
+"""
+Benchmark of the directory scanning on high-latency storage. A DAQ-like tree is
+created on a local (preferably tmpfs) directory and every stat and scandir call
+is delayed to simulate a shared filesystem, the globs of build_filelist and
+find_gen_runs are then resolved with a serial and with concurrent scanners.
+
+    python benchmarks/bench_scan.py --latency-ms 5 --threads 1 4 16 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from hadesflow.methods.DirScanner import DirScanner
+from hadesflow.methods.FileIndex import FileIndex
+
+
+def make_tree(root, n_detectors, n_runs, n_cycles):
+    measurements = ("th_HS2_top_psa", "th_HS2_lat_psa", "am_HS1_lat_ssh", "am_HS1_top_ssh")
+    for det in range(n_detectors):
+        for meas in measurements:
+            path = root / f"V{det:05d}A" / "c1" / meas
+            path.mkdir(parents=True)
+            for run in range(n_runs):
+                for cycle in range(n_cycles):
+                    name = f"char_data-V{det:05d}A-{meas}-run{run:04d}-2301{run + 1:02d}T{cycle:06d}.fcio"
+                    (path / name).touch()
+
+
+def delayed(func, latency):
+    def wrapper(path):
+        time.sleep(latency)
+        return func(path)
+
+    return wrapper
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--latency-ms", type=float, default=5)
+    argparser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 64])
+    argparser.add_argument("--n-detectors", type=int, default=50)
+    argparser.add_argument("--n-runs", type=int, default=5)
+    argparser.add_argument("--n-cycles", type=int, default=20)
+    args = argparser.parse_args()
+
+    latency = args.latency_ms / 1e3
+    tmpdir = "/dev/shm" if Path("/dev/shm").is_dir() else None
+    with tempfile.TemporaryDirectory(dir=tmpdir) as tmp_root:
+        root = Path(tmp_root)
+        make_tree(root, args.n_detectors, args.n_runs, args.n_cycles)
+
+        # one glob per key as in build_filelist, the whole tree as in find_gen_runs
+        key_globs = [
+            f"{root}/V{det:05d}A/c1/th_HS2_top_psa/char_data-V{det:05d}A-th_HS2_top_psa-run{run:04d}-*.fcio"
+            for det in range(args.n_detectors)
+            for run in range(args.n_runs)
+        ]
+        tree_glob = f"{root}/*/*/*/*"
+
+        print(
+            f"{args.n_detectors * 4} directories, {len(key_globs)} key globs, "
+            f"{latency * 1e3:.1f} ms per stat/scandir"
+        )
+        reference = {}
+        for threads in args.threads:
+            scanner = DirScanner(
+                threads,
+                scandir=delayed(os.scandir, latency),
+                stat=delayed(os.stat, latency),
+            )
+            timings = []
+            for label, patterns in (("build_filelist", key_globs), ("find_gen_runs", [tree_glob])):
+                tic = time.perf_counter()
+                result = FileIndex(scanner=scanner).glob_many(patterns)
+                timings.append(f"{label} {time.perf_counter() - tic:7.3f} s")
+                if reference.setdefault(label, result) != result:
+                    msg = f"{label} results differ with {threads} threads"
+                    raise RuntimeError(msg)
+            scanner.shutdown()
+            print(f"{threads:>4} threads: " + ", ".join(timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# ruff: noqa: T201
+"""
+Benchmark of the throughput of build-dsp-hades with and without the worker
+service. A small raw file and processing chain are generated, the same number of
+jobs is then run with the given number of concurrent CLI processes, once
+in-process and once handed to a hades-worker-service.
+
+    python benchmarks/bench_worker.py --jobs 32 --parallel 8
+
+The speed-up quoted for the service (8.3 -> 14.7 files/min with 500 events per
+file) was measured on a single core only. It has not been measured on a
+multi-core node, where --parallel jobs run at the same time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from lgdo import Array, Table, WaveformTable, lh5
+
+processing_chain = {
+    "outputs": ["bl_mean", "bl_std", "tp_max"],
+    "processors": {
+        "bl_mean, bl_std, bl_slope, bl_intercept": {
+            "function": "linear_slope_fit",
+            "module": "dspeed.processors",
+            "args": ["waveform[0:100]", "bl_mean", "bl_std", "bl_slope", "bl_intercept"],
+            "unit": ["ADC", "ADC", "ADC", "ADC"],
+        },
+        "tp_max": {
+            "function": "argmax",
+            "module": "numpy",
+            "args": ["waveform", 1, "tp_max"],
+            "kwargs": {"signature": "(n),()->()", "types": ["fi->i"]},
+            "unit": "ns",
+        },
+    },
+}
+
+
+def make_inputs(tmpdir, n_events, wf_len):
+    rng = np.random.default_rng(1)
+    waveform = WaveformTable(
+        values=rng.normal(1000, 5, (n_events, wf_len)).astype("uint16"),
+        dt=16,
+        t0=0,
+        dt_units="ns",
+        t0_units="ns",
+    )
+    table = Table(
+        col_dict={"waveform": waveform, "timestamp": Array(np.arange(n_events, dtype="f8"))}
+    )
+    raw_file = tmpdir / "raw.lh5"
+    lh5.write(table, "raw", raw_file, wo_mode="of")
+    chain_file = tmpdir / "processing_chain.json"
+    chain_file.write_text(json.dumps(processing_chain))
+    return raw_file, chain_file
+
+
+def run_jobs(raw_file, chain_file, outdir, n_jobs, parallel, env):
+    def job(i):
+        subprocess.run(
+            [
+                "build-dsp-hades",
+                "--processing-chain",
+                str(chain_file),
+                "--input",
+                str(raw_file),
+                "--output",
+                str(outdir / f"dsp_{i}.lh5"),
+            ],
+            env=env,
+            check=True,
+        )
+
+    outdir.mkdir()
+    tic = time.perf_counter()
+    with ThreadPoolExecutor(parallel) as pool:
+        list(pool.map(job, range(n_jobs)))
+    return time.perf_counter() - tic
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--jobs", type=int, default=32)
+    argparser.add_argument("--parallel", type=int, default=os.cpu_count())
+    argparser.add_argument("--events", type=int, default=2000)
+    argparser.add_argument("--wf-len", type=int, default=1000)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmpdir = Path(tmp)
+        raw_file, chain_file = make_inputs(tmpdir, args.events, args.wf_len)
+        socket = str(tmpdir / "worker.sock")
+
+        env = {**os.environ, "HADESFLOW_NO_WORKER": "1"}
+        t_in_process = run_jobs(
+            raw_file, chain_file, tmpdir / "in_process", args.jobs, args.parallel, env
+        )
+
+        env = {k: v for k, v in os.environ.items() if k != "HADESFLOW_NO_WORKER"}
+        env["HADESFLOW_WORKER_SOCKET"] = socket
+        service = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "from hadesflow.scripts.flow.worker_service import worker_service; worker_service()",
+                "--workers",
+                str(args.parallel),
+                "--socket",
+                socket,
+            ],
+            env=env,
+        )
+        try:
+            while not Path(socket).exists():
+                time.sleep(0.1)
+            # the first job of each worker loads the kernels
+            t_service = run_jobs(
+                raw_file, chain_file, tmpdir / "service", args.jobs, args.parallel, env
+            )
+        finally:
+            service.terminate()
+            service.wait()
+
+        for out in (tmpdir / "service").iterdir():
+            if not np.array_equal(
+                lh5.read("dsp/bl_mean", out).nda,
+                lh5.read("dsp/bl_mean", tmpdir / "in_process" / out.name).nda,
+            ):
+                msg = f"outputs differ for {out.name}"
+                raise RuntimeError(msg)
+
+    print(f"{args.jobs} jobs, {args.parallel} in parallel, {args.events} events per file")
+    for label, t in (("in-process", t_in_process), ("worker service", t_service)):
+        print(f"{label:>16}: {t:7.2f} s  {60 * args.jobs / t:8.1f} files/min")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ruff: noqa: T201
+"""
+Benchmark of the LH5 write profiles (see hadesflow.methods.write_profiles). A
+synthetic dsp-like table is written with each profile in buffers of
+--buffer-len rows, as the tier scripts write, then single columns are read
+back from all the files, which is the typical access pattern of the analysis.
+Reports the file size, the write throughput and the single-column read
+throughput.
+
+    python benchmarks/bench_write_profiles.py --rows 200000 --files 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from lgdo import Array, Table, lh5
+
+from hadesflow.methods.write_profiles import apply_profile
+
+profiles = {
+    "lgdo default": {},
+    "uncompressed": {"compression": None, "shuffle": False},
+    "lzf": {"compression": "lzf", "shuffle": True},
+    "gzip 1": {"compression": "gzip", "compression_opts": 1, "shuffle": True},
+    "gzip 1, 64k rows": {
+        "compression": "gzip",
+        "compression_opts": 1,
+        "shuffle": True,
+        "chunk_rows": 65536,
+    },
+    "lzf, 64k rows": {"compression": "lzf", "shuffle": True, "chunk_rows": 65536},
+}
+
+
+def make_table(n_rows, n_columns, seed):
+    rng = np.random.default_rng(seed)
+    columns = {"timestamp": Array(np.cumsum(rng.exponential(0.01, n_rows)))}
+    for i in range(n_columns):
+        # dsp parameters are float32 and float64 with a limited resolution
+        values = np.round(rng.normal(1000, 50, n_rows), 2)
+        columns[f"par_{i:02d}"] = Array(values.astype("f4" if i % 2 else "f8"))
+    columns["is_valid"] = Array(rng.random(n_rows) > 0.1)
+    return Table(col_dict=columns)
+
+
+def table_bytes(table):
+    return sum(column.nda.nbytes for column in table.values())
+
+
+def write_file(table, file, buffer_len, profile):
+    # new arrays, the profile sets the chunks on them
+    table = Table(col_dict={name: Array(column.nda) for name, column in table.items()})
+    h5py_kwargs = apply_profile(table, profile)
+    for start in range(0, len(table), buffer_len):
+        lh5.write(
+            table,
+            "dsp",
+            file,
+            start_row=start,
+            n_rows=min(buffer_len, len(table) - start),
+            wo_mode="append",
+            write_start=start,
+            **h5py_kwargs,
+        )
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--rows", type=int, default=200000)
+    argparser.add_argument("--columns", type=int, default=30)
+    argparser.add_argument("--files", type=int, default=4)
+    argparser.add_argument("--buffer-len", type=int, default=3200)
+    argparser.add_argument("--output", default=None, help="write the results as JSON")
+    args = argparser.parse_args()
+
+    tables = [make_table(args.rows, args.columns, seed) for seed in range(args.files)]
+    data_mb = sum(table_bytes(table) for table in tables) / 1e6
+    read_columns = ["par_00", "par_01", "timestamp"]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for label, profile in profiles.items():
+            files = [Path(tmpdir) / f"{label}_{i}.lh5" for i in range(args.files)]
+            tic = time.perf_counter()
+            for table, file in zip(tables, files):
+                write_file(table, file, args.buffer_len, profile)
+            t_write = time.perf_counter() - tic
+
+            tic = time.perf_counter()
+            read_mb = 0
+            for column in read_columns:
+                for file in files:
+                    read_mb += lh5.read(f"dsp/{column}", file).nda.nbytes / 1e6
+            t_read = time.perf_counter() - tic
+
+            results[label] = {
+                "profile": profile,
+                "size_mb": round(sum(file.stat().st_size for file in files) / 1e6, 2),
+                "write_mb_s": round(data_mb / t_write, 1),
+                "column_read_mb_s": round(read_mb / t_read, 1),
+            }
+
+    print(f"{args.files} files of {args.rows} rows, {data_mb:.0f} MB of data")
+    print(f"{'profile':>18} {'size':>10} {'write':>12} {'column read':>14}")
+    for label, result in results.items():
+        print(
+            f"{label:>18} {result['size_mb']:>7.1f} MB {result['write_mb_s']:>7.1f} MB/s "
+            f"{result['column_read_mb_s']:>9.1f} MB/s"
+        )
+    if args.output is not None:
+        with Path(args.output).open("w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from hadesflow.methods.BatchPlanner import BatchPlanner
+from hadesflow.methods.ResourceModel import ResourceModel
+
+
+def test_batches(tmp_path):
+    sizes = [1, 2, 3, 4, 1, 2, 3, 4]
+    for i, size in enumerate(sizes):
+        (tmp_path / f"in_{i}.lh5").write_bytes(b"0" * size * 1024**2)
+    pattern = str(tmp_path / "in_{x}.lh5")
+
+    parents = {}
+    planner = BatchPlanner({"tier-dsp": {"target_mb": 5}}, None, parents)
+    assert planner.group("tier-hit", "build_hit", [pattern]) == "tier-hit"
+    groupid = planner.group("tier-dsp", "build_dsp", [str(tmp_path / "daq_{x}"), pattern])
+
+    ids = [groupid({"x": str(i)}) for i in range(len(sizes))]
+    # first fit, the jobs larger than the rest of a batch open a new one
+    assert ids == [f"tier-dsp-{i}" for i in (0, 0, 1, 2, 0, 1, 3, 4)]
+    assert groupid({"x": "0"}) == "tier-dsp-0"
+    assert set(parents.values()) == {"tier-dsp"}
+    assert all(batch[0] <= 5 for batch in planner.batches["tier-dsp"])
+    # without input the job counts with the mean size
+    assert groupid({"x": "missing"}) == "tier-dsp-5"
+    assert "9 jobs in 6 batches" in planner.report()
+
+
+def test_batches_runtime():
+    model = ResourceModel()
+    model.rules = {
+        "build_dsp": {"all": {"runtime_s": {"intercept": 600, "slope": 0, "margin": 1}}}
+    }
+    planner = BatchPlanner({"tier-dsp": {"target_minutes": 30}}, model)
+    groupid = planner.group("tier-dsp", "build_dsp", [])
+    ids = [groupid({"x": str(i), "measurement": "th"}) for i in range(7)]
+    assert ids == ["tier-dsp-0"] * 3 + ["tier-dsp-1"] * 3 + ["tier-dsp-2"]
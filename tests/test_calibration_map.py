@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from hadesflow.methods.CalibrationMap import CalibrationMap
+from hadesflow.methods.FileIndex import FileIndex
+
+
+def test_calibration_map(tmp_path):
+    for det, measurements in {
+        "V01": ("th_HS2_lat_psa", "th_HS2_top_psa", "am_HS1_lat_ssh"),
+        "V02": ("th_HS2_top_psa",),
+    }.items():
+        for meas in measurements:
+            (tmp_path / det / "c1" / meas).mkdir(parents=True)
+    (tmp_path / "V02" / "c1.txt").touch()
+
+    calibration_map = CalibrationMap()
+    calibration_map.scan(str(tmp_path), FileIndex())
+    assert set(calibration_map.measurements) == {("V01", "c1"), ("V02", "c1")}
+
+    assert calibration_map.get_sources("V01", "c1", "am_HS1_lat_ssh", "dsp") == ["th_HS2_lat_psa"]
+    assert calibration_map.get_sources("V01", "c1", "am_HS1_lat_ssh", "hit") == [
+        "th_HS2_lat_psa",
+        "am_HS1_lat_dlt",
+    ]
+    assert calibration_map.get_sources("V02", "c1", "bkg", "hit") == ["th_HS2_top_psa"]
+    # unknown campaigns fall back to the last source
+    assert calibration_map.get_sources("V03", "c1", "bkg", "hit") == ["th_HS2_top_psa"]
+
+    calibration_map = CalibrationMap(
+        ["th_HS2_top_psa"], {"hit": {"am_HS1_*": ["am_HS1_lat_ssh"]}}, calibration_map.measurements
+    )
+    assert calibration_map.get_sources("V01", "c1", "am_HS1_top_dlt", "hit") == [
+        "th_HS2_top_psa",
+        "am_HS1_lat_ssh",
+    ]
+    assert calibration_map.is_source("am_HS1_lat_ssh")
+    assert calibration_map.is_source("th_HS2_top_psa")
+    assert not calibration_map.is_source("bkg")
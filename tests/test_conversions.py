@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import pytest
+
+from hadesflow.methods.utils import (
+    convert_to_daq_run,
+    convert_to_daq_runs,
+    convert_to_daq_timestamp,
+    convert_to_daq_timestamps,
+    convert_to_legend_run,
+    convert_to_legend_runs,
+    convert_to_legend_timestamp,
+    convert_to_legend_timestamps,
+)
+
+
+def test_batch_timestamps():
+    daq = ["230101T123456", "690101T000000", "680229T235959", "23011T000000"]
+    legend = convert_to_legend_timestamps(daq)
+    assert legend == [convert_to_legend_timestamp(value) for value in daq]
+    assert legend[:3] == ["20230101T123456Z", "19690101T000000Z", "20680229T235959Z"]
+    assert convert_to_daq_timestamps(legend) == [convert_to_daq_timestamp(v) for v in legend]
+
+    for invalid, error in (
+        ("230229T000000", "day is out of range"),
+        ("230101T240000", "unconverted data remains"),
+        ("230101T000060", "second must be in"),
+    ):
+        with pytest.raises(ValueError, match=error):
+            convert_to_legend_timestamps([invalid])
+    with pytest.raises(ValueError, match="day is out of range"):
+        convert_to_daq_timestamps(["20230229T000000Z"])
+
+
+def test_batch_runs():
+    runs = ["run0001", "run1234", "xrun0001y", "r001"]
+    assert convert_to_legend_runs(runs) == [convert_to_legend_run(run) for run in runs]
+    assert convert_to_legend_runs(runs)[:2] == ["r001", "r234"]
+    runs = ["r001", "r0012", "run0001"]
+    assert convert_to_daq_runs(runs) == [convert_to_daq_run(run) for run in runs]
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import h5py
+import numpy as np
+from dspeed import build_dsp
+from lgdo import Array, Table, WaveformTable, lh5
+from pygama.hit import build_hit
+
+from hadesflow.scripts.tier.dsp_hit import build_dsp_hit
+
+proc_chain = {
+    "outputs": ["bl_mean", "bl_std", "bl_slope", "wf_max"],
+    "processors": {
+        "bl_mean, bl_std, bl_slope, bl_intercept": {
+            "function": "linear_slope_fit",
+            "module": "dspeed.processors",
+            "args": ["waveform[0:50]", "bl_mean", "bl_std", "bl_slope", "bl_intercept"],
+            "unit": ["ADC", "ADC", "ADC", "ADC"],
+        },
+        "wf_max": {
+            "function": "amax",
+            "module": "numpy",
+            "args": ["waveform", 1, "wf_max"],
+            "kwargs": {"signature": "(n),()->()", "types": ["fi->f"]},
+            "unit": "ADC",
+        },
+    },
+}
+
+hit_config = {
+    "outputs": ["energy", "bl_std", "is_valid"],
+    "operations": {
+        "energy": {"expression": "a * (wf_max - bl_mean)", "parameters": {"a": 0.5}},
+        "is_valid": {"expression": "bl_std < 5"},
+    },
+}
+
+
+def test_build_dsp_hit(tmp_path):
+    n_rows = 3456
+    waveform = WaveformTable(
+        values=np.random.default_rng(1).normal(1000, 5, (n_rows, 100)).astype("uint16"),
+        dt=16,
+        t0=0,
+        dt_units="ns",
+        t0_units="ns",
+    )
+    raw_file = str(tmp_path / "raw.lh5")
+    table = Table(col_dict={"waveform": waveform, "timestamp": Array(np.zeros(n_rows))})
+    lh5.write(table, "raw", raw_file)
+
+    dsp_file = str(tmp_path / "dsp.lh5")
+    build_dsp(raw_file, dsp_file, proc_chain, write_mode="r", lh5_tables="raw", base_group="")
+    two_step = str(tmp_path / "hit.lh5")
+    build_hit(dsp_file, hit_config=hit_config, outfile=two_step, lh5_tables=["/dsp"])
+
+    fused = str(tmp_path / "fused.lh5")
+    outputs = build_dsp_hit(raw_file, fused, proc_chain, {}, hit_config, buffer_len=1000)
+    # bl_slope is not used by the hit config
+    assert outputs == ["bl_mean", "bl_std", "wf_max"]
+    fused_dsp = str(tmp_path / "fused_dsp.lh5")
+    fused_2 = str(tmp_path / "fused_2.lh5")
+    build_dsp_hit(raw_file, fused_2, proc_chain, {}, hit_config, dsp_file=fused_dsp)
+
+    with h5py.File(two_step) as f_ref:
+        for file in (fused, fused_2):
+            with h5py.File(file) as f:
+                assert set(f["hit"]) == set(f_ref["hit"])
+                assert dict(f["hit"].attrs) == dict(f_ref["hit"].attrs)
+                for name in f_ref["hit"]:
+                    assert dict(f[f"hit/{name}"].attrs) == dict(f_ref[f"hit/{name}"].attrs)
+                    assert f[f"hit/{name}"][...].tobytes() == f_ref[f"hit/{name}"][...].tobytes()
+    with h5py.File(dsp_file) as f_ref, h5py.File(fused_dsp) as f:
+        for name in proc_chain["outputs"]:
+            assert f[f"dsp/{name}"][...].tobytes() == f_ref[f"dsp/{name}"][...].tobytes()
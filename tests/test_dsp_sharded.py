@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import h5py
+import numpy as np
+from dspeed import build_dsp
+from lgdo import Array, Table, WaveformTable, lh5
+
+from hadesflow.scripts.tier.dsp import _build_dsp_file, build_dsp_sharded
+
+proc_chain = {
+    "outputs": ["timestamp", "bl_mean", "bl_std", "bl_slope", "tp_max"],
+    "processors": {
+        "bl_mean, bl_std, bl_slope, bl_intercept": {
+            "function": "linear_slope_fit",
+            "module": "dspeed.processors",
+            "args": ["waveform[0:50]", "bl_mean", "bl_std", "bl_slope", "bl_intercept"],
+            "unit": ["ADC", "ADC", "ADC", "ADC"],
+        },
+        "tp_max": {
+            "function": "argmax",
+            "module": "numpy",
+            "args": ["waveform", 1, "tp_max"],
+            "kwargs": {"signature": "(n),()->()", "types": ["fi->i"]},
+            "unit": "ns",
+        },
+    },
+}
+
+
+def test_build_dsp_sharded(tmp_path):
+    n_rows = 2345
+    waveform = WaveformTable(
+        values=np.random.default_rng(1).normal(1000, 5, (n_rows, 100)).astype("uint16"),
+        dt=16,
+        t0=0,
+        dt_units="ns",
+        t0_units="ns",
+    )
+    raw_file = str(tmp_path / "raw.lh5")
+    lh5.write(
+        Table(col_dict={"waveform": waveform, "timestamp": Array(np.arange(n_rows, dtype="f8"))}),
+        "raw",
+        raw_file,
+    )
+    serial = str(tmp_path / "serial.lh5")
+    one_buffer = str(tmp_path / "one_buffer.lh5")
+    for dsp_file, buffer_len in ((serial, 500), (one_buffer, n_rows)):
+        build_dsp(
+            raw_file,
+            dsp_file,
+            proc_chain,
+            write_mode="r",
+            buffer_len=buffer_len,
+            lh5_tables="raw",
+            base_group="",
+        )
+    # 5 shards of 500 rows, more than the 2 per worker kept in flight
+    sharded = str(tmp_path / "sharded.lh5")
+    build_dsp_sharded(
+        raw_file,
+        sharded,
+        proc_chain,
+        {},
+        n_workers=2,
+        rows_per_shard=300,
+        buffer_len=500,
+        block_width=16,
+    )
+
+    # the layout is the one of the serial run with the same buffer_len, the values
+    # are compared to a single buffer run, as dspeed 2.0.2 restarts the copied
+    # input columns (timestamp) at every buffer of a serial run
+    with h5py.File(one_buffer) as f:
+        values = {name: f[f"dsp/{name}"][...] for name in proc_chain["outputs"]}
+    with h5py.File(serial) as f_serial, h5py.File(sharded) as f_sharded:
+        assert set(f_sharded["dsp"]) == set(f_serial["dsp"]) == set(proc_chain["outputs"])
+        for name in proc_chain["outputs"]:
+            expected = f_serial[f"dsp/{name}"]
+            result = f_sharded[f"dsp/{name}"]
+            assert result.chunks == expected.chunks
+            assert dict(result.attrs) == dict(expected.attrs)
+            assert result[...].tobytes() == values[name].tobytes(), name
+
+    # in this process, with the write profile applied
+    profiled = str(tmp_path / "profiled.lh5")
+    build_dsp_sharded(
+        raw_file,
+        profiled,
+        proc_chain,
+        {},
+        n_workers=1,
+        rows_per_shard=300,
+        buffer_len=500,
+        block_width=16,
+        profile={"compression": "lzf", "chunk_rows": 100},
+    )
+    with h5py.File(profiled) as f:
+        for name in proc_chain["outputs"]:
+            assert f[f"dsp/{name}"].compression == "lzf"
+            assert f[f"dsp/{name}"].chunks == (100,)
+            assert f[f"dsp/{name}"][...].tobytes() == values[name].tobytes(), name
+
+    # one worker runs the serial build_dsp, which writes with the lgdo defaults
+    single = str(tmp_path / "single.lh5")
+    _build_dsp_file(
+        raw_file, single, proc_chain, {}, {"buffer_len": 500}, {"compression": "lzf"}, None
+    )
+    with h5py.File(single) as f, h5py.File(serial) as g:
+        for name in proc_chain["outputs"]:
+            assert f[f"dsp/{name}"].compression == "gzip"
+            assert f[f"dsp/{name}"][...].tobytes() == g[f"dsp/{name}"][...].tobytes(), name
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import numpy as np
+from lgdo import Array, Table, WaveformTable, lh5
+
+from hadesflow.scripts.tier.dsp_tuning import (
+    chain_hash,
+    store_tuning,
+    tuned_settings,
+    tuning_key,
+    waveform_lengths,
+)
+
+
+def make_raw(path, wf_len):
+    waveform = WaveformTable(values=np.zeros((10, wf_len), dtype="uint16"), dt=16, t0=0)
+    table = Table(col_dict={"waveform": waveform, "timestamp": Array(np.zeros(10))})
+    lh5.write(table, "raw", path)
+    return str(path)
+
+
+def test_tuned_settings(tmp_path):
+    chain = {"outputs": ["a"], "processors": {"a": {"function": "f", "args": ["waveform"]}}}
+    raw_file = make_raw(tmp_path / "raw.lh5", 600)
+    assert waveform_lengths(raw_file) == (600,)
+    assert chain_hash(chain) == chain_hash(dict(reversed(chain.items())))
+
+    cache = tmp_path / "tuning.json"
+    assert tuned_settings(chain, raw_file, cache) == {}
+    best = {"buffer_len": 4000, "block_width": 32, "rows_per_s": 1.0, "peak_rss_mb": 1.0}
+    store_tuning(cache, tuning_key(chain, raw_file), best, [best])
+    assert tuned_settings(chain, raw_file, cache) == {"buffer_len": 4000, "block_width": 32}
+
+    # other waveform length or processing chain
+    assert tuned_settings(chain, make_raw(tmp_path / "raw2.lh5", 800), cache) == {}
+    assert tuned_settings({**chain, "outputs": ["b"]}, raw_file, cache) == {}
+    # the raw file is not opened for a processing chain that was not tuned
+    assert tuned_settings({**chain, "outputs": ["b"]}, tmp_path / "missing.lh5", cache) == {}
+    assert tuned_settings(chain, raw_file, tmp_path / "missing.json") == {}
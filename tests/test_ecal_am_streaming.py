@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from lgdo import Array, Table, lh5
+from pygama.math.distributions import nb_poly
+
+from hadesflow.scripts.pars.hit import ecal_am
+from hadesflow.scripts.pars.hit.ecal_am_streaming import streaming_calibration
+
+hit_dict = {"is_valid_cal": {"expression": "bl_std < 10"}}
+kwarg_dict = {
+    "energy_params": ["cuspEmax"],
+    "cut_param": "is_valid_cal",
+    "threshold": 100,
+    "monitoring_parameters": ["tp_0_est"],
+    "streaming": True,
+    "buffer_len": 4000,
+}
+
+
+def make_dsp(path, n_rows, seed):
+    rng = np.random.default_rng(seed)
+    energy = np.concatenate(
+        [rng.normal(59.5409, 0.6, n_rows // 5), rng.exponential(40, n_rows - n_rows // 5) + 10]
+    )
+    rng.shuffle(energy)
+    table = Table(
+        col_dict={
+            "cuspEmax": Array(energy / 0.0712 + rng.normal(0, 1, n_rows)),
+            "trapTmax": Array(energy / 0.15),
+            "bl_std": Array(rng.exponential(3, n_rows)),
+            "timestamp": Array(np.sort(rng.uniform(0, 3600, n_rows)) + 1.7e9 + 3600 * seed),
+            "bl_mean": Array(rng.normal(15000, 3, n_rows)),
+            "baseline": Array(rng.normal(15000, 3, n_rows).round()),
+            "tp_0_est": Array(rng.normal(48000, 30, n_rows)),
+        }
+    )
+    lh5.write(table, "dsp", str(path), group="ch000")
+    return str(path)
+
+
+def test_streaming_calibration(tmp_path):
+    files = [make_dsp(tmp_path / f"dsp_{i}.lh5", 15000, i) for i in range(2)]
+    plot_options = {
+        "spectrum": {"function": ecal_am.bin_spectrum, "options": None},
+        "survival_fraction": {"function": ecal_am.bin_survival_fraction, "options": {"dx": 2}},
+    }
+    bl_plot_options = {
+        "baseline_stability": {"function": ecal_am.bin_bl_stability, "options": None},
+        "baseline_spectrum": {"function": ecal_am.bin_baseline, "options": None},
+    }
+    streamed = streaming_calibration(
+        files,
+        "ch000/dsp",
+        hit_dict,
+        kwarg_dict,
+        ["cuspEmax_cal"],
+        plot_options=plot_options,
+        bl_plot_options=bl_plot_options,
+    )
+
+    data = ecal_am.load_data(
+        files,
+        "ch000/dsp",
+        hit_dict,
+        params=["cuspEmax", "is_valid_cal", "timestamp", "trapTmax"],
+        threshold=100,
+        cal_energy_param="trapTmax",
+    )
+    e_uncal = data.query("is_valid_cal")["cuspEmax"].to_numpy()
+    hist, bins, _ = ecal_am.guess_histogram(
+        e_uncal, np.nanpercentile(e_uncal, 1), np.nanpercentile(e_uncal, 99.9)
+    )
+    ecal = ecal_am.calibrate_energy(
+        e_uncal, "cuspEmax", ecal_am.energy_guess(hist, bins), kwarg_dict
+    )
+
+    # the calibrations agree within the uncertainty of the peak position
+    streamed_ecal = streamed["calibrations"]["cuspEmax_cal"]
+    peak, streamed_peak = (
+        cal.results["hpge_fit_energy_peaks"]["peak_parameters"][59.5409]
+        for cal in (ecal, streamed_ecal)
+    )
+    assert abs(peak["parameters"]["mu"] - streamed_peak["parameters"]["mu"]) < 2 * (
+        peak["uncertainties"]["mu"]
+    )
+    assert streamed_ecal.pars[1] == pytest.approx(ecal.pars[1], rel=1e-4)
+    assert len(streamed["e_uncal"]["cuspEmax_cal"]) < len(e_uncal) / 2
+
+    # the histograms of the calibrated energies are the same
+    data["cuspEmax_cal"] = nb_poly(data["cuspEmax"].to_numpy(), streamed_ecal.pars)
+    plots = streamed["plots"]["cuspEmax_cal"]
+    spectrum = ecal_am.bin_spectrum(data, "cuspEmax_cal", "is_valid_cal")
+    assert np.array_equal(plots["spectrum"]["counts"], spectrum["counts"])
+    assert np.array_equal(plots["spectrum"]["cut_counts"], spectrum["cut_counts"])
+    survival = ecal_am.bin_survival_fraction(data, "cuspEmax_cal", "is_valid_cal", dx=2)
+    assert np.array_equal(plots["survival_fraction"]["sf"], survival["sf"])
+
+    baseline = ecal_am.baseline_tracking_plots(files, "ch000/dsp", bl_plot_options)
+    streamed_baseline = streamed["baseline_plots"]
+    assert np.array_equal(
+        streamed_baseline["baseline_spectrum"]["bl_array"],
+        baseline["baseline_spectrum"]["bl_array"],
+    )
+    stability, streamed_stability = (
+        bl_plots["baseline_stability"] for bl_plots in (baseline, streamed_baseline)
+    )
+    assert np.array_equal(stability["time"], streamed_stability["time"])
+    assert np.allclose(
+        stability["baseline"], streamed_stability["baseline"], atol=0.01, equal_nan=True
+    )
+    assert np.allclose(stability["spread"], streamed_stability["spread"], equal_nan=True)
+
+    monitored = ecal_am.monitor_parameters(files, "ch000/dsp", ["tp_0_est"])["tp_0_est"]
+    streamed_monitored = streamed["monitoring_parameters"]["tp_0_est"]
+    assert streamed_monitored["mode"] == pytest.approx(monitored["mode"], abs=3)
+    assert streamed_monitored["stdev"] == pytest.approx(monitored["stdev"], abs=3)
+
+    with pytest.raises(ValueError, match="not supported"):
+        streaming_calibration(
+            files,
+            "ch000/dsp",
+            hit_dict,
+            kwarg_dict,
+            ["cuspEmax_cal"],
+            plot_options={"other": {"function": ecal_am.get_median, "options": None}},
+        )
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import glob
+import os
+
+from hadesflow.methods.DirScanner import DirScanner
+from hadesflow.methods.FileIndex import FileIndex
+
+
+def make_tree(root):
+    for det in ("V01", "V02"):
+        for meas in ("th_HS2_top_psa", "am_HS1_lat_ssh"):
+            path = root / det / "c1" / meas
+            path.mkdir(parents=True)
+            for run in range(3):
+                (path / f"char_data-{det}-{meas}-run000{run}-230101T00000{run}.fcio").touch()
+    (root / "V01" / "c1" / ".hidden").touch()
+    (root / "V01" / "c1" / "notes.txt").touch()
+
+
+def test_glob_matches_glob(tmp_path):
+    make_tree(tmp_path)
+    index = FileIndex()
+    for pattern in (
+        "*/c1/*/*.fcio",
+        "V01/c1/th_HS2_top_psa/*-run0001-*",
+        "V0[12]/c1/*",
+        "V01/c1/.*",
+        "V03/c1/*/*",
+        "V01/c1/notes.txt",
+        "V01/c1/notes.txt/*",
+    ):
+        expected = sorted(glob.glob(str(tmp_path / pattern)))
+        assert sorted(index.glob(tmp_path / pattern)) == expected, pattern
+        expected = sorted(glob.glob(str(tmp_path / pattern), include_hidden=True))
+        assert sorted(index.glob(tmp_path / pattern, include_hidden=True)) == expected, pattern
+
+
+def test_persistence(tmp_path):
+    make_tree(tmp_path / "daq")
+    cache_file = tmp_path / "index.json"
+    pattern = tmp_path / "daq" / "*" / "c1" / "*" / "*.fcio"
+
+    index = FileIndex(cache_file)
+    assert len(index.glob(pattern)) == 12
+    index.save()
+
+    # make the listings old enough to be trusted
+    for path, _, _ in os.walk(tmp_path / "daq"):
+        os.utime(path, ns=(0, 0))
+    index = FileIndex(cache_file)
+    index.glob(pattern)
+    index.save()
+
+    index = FileIndex(cache_file)
+    assert len(index.glob(pattern)) == 12
+    assert index.n_scanned == 0
+
+    new_dir = tmp_path / "daq" / "V02" / "c1" / "th_HS2_top_psa"
+    (new_dir / "char_data-V02-th_HS2_top_psa-run0003-230101T000003.fcio").touch()
+    index = FileIndex(cache_file)
+    assert len(index.glob(pattern)) == 13
+    assert index.n_scanned == 1
+
+
+def test_concurrent_scanner(tmp_path):
+    make_tree(tmp_path)
+    calls = []
+
+    def scandir(path):
+        calls.append(path)
+        return os.scandir(path)
+
+    patterns = [f"{tmp_path}/*/c1/*/*.fcio", f"{tmp_path}/V0[12]/c1/*", f"{tmp_path}/V03/*"]
+    serial = FileIndex(scanner=DirScanner(1)).glob_many(patterns)
+    index = FileIndex(scanner=DirScanner(4, scandir=scandir))
+    assert index.glob_many(patterns) == serial
+    assert serial == [sorted(glob.glob(pattern)) for pattern in patterns]
+    # every directory is listed once
+    assert len(calls) == len(set(calls)) == index.n_scanned
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from snakemake.io import expand
+
+from hadesflow.methods.FileKey import FileKey, get_file_pattern
+from hadesflow.methods.patterns import get_pattern_tier
+
+setup = {
+    "paths": {
+        "tier": "/data/tier",
+        "tier_daq": "/data/daq",
+        "tier_raw": "/data/tier/raw",
+        "tier_dsp": "/data/tier/dsp",
+        "tier_hit": "/data/tier/hit",
+    }
+}
+
+daq_file = (
+    "/data/daq/V01/c1/th_HS2_top_psa/char_data-V01-th_HS2_top_psa-run0001-230101T123456.fcio"
+)
+
+
+def test_file_pattern_registry():
+    pattern = get_pattern_tier(setup, "daq", check_in_cycle=False)
+    assert get_file_pattern(pattern) is get_file_pattern(str(pattern))
+    assert get_file_pattern(get_file_pattern(pattern)) is get_file_pattern(pattern)
+    assert get_file_pattern(pattern).match("not/a/daq/file") is None
+
+
+def test_filekeys_from_pattern():
+    pattern = get_pattern_tier(setup, "daq", check_in_cycle=False)
+    key = FileKey.get_filekey_from_pattern(daq_file, pattern)
+    assert key.name == "char_data-V01-c1-th_HS2_top_psa-r001-20230101T123456Z"
+
+    keys = FileKey.get_filekeys_from_pattern([daq_file, "not/a/daq/file", daq_file], pattern)
+    assert keys == [key, None, key]
+
+
+def test_render_matches_expand():
+    key = FileKey.get_filekey_from_pattern(
+        daq_file, get_pattern_tier(setup, "daq", check_in_cycle=False)
+    )
+    for tier in ("raw", "dsp", "hit"):
+        pattern = get_pattern_tier(setup, tier, check_in_cycle=False)
+        expected = expand(pattern, **key._asdict())
+        assert key.get_path_from_filekey(pattern) == expected
+        assert get_file_pattern(pattern).render_many([key, key]) == expected * 2
+
+    pattern = get_pattern_tier(setup, "daq", check_in_cycle=False).with_suffix(".{ext}")
+    assert key.get_path_from_filekey(pattern, ext="*") == expand(pattern, **key._asdict(), ext="*")
+    assert get_file_pattern(pattern).render_many([key], ext="*") == expand(
+        pattern, **key._asdict(), ext="*"
+    )
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from types import SimpleNamespace
+
+from hadesflow.scripts.flow.build_filelist import (
+    filelist_cache,
+    get_filelist_full_wildcards,
+)
+
+
+def make_config(root):
+    return {
+        "paths": {
+            "tier": str(root / "tier"),
+            "tier_daq": str(root / "daq"),
+            "tier_raw": str(root / "tier" / "raw"),
+        }
+    }
+
+
+def test_filelist_cache(tmp_path):
+    path = tmp_path / "daq" / "V01" / "c1" / "th_HS2_top_psa"
+    path.mkdir(parents=True)
+    for i in range(3):
+        (path / f"char_data-V01-th_HS2_top_psa-run0001-23010{i + 1}T000000.fcio").touch()
+    ignore_file = tmp_path / "ignored_cycles.yaml"
+    ignore_file.write_text(
+        "unprocessable:\n  - char_data-V01-c1-th_HS2_top_psa-r001-20230101T000000Z\n"
+    )
+
+    config = make_config(tmp_path)
+    wildcards = SimpleNamespace(
+        experiment="char_data",
+        detector="V01",
+        campaign="c1",
+        measurement="th_HS2_top_psa",
+        run="r001",
+    )
+    search_pattern = (
+        f"{config['paths']['tier_daq']}/{{detector}}/{{campaign}}/{{measurement}}/"
+        "{experiment}-{detector}-{measurement}-{run}-{timestamp}.fcio"
+    )
+
+    filelist_cache.clear()
+    first = get_filelist_full_wildcards(wildcards, config, search_pattern, "raw", ignore_file)
+    assert len(first) == 2
+    first.clear()
+    second = get_filelist_full_wildcards(wildcards, config, search_pattern, "raw", ignore_file)
+    assert len(second) == 2
+    assert filelist_cache.hits["filelist_full_wildcards"] == 1
+    assert filelist_cache.misses["filelist_full_wildcards"] == 1
+
+    # editing the ignore file invalidates the cached results
+    ignore_file.write_text("unprocessable: []\n")
+    stat = ignore_file.stat()
+    os.utime(ignore_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = get_filelist_full_wildcards(wildcards, config, search_pattern, "raw", ignore_file)
+    assert len(third) == 3
+    assert filelist_cache.misses["filelist_full_wildcards"] == 2
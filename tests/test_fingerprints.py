@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+from importlib.metadata import version
+
+from hadesflow.methods import fingerprints
+from hadesflow.methods.fingerprints import (
+    align_mtimes,
+    check_outputs,
+    find_outputs,
+    hash_file,
+    mark_stale,
+    write_fingerprint,
+)
+
+
+def test_fingerprints(tmp_path, monkeypatch):
+    daq, raw, dsp, pars, chain = (
+        tmp_path / name for name in ("run.fcio", "raw.lh5", "dsp.lh5", "pars.yaml", "chain.yaml")
+    )
+    for path in (daq, raw, dsp, pars, chain):
+        path.write_text(path.name)
+    write_fingerprint([raw], [daq], [chain])
+    write_fingerprint([dsp], [raw, pars], [chain])
+    assert find_outputs([tmp_path]) == [dsp, raw]
+    assert check_outputs([dsp, raw, daq]) == {str(dsp): [], str(raw): [], str(daq): None}
+
+    # touching and rebuilding with the same provenance keep the outputs up to date
+    os.utime(chain, ns=(1, 1))
+    raw.write_text("rebuilt")
+    write_fingerprint([raw], [daq], [chain])
+    assert check_outputs([dsp])[str(dsp)] == []
+
+    chain.write_text("changed")
+    assert check_outputs([dsp])[str(dsp)] == [
+        f"input {raw} is stale",
+        f"config {chain} changed",
+    ]
+    chain.write_text(chain.name)
+    daq.write_text("new run")
+    assert check_outputs([raw, dsp]) == {
+        str(raw): [f"input {daq} changed"],
+        str(dsp): [f"input {raw} is stale"],
+    }
+
+    monkeypatch.setattr(fingerprints, "version", lambda _: "0.0")
+    assert f"package dspeed {version('dspeed')} -> 0.0" in check_outputs([raw])[str(raw)]
+
+
+def test_mtimes(tmp_path):
+    raw, dsp, files = (tmp_path / name for name in ("raw.lh5", "dsp.lh5", "dsp.filelist"))
+    raw.write_text("raw")
+    dsp.write_text("dsp")
+    files.write_text(f"{dsp}\n")
+    write_fingerprint([dsp], [raw])
+    write_fingerprint([tmp_path / "par.yaml"], [files])
+    (tmp_path / "par.yaml").write_text("par")
+    os.utime(raw, ns=(4 * 10**18, 4 * 10**18))
+
+    results = check_outputs([tmp_path / "par.yaml"])
+    assert results[str(tmp_path / "par.yaml")] == []
+    assert align_mtimes(results) == [str(dsp)]
+    assert dsp.stat().st_mtime_ns == 4 * 10**18
+
+    mark_stale(dsp)
+    assert dsp.stat().st_mtime_ns == 0
+
+
+def test_hash_file(tmp_path):
+    # a change in the middle of a file larger than a block changes its digest
+    path = tmp_path / "run.fcio"
+    content = bytearray(3 * fingerprints.block_bytes + 1)
+    path.write_bytes(content)
+    digest = hash_file(path)
+    content[len(content) // 2] = 1
+    path.write_bytes(content)
+    assert hash_file(path) != digest
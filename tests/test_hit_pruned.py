@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import sys
+
+import h5py
+import numpy as np
+import pytest
+from lgdo import Array, ArrayOfEqualSizedArrays, Table, lh5
+from pygama.hit import build_hit
+
+from hadesflow.scripts.tier.hit import (
+    build_hit_pruned,
+    reorder_operations,
+    required_columns,
+    run_build_hit,
+    write_hit,
+)
+
+hit_config = {
+    "outputs": ["cuspEmax_ctc_cal", "is_valid", "timestamp", "flags"],
+    "operations": {
+        "cuspEmax_ctc_cal": {
+            "expression": "a + b * cuspEmax_ctc",
+            "parameters": {"a": 0.5, "b": 1.25},
+            "lgdo_attrs": {"units": "keV"},
+        },
+        "cuspEmax_ctc": {"expression": "cuspEmax * (1 + 1e-5 * dt_eff)"},
+        "is_valid": {"expression": "(bl_std < 10) & (tp_0_est > 0)"},
+    },
+    "aggregations": {"flags": {"bit0": "is_valid", "bit1": "is_pileup"}},
+}
+
+
+def test_required_columns():
+    columns = ["cuspEmax", "dt_eff", "bl_std", "tp_0_est", "timestamp", "is_pileup", "wf", "sub"]
+    assert required_columns(hit_config, columns) == {
+        "cuspEmax",
+        "dt_eff",
+        "bl_std",
+        "tp_0_est",
+        "timestamp",
+        "is_pileup",
+    }
+    nested = {"outputs": ["x"], "operations": {"x": {"expression": "np.sum(sub__y)"}}}
+    assert required_columns(nested, columns) == {"sub"}
+    assert required_columns({"operations": {}}, columns) is None
+
+
+def test_reorder_operations():
+    assert list(reorder_operations(hit_config["operations"])) == [
+        "cuspEmax_ctc",
+        "cuspEmax_ctc_cal",
+        "is_valid",
+    ]
+
+
+def test_build_hit_pruned(tmp_path):
+    rng = np.random.default_rng(1)
+    n_rows = 1234
+    dsp = Table(
+        col_dict={
+            "cuspEmax": Array(rng.uniform(0, 3000, n_rows)),
+            "dt_eff": Array(rng.uniform(0, 500, n_rows)),
+            "bl_std": Array(rng.uniform(0, 20, n_rows)),
+            "tp_0_est": Array(rng.uniform(-10, 100, n_rows)),
+            "timestamp": Array(np.arange(n_rows, dtype="f8")),
+            "is_pileup": Array(rng.integers(0, 2, n_rows).astype(bool)),
+            "wf": ArrayOfEqualSizedArrays(nda=rng.normal(size=(n_rows, 200))),
+        }
+    )
+    dsp_file = str(tmp_path / "dsp.lh5")
+    lh5.write(dsp, "dsp", dsp_file)
+
+    full = str(tmp_path / "full.lh5")
+    build_hit(dsp_file, hit_config=hit_config, outfile=full, lh5_tables=["/dsp"], buffer_len=500)
+    pruned = str(tmp_path / "pruned.lh5")
+    skipped = build_hit_pruned(dsp_file, pruned, hit_config, buffer_len=500)
+    assert set(skipped) == {"wf"}
+    assert skipped["wf"] > 0
+    profiled = str(tmp_path / "profiled.lh5")
+    write_hit(dsp_file, profiled, hit_config, buffer_len=500, profile={"compression": "lzf"})
+
+    with h5py.File(full) as f_full:
+        for file in (pruned, profiled):
+            with h5py.File(file) as f_hit:
+                assert set(f_full["hit"]) == set(f_hit["hit"])
+                for name in f_full["hit"]:
+                    assert dict(f_full[f"hit/{name}"].attrs) == dict(f_hit[f"hit/{name}"].attrs)
+                    assert (
+                        f_full[f"hit/{name}"][...].tobytes() == f_hit[f"hit/{name}"][...].tobytes()
+                    )
+        with h5py.File(profiled) as f_hit:
+            assert f_hit["hit/timestamp"].compression == "lzf"
+
+    # options of build_hit that the pruned loop does not implement
+    with pytest.raises(TypeError, match="n_max"):
+        build_hit_pruned(dsp_file, str(tmp_path / "n_max.lh5"), hit_config, n_max=10)
+
+
+def test_run_build_hit_pruned(tmp_path, monkeypatch):
+    # build_log redirects stderr and sets the excepthook
+    monkeypatch.setattr(sys, "stderr", sys.stderr)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    n_rows = 100
+    dsp = Table(
+        col_dict={
+            name: Array(np.ones(n_rows))
+            for name in ("cuspEmax", "dt_eff", "bl_std", "tp_0_est", "timestamp", "wf")
+        }
+    )
+    dsp.add_field("is_pileup", Array(np.zeros(n_rows, dtype=bool)))
+    dsp_file = str(tmp_path / "dsp.lh5")
+    lh5.write(dsp, "dsp", dsp_file)
+    for name, content in (
+        ("config.json", hit_config),
+        ("pars.json", {"pars": {}}),
+        ("logging.json", {}),
+    ):
+        (tmp_path / name).write_text(json.dumps(content))
+
+    log_file = tmp_path / "hit.log"
+    run_build_hit(
+        [
+            "--config",
+            str(tmp_path / "config.json"),
+            "--pars",
+            str(tmp_path / "pars.json"),
+            "--log",
+            str(log_file),
+            "--log-config",
+            str(tmp_path / "logging.json"),
+            "--input",
+            dsp_file,
+            "--output",
+            str(tmp_path / "hit.lh5"),
+            "--prune-columns",
+        ]
+    )
+    assert "dsp columns not read: wf" in log_file.read_text()
+    assert "MB of dsp data" in log_file.read_text()
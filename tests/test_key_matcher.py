@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+from hadesflow.methods.KeyMatcher import KeyMatcher, compile_ignore_keys, load_ignore_keys
+
+run = "char_data-V01-c1-th_HS2_top_psa-r001"
+
+
+def test_rules():
+    matcher = KeyMatcher(
+        [
+            f"{run}-20230101T000000Z",
+            "char_data-V02-c1-*",
+            "char_data-V03-c1-am_HS1_lat_ssh",
+            {"key": run, "from": "20230105T000000Z", "to": "20230106T000000Z"},
+            {"key": run, "from": "230110T000000"},
+            {"key": "char_data-V04-c1-th_HS2_top_psa-r001-20230101T000000Z"},
+        ]
+    )
+    assert f"{run}-20230101T000000Z" in matcher
+    assert f"{run}-20230102T000000Z" not in matcher
+    assert "char_data-V02-c1-th_HS2_top_psa-r004-20230102T000000Z" in matcher
+    assert "char_data-V03-c1-am_HS1_lat_ssh-r001-20230102T000000Z" in matcher
+    assert "char_data-V03-c1-th_HS2_top_psa-r001-20230102T000000Z" not in matcher
+    assert f"{run}-20230105T120000Z" in matcher
+    assert f"{run}-20230106T000000Z" in matcher
+    assert f"{run}-20230107T000000Z" not in matcher
+    assert f"{run}-20240101T000000Z" in matcher
+    assert "char_data-V01-c1-th_HS2_top_psa-r002-20230105T120000Z" not in matcher
+    assert "char_data-V04-c1-th_HS2_top_psa-r001-20230101T000000Z" in matcher
+    assert "char_data-V04-c1-th_HS2_top_psa-r001-20230102T000000Z" not in matcher
+
+    with pytest.raises(ValueError, match="empty timestamp range"):
+        KeyMatcher([{"key": run, "from": "20230106T000000Z", "to": "20230105T000000Z"}])
+    with pytest.raises(ValueError, match="full key and a timestamp range"):
+        KeyMatcher([{"key": f"{run}-20230101T000000Z", "from": "20230101T000000Z"}])
+
+
+def test_sections():
+    matchers = compile_ignore_keys({"removed": [f"{run}-*"], "unprocessable": None})
+    assert f"{run}-20230101T000000Z" in matchers["removed"]
+    assert len(matchers["unprocessable"]) == 0
+    assert set(compile_ignore_keys([f"{run}-*"])) == {"unprocessable"}
+
+
+def test_load_cache(tmp_path):
+    ignore_file = tmp_path / "ignored_cycles.yaml"
+    ignore_file.write_text(f"removed:\n  - {run}-20230101T000000Z\n")
+    matchers = load_ignore_keys(ignore_file)
+    assert f"{run}-20230101T000000Z" in matchers["removed"]
+    assert (tmp_path / ".ignored_cycles.yaml.matcher.pkl").is_file()
+
+    # a modified file is compiled again
+    ignore_file.write_text(f"removed:\n  - {run}-20230102T000000Z\n  - {run}-20230103T000000Z\n")
+    matchers = load_ignore_keys(ignore_file)
+    assert f"{run}-20230101T000000Z" not in matchers["removed"]
+    assert len(matchers["removed"]) == 2
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import pytest
+
+from hadesflow.methods import FileKey, KeyTable
+from hadesflow.methods.utils import run_splitter
+
+names = [
+    "char_data-V01-c1-th_HS2_top_psa-r001-20230101T000000Z",
+    "char_data-V01-c1-th_HS2_top_psa-r002-20230102T000000Z",
+    "char_data-V01-c1-th_HS2_top_psa-r001-20230101T010000Z",
+    "char_data-V02-c1-am_HS1_lat_ssh-r001-20230103T000000Z",
+    "char_data-V01-c1-th_HS2_top_psa-r002-20230102T010000Z",
+    "char_data-V01-c1-th_HS2_top_psa-r002-20230102T020000Z",
+]
+
+
+def test_round_trip(tmp_path):
+    table = KeyTable.from_names(names)
+    assert len(table) == len(names)
+    assert table.to_names() == names
+    assert KeyTable.from_filekeys(table.to_filekeys()) == table
+    assert table.to_filekeys()[0] == FileKey.parse_keypart(f"-{names[0]}")
+
+    table.to_keylist(tmp_path / "all.keylist")
+    assert KeyTable.from_keylist(tmp_path / "all.keylist") == table
+
+    with pytest.raises(ValueError, match="20231301T000000Z"):
+        KeyTable.from_names(["char_data-V01-c1-th-r001-20231301T000000Z"])
+
+
+def test_selection():
+    table = KeyTable.from_names(names)
+    assert len(table.filter(detector="V01")) == 5
+    assert len(table.filter(measurement="th_*", run=["r002"])) == 3
+    assert len(table.filter(start="20230102T000000Z", stop="20230102T010000Z")) == 2
+    assert table.select("-char_data-V02").to_names() == [names[3]]
+    assert table.sort().to_names() == sorted(names, key=lambda name: name[-16:])
+
+
+def test_runs():
+    table = KeyTable.from_names(names)
+    runs = table.group_by_run()
+    assert len(runs) == 3
+    assert runs[("char_data", "V01", "c1", "th_HS2_top_psa", "r001")].to_names() == sorted(
+        [names[0], names[2]]
+    )
+    assert table.longest_run().to_names() == [names[1], names[4], names[5]]
+
+    files = [f"{name.replace('-c1', '')}-tier_raw.lh5" for name in names]
+    assert run_splitter(files) == [
+        [files[i] for i in (0, 2, 3)],
+        [files[i] for i in (1, 4, 5)],
+    ]
+
+
+def test_lazy_export():
+    # the key utilities do not load numpy, both import orders give the class
+    code = (
+        "import sys\n"
+        "import hadesflow.methods\n"
+        "assert 'numpy' not in sys.modules\n"
+        "import hadesflow.methods.KeyTable\n"
+        "from hadesflow.methods import KeyTable\n"
+        "assert isinstance(KeyTable, type)\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from hadesflow.methods import props_cache
+from hadesflow.methods.props_cache import read_props
+
+
+def test_read_props(tmp_path, monkeypatch):
+    monkeypatch.setenv("HADESFLOW_PARS_CACHE", str(tmp_path / "cache"))
+    first = tmp_path / "a.yaml"
+    first.write_text("a: 1\nb: {c: 2}\n")
+    second = tmp_path / "b.json"
+    second.write_text('{"b": {"d": 3}}')
+
+    assert read_props([first, second]) == {"a": 1, "b": {"c": 2, "d": 3}}
+    assert len(list((tmp_path / "cache").glob("*/*.pkl"))) == 1
+
+    # served from the cache, not from the files
+    calls = []
+    monkeypatch.setattr(
+        "dbetto.Props.read_from", lambda *args: calls.append(args) or {"parsed": True}
+    )
+    assert read_props([first, second]) == {"a": 1, "b": {"c": 2, "d": 3}}
+    # the merge order is part of the key
+    assert read_props([second, first]) == {"parsed": True}
+    first.write_text("a: 4\n")
+    assert read_props(first) == {"parsed": True}
+    assert len(calls) == 2
+
+
+def test_read_props_memory(tmp_path, monkeypatch):
+    monkeypatch.setenv("HADESFLOW_PARS_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(props_cache, "_memory", {})
+    file = tmp_path / "config.yaml"
+    file.write_text("a: 1\n")
+    first = read_props(file)
+    first["a"] = 2
+    assert read_props(file) == {"a": 1}
+    assert len(props_cache._memory) == 1
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from hadesflow.methods.QuantileSketch import QuantileSketch
+
+
+def test_quantile_sketch():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.normal(600, 10, 20000), -rng.exponential(50, 5000), [0, np.nan]])
+    sketch = QuantileSketch(1e-3)
+    for chunk in np.array_split(values, 7):
+        sketch.add(chunk)
+    assert sketch.count == len(values) - 1
+    assert (sketch.min, sketch.max) == (np.nanmin(values), np.nanmax(values))
+    for p in (0, 1, 10, 50, 99, 99.9, 100):
+        expected = np.nanpercentile(values, p)
+        assert sketch.percentile(p) == pytest.approx(expected, rel=1e-3, abs=1e-9)
+    assert sketch.mode(100, 1000) == pytest.approx(600, abs=2)
+
+    # values far from 0 are sketched to an offset near them
+    baselines = rng.normal(15000, 3, 10000)
+    centred = QuantileSketch(1e-3, offset=15000)
+    centred.add(baselines)
+    assert centred.percentile(50) == pytest.approx(np.median(baselines), abs=0.01)
+
+    assert np.isnan(QuantileSketch().quantile(0.5))
+    with pytest.raises(ValueError, match="relative_accuracy"):
+        QuantileSketch(0)
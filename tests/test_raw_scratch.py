@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from hadesflow.scripts.tier import raw
+from hadesflow.scripts.tier.dsp import _parse_args
+
+
+def test_scratch_raw_file(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_build_raw_file(in_stream, out_spec, profile=None, filekey=None):
+        calls.append((in_stream, out_spec, profile))
+        Path(filekey).write_text(in_stream)
+
+    monkeypatch.setattr(raw, "build_raw_file", fake_build_raw_file)
+    with raw.scratch_raw_file(
+        "run.fcio", "spec.json", "raw.lh5", scratch=tmp_path, profile={"shuffle": True}
+    ) as raw_file:
+        assert Path(raw_file).read_text() == "run.fcio"
+        assert Path(raw_file).parent.parent == tmp_path
+    assert calls == [("run.fcio", "spec.json", {"shuffle": True})]
+    assert list(tmp_path.iterdir()) == []
+
+    def failing_dsp():
+        with raw.scratch_raw_file("run.fcio", "spec.json", "raw.lh5", scratch=tmp_path):
+            msg = "dsp failed"
+            raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError, match="dsp failed"):
+        failing_dsp()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_dsp_raw_input_args():
+    common = ["--processing-chain", "chain.yaml", "--output", "dsp.lh5"]
+    assert _parse_args([*common, "--input", "raw.lh5"]).daq_input is None
+    args = _parse_args(
+        [
+            *common,
+            "--daq-input",
+            "run.fcio",
+            "--raw-config",
+            "spec.json",
+            "--raw-write-profile",
+            '{"shuffle": true}',
+        ]
+    )
+    assert args.raw_write_profile == {"shuffle": True}
+    for argv in (
+        common,
+        [*common, "--input", "raw.lh5", "--daq-input", "run.fcio", "--raw-config", "spec.json"],
+        [*common, "--daq-input", "run.fcio"],
+    ):
+        with pytest.raises(SystemExit):
+            _parse_args(argv)
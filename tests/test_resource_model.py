@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from hadesflow.methods.ResourceModel import ResourceModel, input_size_mb
+from hadesflow.scripts.flow.resource_model import report, update_resource_model
+
+
+def records(rule, measurement, n=10):
+    return [
+        {
+            "rule": rule,
+            "measurement": measurement,
+            "input_mb": 100.0 * i,
+            "runtime_s": 60 + 2.0 * 100 * i,
+            "max_rss_mb": 500 + 0.5 * 100 * i,
+            "runtime": 300,
+            "mem_mb": None,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def test_fit_predict():
+    model = ResourceModel()
+    model.fit(records("build_dsp", "th") + records("build_hit", "th", n=3))
+
+    assert model.predict("build_dsp", "th", "runtime_s", 500, margin=False) == pytest.approx(1060)
+    assert model.predict("build_dsp", "am", "max_rss_mb", 500) >= 750
+    # too few records
+    assert model.predict("build_hit", "th", "runtime_s", 500) is None
+
+    # no input, 60 s
+    wildcards = {"measurement": "th"}
+    assert model.runtime("build_dsp", 300)(wildcards, [], 1) == 1
+    assert model.runtime("build_dsp", 300)(wildcards, [], 2) == 2
+    assert model.runtime("build_hit", 300)(wildcards, [], 2) == 600
+    assert model.mem_mb("build_dsp")(wildcards, [], 1) == 500
+    assert model.mem_mb("build_hit")(wildcards, [], 1) is None
+
+
+def test_input_size(tmp_path):
+    (tmp_path / "a.lh5").write_bytes(b"0" * 1024**2)
+    (tmp_path / "b.lh5").write_bytes(b"0" * 2 * 1024**2)
+    (tmp_path / "all.filelist").write_text(f"{tmp_path / 'a.lh5'}\n{tmp_path / 'b.lh5'}\n")
+    assert input_size_mb([tmp_path / "all.filelist", tmp_path / "missing.lh5"]) == 3
+    assert ResourceModel().input_mb({}, [str(tmp_path / "a.lh5")]) == 1
+
+
+def test_update_resource_model(tmp_path):
+    benchmarks = tmp_path / "benchmark" / "20250101T000000Z" / "tier_dsp"
+    benchmarks.mkdir(parents=True)
+    for i, record in enumerate(records("build_dsp", "th")):
+        entry = {
+            "s": f"{record['runtime_s']:.4f}",
+            "max_rss": record["max_rss_mb"] if i else "NA",
+            "rule_name": "build_dsp",
+            "wildcards": {"measurement": "th"},
+            "resources": {"input_mb": record["input_mb"], "runtime": 300},
+            "input_size_mb": {},
+        }
+        (benchmarks / f"{i}.jsonl").write_text(json.dumps(entry) + "\n")
+
+    model_file = tmp_path / "model.json"
+    assert update_resource_model(tmp_path / "benchmark", model_file) == 10
+    assert update_resource_model(tmp_path / "benchmark", model_file) == 0
+    model = ResourceModel(model_file)
+    assert model.rules["build_dsp"]["measurements"]["th"]["max_rss_mb"]["n"] == 9
+    assert model.predict("build_dsp", "th", "runtime_s", 500) >= 1060
+
+    text = report(model_file)
+    assert "build_dsp" in text
+    assert "20250101T000000Z" in text
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import pytest
+
+from hadesflow.methods.StartupCache import StartupCache, tree_fingerprint
+
+
+def test_startup_cache(tmp_path):
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    (config_dir / "validity.yaml").write_text("[]\n")
+    cache_file = tmp_path / "startup" / "startup_cache.json"
+    calls = []
+
+    def compile_catalog():
+        calls.append("catalog")
+        return {"n_calls": len(calls)}
+
+    for _ in range(2):
+        startup = StartupCache(cache_file)
+        value = startup.cached("catalog", lambda: tree_fingerprint(config_dir), compile_catalog)
+        assert value == {"n_calls": 1}
+        startup.run("probes", lambda: "env", lambda: calls.append("probes"))
+    assert calls == ["catalog", "probes"]
+    assert startup.timings["catalog"][1]
+    assert "(cached)" in startup.report()
+
+    (config_dir / "validity.yaml").write_text("[1]\n")
+    startup = StartupCache(cache_file)
+    assert startup.cached("catalog", lambda: tree_fingerprint(config_dir), compile_catalog) == {
+        "n_calls": 3
+    }
+
+    # without a cache file every step runs
+    startup = StartupCache()
+    startup.run("probes", lambda: "env", lambda: calls.append("probes"))
+    assert calls[-1] == "probes"
+    assert len(calls) == 4
+
+    # a failing phase is still timed
+    def checkout():
+        with startup.phase("checkout"):
+            msg = "checkout failed"
+            raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError, match="checkout failed"):
+        checkout()
+    assert "checkout" in startup.timings
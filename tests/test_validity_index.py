@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+from dbetto.catalog import Catalog
+from dbetto.time import unix_time
+
+from hadesflow.methods.ValidityIndex import ValidityIndex, get_validity_index
+
+
+def make_catalog():
+    def entries(*timestamps):
+        return [
+            Catalog.Entry(unix_time(ts), {"snakemake_rules": {"tier_dsp": {"ts": ts}}})
+            for ts in timestamps
+        ]
+
+    return Catalog(
+        {
+            "all": entries("20230101T000000Z", "20230601T000000Z"),
+            "th_HS2_top_psa": entries("20230301T000000Z", "20230401T120000Z"),
+        }
+    )
+
+
+def test_valid_for_matches_catalog():
+    catalog = make_catalog()
+    index = ValidityIndex(catalog)
+    for ts in (
+        "20230101T000000Z",
+        "20230215T000000Z",
+        "20230301T000000Z",
+        "20230401T115959Z",
+        "20230401T120000Z",
+        "20230701T000000Z",
+    ):
+        for system in ("all", "th_HS2_top_psa", "am_HS1_lat_ssh"):
+            assert index.valid_for(ts, system=system) is catalog.valid_for(ts, system=system)
+            assert (
+                index.snakemake_rules(ts, system)
+                is catalog.valid_for(ts, system=system)["snakemake_rules"]
+            )
+
+    with pytest.raises(RuntimeError):
+        index.valid_for("20220101T000000Z", system="th_HS2_top_psa")
+    assert index.valid_for("20220101T000000Z", allow_none=True) is None
+    assert get_validity_index(catalog) is get_validity_index(catalog)
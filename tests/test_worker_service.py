@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+
+from hadesflow.scripts.flow.worker_service import submit
+
+
+def test_submit_without_service(tmp_path, monkeypatch):
+    monkeypatch.delenv("HADESFLOW_NO_WORKER", raising=False)
+    # no socket, the caller runs in-process
+    assert not submit("dsp", [], path=str(tmp_path / "missing.sock"))
+    # stale socket file left by a killed service
+    (tmp_path / "stale.sock").touch()
+    assert not submit("dsp", [], path=str(tmp_path / "stale.sock"))
+
+
+def test_submit_service_replies(tmp_path, monkeypatch):
+    monkeypatch.delenv("HADESFLOW_NO_WORKER", raising=False)
+    replies = [
+        {"status": "broken", "error": "BrokenProcessPool"},
+        None,
+        {"status": "error", "error": "ValueError: bad config"},
+        "sleep",
+        {"status": "ok"},
+    ]
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            assert json.loads(self.rfile.readline())["task"] == "dsp"
+            reply = replies.pop(0)
+            if reply == "sleep":
+                time.sleep(0.5)
+            elif reply is not None:
+                self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    path = str(tmp_path / "worker.sock")
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        # a broken pool or a closed connection, the caller runs in-process
+        assert not submit("dsp", [], path=path)
+        assert not submit("dsp", [], path=path)
+        # a job failing in the service fails the caller
+        with pytest.raises(RuntimeError, match="bad config"):
+            submit("dsp", [], path=path)
+        with pytest.raises(TimeoutError, match="no reply"):
+            submit("dsp", [], path=path, timeout=0.1)
+        assert submit("dsp", [], path=path)
+        server.shutdown()
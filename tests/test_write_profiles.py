@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import h5py
+import numpy as np
+import pytest
+from lgdo import Array, Table, VectorOfVectors, lh5
+
+from hadesflow.methods.write_profiles import apply_profile, get_write_profile
+
+
+def test_apply_profile(tmp_path):
+    table = Table(
+        col_dict={
+            "a": Array(np.arange(1000.0)),
+            "b": Array(np.ones((1000, 8))),
+            "c": VectorOfVectors([[1, 2]] * 1000),
+        }
+    )
+
+    profile = {"compression": "lzf", "shuffle": False, "chunk_rows": 256}
+    h5py_kwargs = apply_profile(table, profile)
+    assert h5py_kwargs == {"compression": "lzf", "shuffle": False}
+    lh5.write(table, "dsp", tmp_path / "out.lh5", **h5py_kwargs)
+
+    with h5py.File(tmp_path / "out.lh5", "r") as f:
+        assert f["dsp/a"].compression == "lzf"
+        assert not f["dsp/a"].shuffle
+        assert f["dsp/a"].chunks == (256,)
+        assert f["dsp/b"].chunks == (256, 8)
+        assert f["dsp/c/cumulative_length"].chunks == (256,)
+        assert "hdf5_settings" not in f["dsp/a"].attrs
+    assert np.array_equal(lh5.read("dsp/b", tmp_path / "out.lh5").nda, table["b"].nda)
+
+
+def test_get_write_profile():
+    setup = {"lh5_write_profiles": {"dsp": {"compression": "gzip", "chunk_rows": 100}}}
+    assert get_write_profile(setup, "dsp") == {"compression": "gzip", "chunk_rows": 100}
+    assert get_write_profile(setup, "hit") == {}
+    assert get_write_profile({}, "raw") == {}
+    with pytest.raises(ValueError, match="unknown"):
+        get_write_profile({"lh5_write_profiles": {"dsp": {"level": 4}}}, "dsp")
+    with pytest.raises(ValueError, match="chunk_rows"):
+        get_write_profile({"lh5_write_profiles": {"dsp": {"chunk_rows": 0}}}, "dsp")
+    with pytest.raises(ValueError, match="raw"):
+        get_write_profile({"lh5_write_profiles": {"raw": {"chunk_rows": 100}}}, "raw")
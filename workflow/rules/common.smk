@@ -2,15 +2,16 @@
 Helper functions for running data production
 """
 
-import pathlib, os
-import snakemake as smk
-from dbetto import AttrsDict
+import functools, json, pathlib, os
+from fnmatch import fnmatchcase
+from dbetto import AttrsDict, Props, TextDB
+from dbetto.catalog import Catalog
 from hadesflow.methods.utils import (
     run_splitter,
     convert_to_daq_timestamp,
     convert_to_daq_run,
 )
-from hadesflow.methods.FileKey import ProcessingFileKey
+from hadesflow.methods.FileKey import ProcessingFileKey, get_file_pattern
 from hadesflow.methods.patterns import (
     # par_overwrite_path,
     get_pattern_pars,
@@ -19,7 +20,13 @@ from hadesflow.methods.patterns import (
 )
 from hadesflow.scripts.flow.build_filelist import get_filelist_full_wildcards
 from hadesflow.methods.paths import tier_daq_path
-from legenddataflowscripts.workflow import as_ro
+from hadesflow.methods.write_profiles import get_write_profile
+from hadesflow.methods.CalibrationMap import get_calibration_map
+from hadesflow.methods.ValidityIndex import get_validity_index
+from legenddataflowscripts.workflow import as_ro, execenv_pyexe
+
+
+calibration_map = get_calibration_map(config)
 
 
 def ro(path):
@@ -51,7 +58,53 @@ def get_daq_file(wildcards):
     wildcards = dict(wildcards)
     wildcards["timestamp"] = convert_to_daq_timestamp(wildcards["timestamp"])
     wildcards["run"] = convert_to_daq_run(wildcards["run"])
-    return smk.io.expand(get_pattern_tier_daq(config), **wildcards)[0]
+    return get_file_pattern(get_pattern_tier_daq(config)).render(wildcards)
+
+
+def raw_on_scratch(wildcards):
+    """
+    Whether the dsp job builds its raw input from the DAQ file on node-local
+    scratch (raw_scratch in the config) instead of reading it from the raw tier
+    """
+    settings = config.get("raw_scratch", {})
+    if not settings.get("enabled", False):
+        return False
+    # the parameter rules read the raw files of the calibration measurements
+    if calibration_map.is_source(wildcards.measurement):
+        return False
+    if any(fnmatchcase(wildcards.measurement, pattern) for pattern in settings.get("archive", [])):
+        return False
+    raw_pattern = get_pattern_tier(config, "raw", check_in_cycle=False)
+    return not os.path.exists(get_file_pattern(raw_pattern).render(dict(wildcards)))
+
+
+def get_dsp_raw_input(wildcards):
+    if raw_on_scratch(wildcards):
+        return get_daq_file(wildcards)
+    raw_pattern = get_pattern_tier(config, "raw", check_in_cycle=False)
+    return get_file_pattern(raw_pattern).render(dict(wildcards))
+
+
+def get_dsp_raw_options(wildcards, raw_file):
+    """
+    The input options of build-dsp-hades for the raw input of get_dsp_raw_input
+    """
+    if raw_file != get_daq_file(wildcards):
+        return f"--input {raw_file}"
+    raw_config = get_config_files(
+        dataflow_configs_texdb,
+        wildcards.timestamp,
+        wildcards.measurement,
+        wildcards.detector,
+        "tier_raw",
+        "raw_config",
+    )
+    options = (
+        f"--daq-input {raw_file} --raw-config {raw_config} "
+        f"--raw-write-profile '{json.dumps(get_write_profile(config, 'raw'))}'"
+    )
+    scratch = config.get("raw_scratch", {}).get("path")
+    return options if scratch is None else f"{options} --scratch {scratch}"
 
 
 def expand_wildcard_to_file(wildcards, tier):
@@ -71,33 +124,30 @@ def expand_wildcard_to_file(wildcards, tier):
     )
 
 
-def get_par_file(wildcards, tier):
-
-    measurement = wildcards.measurement
-    wildcards = AttrsDict(dict(wildcards))
-
-    if Path(
-        str(get_pattern_tier_daq(config).parent)
-        .replace("{campaign}", wildcards.campaign)
-        .replace("{detector}", wildcards.detector)
-        .replace("{measurement}", "th_HS2_lat_psa")
-    ).is_dir():
-        wildcards["measurement"] = "th_HS2_lat_psa"
-    else:
-        wildcards["measurement"] = "th_HS2_top_psa"
-
-    wildcards["run"] = "*"
-    wildcards["timestamp"] = "*"
+@functools.cache
+def _get_par_file(experiment, detector, campaign, measurement, tier):
+    wildcards = AttrsDict(
+        {
+            "experiment": experiment,
+            "detector": detector,
+            "campaign": campaign,
+            "measurement": measurement,
+            "run": "*",
+            "timestamp": "*",
+        }
+    )
+    return tuple(expand_wildcard_to_file(wildcards, tier))
 
-    files = expand_wildcard_to_file(wildcards, tier)
 
-    if (
-        measurement
-        in ["am_HS1_lat_ssh", "am_HS1_top_ssh", "am_HS1_lat_dlt", "am_HS1_top_dlt"]
-        and tier == "hit"
+def get_par_file(wildcards, tier):
+    # the calibration measurements are looked up in the map built at workflow start
+    files = []
+    for measurement in calibration_map.get_sources(
+        wildcards.detector, wildcards.campaign, wildcards.measurement, tier
     ):
-        wildcards["measurement"] = "am_HS1_lat_dlt"
-        files += expand_wildcard_to_file(wildcards, tier)
+        files += _get_par_file(
+            wildcards.experiment, wildcards.detector, wildcards.campaign, measurement, tier
+        )
     return files
 
     # if wildcards.measurement == "bkg":
@@ -108,23 +158,67 @@ def get_par_file(wildcards, tier):
     #     measurement = "am_HS1_lat_ssh"
 
 
-def get_config_files(config_db, timestamp, measurement, channel, rule_name, field):
+def get_snakemake_rules(config_db, timestamp, measurement):
     if isinstance(config_db, (str, Path)):
         config_db = TextDB(config_db, lazy=True)
-    rule_dict = config_db.valid_for(timestamp, system=measurement)["snakemake_rules"][
-        rule_name
-    ]["inputs"][field]
+    if isinstance(config_db, Catalog):
+        # one binary search and one resolution per (timestamp, measurement)
+        return get_validity_index(config_db).snakemake_rules(timestamp, measurement)
+    return config_db.valid_for(timestamp, system=measurement)["snakemake_rules"]
+
+
+def get_config_files(config_db, timestamp, measurement, channel, rule_name, field):
+    rule_dict = get_snakemake_rules(config_db, timestamp, measurement)[rule_name][
+        "inputs"
+    ][field]
 
     return ro(rule_dict[channel] if channel in rule_dict else rule_dict["__default__"])
 
 
+def get_dsp_settings(wildcards):
+    """
+    The settings file of build-dsp-hades (settings in the tier_dsp inputs of
+    the snakemake rules), None if there is none
+    """
+    rules = get_snakemake_rules(dataflow_configs_texdb, wildcards.timestamp, wildcards.measurement)
+    settings = rules["tier_dsp"]["inputs"].get("settings")
+    if settings is None:
+        return None
+    detector = wildcards.detector if wildcards.detector in settings else "__default__"
+    return ro(settings[detector])
+
+
+@functools.cache
+def _read_dsp_settings(path):
+    return Props.read_from(path)
+
+
+def get_dsp_workers(wildcards):
+    """
+    Threads of a build_dsp job, n_workers of its settings
+    """
+    settings = get_dsp_settings(wildcards)
+    return 1 if settings is None else _read_dsp_settings(str(settings)).get("n_workers", 1)
+
+
 def get_log_config(config_db, timestamp, measurement, rule_name):
-    if isinstance(config_db, (str, Path)):
-        config_db = TextDB(config_db, lazy=True)
     return ancient(
         ro(
-            config_db.valid_for(timestamp, system=measurement)["snakemake_rules"][
-                rule_name
-            ]["options"]["logging"]
+            get_snakemake_rules(config_db, timestamp, measurement)[rule_name]["options"][
+                "logging"
+            ]
         )
     )
+
+
+def fingerprint_cmd(configs="{params.config_file}"):
+    """
+    Shell command appended to the one of a rule, writing the content fingerprints
+    of its outputs (see hadesflow/methods/fingerprints.py)
+    """
+    return (
+        " && "
+        + execenv_pyexe(config, "hades-fingerprint")
+        + "write --outputs {output} --inputs {input} --configs "
+        + configs
+    )
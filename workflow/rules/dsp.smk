@@ -7,20 +7,24 @@ Snakemake rules for processing dsp tier. This is done in 4 steps:
 """
 
 from hadesflow.methods.patterns import (
+    get_pattern_benchmark,
     get_pattern_plts_tmp,
     get_pattern_plts,
     get_pattern_tier,
+    get_pattern_tier_daq,
     get_pattern_pars_tmp,
     get_pattern_log,
     get_pattern_pars,
     get_pattern_log_par,
 )
+from hadesflow.methods.write_profiles import get_write_profile
 from legenddataflowscripts.workflow import execenv_pyexe
+import json
 
 
 rule build_dsp:
     input:
-        raw_file=get_pattern_tier(config, "raw", check_in_cycle=False),
+        raw_file=get_dsp_raw_input,
         pars_file=lambda wildcards: get_par_file(wildcards, "dsp"),
     params:
         config_file=lambda wildcards: get_config_files(
@@ -37,19 +41,44 @@ rule build_dsp:
             wildcards.measurement,
             "tier_dsp",
         ),
+        write_profile=json.dumps(get_write_profile(config, "dsp")),
+        raw_input=lambda wildcards, input: get_dsp_raw_options(wildcards, input.raw_file),
+        settings=lambda wildcards: (
+            ""
+            if get_dsp_settings(wildcards) is None
+            else f"--settings {get_dsp_settings(wildcards)}"
+        ),
+        tuning_cache=(
+            ""
+            if paths.dsp_tuning_path(config) is None
+            else f"--tuning-cache {paths.dsp_tuning_path(config)}"
+        ),
     output:
         tier_file=get_pattern_tier(config, "dsp", check_in_cycle=check_in_cycle),
     log:
         get_pattern_log(config, "tier_dsp", time),
+    benchmark:
+        get_pattern_benchmark(config, "tier_dsp", time)
+    threads: get_dsp_workers
     group:
-        "tier-dsp"
+        batch_planner.group(
+            "tier-dsp",
+            "build_dsp",
+            [get_pattern_tier(config, "raw", check_in_cycle=False), get_pattern_tier_daq(config)],
+        )
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_dsp", 300),
+        mem_mb=resource_model.mem_mb("build_dsp"),
         mem_swap=30,
     shell:
         execenv_pyexe(config, "build-dsp-hades") + "--log {log} "
         "--log-config {params.log_config} "
-        "--input {input.raw_file} "
+        "{params.raw_input} "
         "--output {output.tier_file} "
         "--processing-chain {params.config_file} "
         "--database {input.pars_file} "
+        "--write-profile '{params.write_profile}' "
+        "{params.settings} "
+        "{params.tuning_cache} "
+        + fingerprint_cmd()
@@ -5,6 +5,7 @@ Snakemake rules for building dsp pars for HPGes, before running build_dsp()
 """
 
 from hadesflow.methods.patterns import (
+    get_pattern_benchmark,
     get_pattern_pars_tmp,
     get_pattern_plts_tmp,
     get_pattern_pars,
@@ -57,10 +58,14 @@ rule build_pars_dsp_pz_geds:
         plots=temp(get_pattern_plts_tmp(config, "dsp", "decay_constant")),
     log:
         get_pattern_log(config, "par_dsp_decay_constant", time),
+    benchmark:
+        get_pattern_benchmark(config, "par_dsp_decay_constant", time)
     group:
         "par-dsp"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_pars_dsp_pz_geds", 300),
+        mem_mb=resource_model.mem_mb("build_pars_dsp_pz_geds"),
     shell:
         execenv_pyexe(config, "par-geds-dsp-pz") + "-p --log {log} "
         "--log-config {params.log_config} "
@@ -70,6 +75,7 @@ rule build_pars_dsp_pz_geds:
         "--plot-path {output.plots} "
         "--output-file {output.decay_const} "
         "--raw-files {input.files} "
+        + fingerprint_cmd("{params.processing_chain} {params.config_file}")
 
 
 rule build_pars_evtsel_geds:
@@ -107,10 +113,14 @@ rule build_pars_evtsel_geds:
         peak_file=temp(get_pattern_pars_tmp(config, "dsp", "peaks", extension="lh5")),
     log:
         get_pattern_log(config, "par_dsp_event_selection", time),
+    benchmark:
+        get_pattern_benchmark(config, "par_dsp_event_selection", time)
     group:
         "par-dsp"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_pars_evtsel_geds", 300),
+        mem_mb=resource_model.mem_mb("build_pars_evtsel_geds"),
         mem_swap=70,
     shell:
         execenv_pyexe(config, "par-geds-dsp-evtsel") + "-p --log {log} "
@@ -121,6 +131,7 @@ rule build_pars_evtsel_geds:
         "--peak-file {output.peak_file} "
         "--decay-const {input.database} "
         "--raw-filelist {input.files}"
+        + fingerprint_cmd("{params.processing_chain} {params.config_file}")
 
 
 # This rule builds the optimal energy filter parameters for the dsp using calibration dsp files
@@ -159,10 +170,14 @@ rule build_pars_dsp_eopt_geds:
         plots=get_pattern_plts(config, "dsp"),
     log:
         get_pattern_log(config, "pars_dsp_eopt", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_dsp_eopt", time)
     group:
         "par-dsp"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_pars_dsp_eopt_geds", 300),
+        mem_mb=resource_model.mem_mb("build_pars_dsp_eopt_geds"),
     shell:
         execenv_pyexe(config, "par-geds-dsp-eopt") + "--log {log} "
         "--log-config {params.log_config} "
@@ -175,3 +190,4 @@ rule build_pars_dsp_eopt_geds:
         "--plot-path {output.plots} "
         "--qbb-grid-path {output.qbb_grid} "
         "--final-dsp-pars {output.dsp_pars}"
+        + fingerprint_cmd("{params.processing_chain} {params.config_file}")
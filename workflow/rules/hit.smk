@@ -4,12 +4,21 @@ Snakemake rules for processing hit tier. This is done in 4 steps:
 - extraction of psd calibration parameters for each channel from cal data
 - combining of all channels into single pars files with associated plot and results files
 - running build hit over all channels using par file
+
+With fused_dsp_hit set in the config the hit files are produced from the raw
+files by build_dsp_hit, the dsp files are then only produced where other rules
+need them (e.g. the parameter extraction).
 """
 
 from hadesflow.methods.patterns import (
+    get_pattern_benchmark,
     get_pattern_tier,
+    get_pattern_tier_daq,
     get_pattern_log,
 )
+from hadesflow.methods.write_profiles import get_write_profile
+from legenddataflowscripts.workflow import execenv_pyexe
+import json
 
 
 rule build_hit:
@@ -31,14 +40,27 @@ rule build_hit:
             wildcards.measurement,
             "tier_hit",
         ),
+        write_profile=json.dumps(get_write_profile(config, "hit")),
+        prune_columns="--prune-columns " if config.get("prune_hit_columns", False) else "",
     output:
         tier_file=get_pattern_tier(config, "hit", check_in_cycle=check_in_cycle),
     log:
         get_pattern_log(config, "tier_hit", time),
+    benchmark:
+        get_pattern_benchmark(config, "tier_hit", time)
     group:
-        "tier-hit"
+        batch_planner.group(
+            "tier-hit",
+            "build_hit",
+            [
+                get_pattern_tier(config, "dsp", check_in_cycle=False),
+                get_pattern_tier(config, "raw", check_in_cycle=False),
+            ],
+        )
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_hit", 300),
+        mem_mb=resource_model.mem_mb("build_hit"),
     shell:
         execenv_pyexe(config, "build-hit-hades") + "--log {log} "
         "--log-config {params.log_config} "
@@ -46,3 +68,70 @@ rule build_hit:
         "--config {params.config_file}  "
         "--pars {input.pars_file} "
         "--output {output.tier_file} "
+        "--write-profile '{params.write_profile}' "
+        "{params.prune_columns}"
+        + fingerprint_cmd()
+
+
+if config.get("fused_dsp_hit", False):
+
+    ruleorder: build_dsp_hit > build_hit
+
+    rule build_dsp_hit:
+        input:
+            raw_file=get_dsp_raw_input,
+            dsp_pars_file=lambda wildcards: get_par_file(wildcards, "dsp"),
+            hit_pars_file=lambda wildcards: get_par_file(wildcards, "hit"),
+        params:
+            processing_chain=lambda wildcards: get_config_files(
+                dataflow_configs_texdb,
+                wildcards.timestamp,
+                wildcards.measurement,
+                wildcards.detector,
+                "tier_dsp",
+                "processing_chain",
+            ),
+            config_file=lambda wildcards: get_config_files(
+                dataflow_configs_texdb,
+                wildcards.timestamp,
+                wildcards.measurement,
+                wildcards.detector,
+                "tier_hit",
+                "config_file",
+            ),
+            log_config=lambda wildcards: get_log_config(
+                dataflow_configs_texdb,
+                wildcards.timestamp,
+                wildcards.measurement,
+                "tier_hit",
+            ),
+            write_profile=json.dumps(get_write_profile(config, "hit")),
+            raw_input=lambda wildcards, input: get_dsp_raw_options(wildcards, input.raw_file),
+        output:
+            tier_file=get_pattern_tier(config, "hit", check_in_cycle=check_in_cycle),
+        log:
+            get_pattern_log(config, "tier_hit", time),
+        benchmark:
+            get_pattern_benchmark(config, "tier_hit", time)
+        group:
+            batch_planner.group(
+                "tier-hit",
+                "build_dsp_hit",
+                [get_pattern_tier(config, "raw", check_in_cycle=False)],
+            )
+        resources:
+            input_mb=resource_model.input_mb,
+            runtime=resource_model.runtime("build_dsp_hit", 300),
+            mem_mb=resource_model.mem_mb("build_dsp_hit"),
+            mem_swap=30,
+        shell:
+            execenv_pyexe(config, "build-dsp-hit-hades") + "--log {log} "
+            "--log-config {params.log_config} "
+            "{params.raw_input} "
+            "--processing-chain {params.processing_chain} "
+            "--database {input.dsp_pars_file} "
+            "--config {params.config_file} "
+            "--pars {input.hit_pars_file} "
+            "--output {output.tier_file} "
+            "--write-profile '{params.write_profile}' "
+            + fingerprint_cmd("{params.processing_chain} {params.config_file}")
@@ -1,4 +1,5 @@
 from hadesflow.methods.patterns import (
+    get_pattern_benchmark,
     get_pattern_plts_tmp,
     get_pattern_plts,
     get_pattern_tier,
@@ -36,10 +37,14 @@ rule par_hit_qc:
         plot_file=temp(get_pattern_plts(config, "hit", "qc")),
     log:
         get_pattern_log_par(config, "pars_hit_qc", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_hit_qc", time)
     group:
         "par-hit"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("par_hit_qc", 300),
+        mem_mb=resource_model.mem_mb("par_hit_qc"),
     shell:
         execenv_pyexe(config, "par-geds-hit-qc") + "--log {log} "
         "--log-config {params.log_config} "
@@ -48,6 +53,7 @@ rule par_hit_qc:
         "--plot-path {output.plot_file} "
         "--save-path {output.qc_file} "
         "--cal-files {input.files} "
+        + fingerprint_cmd()
 
 
 print(get_pattern_pars_tmp(config, "hit", "energy_cal"))
@@ -90,10 +96,14 @@ rule build_energy_calibration:
         measurement="th_[^-]+",
     log:
         get_pattern_log_par(config, "pars_hit_energy_cal", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_hit_energy_cal", time)
     group:
         "par-hit"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_energy_calibration", 300),
+        mem_mb=resource_model.mem_mb("build_energy_calibration"),
     shell:
         execenv_pyexe(config, "par-geds-hit-ecal") + "--log {log} "
         "--log-config {params.log_config} "
@@ -108,6 +118,7 @@ rule build_energy_calibration:
         "--ctc-dict {input.ctc_dict} "
         "-d "
         "--files {input.files}"
+        + fingerprint_cmd()
 
 
 # This rule builds the a/e calibration using the calibration dsp files
@@ -148,10 +159,14 @@ rule build_aoe_calibration:
         measurement="th_[^-]+",
     log:
         get_pattern_log_par(config, "pars_hit_aoe_cal", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_hit_aoe_cal", time)
     group:
         "par-hit"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_aoe_calibration", 300),
+        mem_mb=resource_model.mem_mb("build_aoe_calibration"),
     shell:
         execenv_pyexe(config, "par-geds-hit-aoe") + "--log {log} "
         "--log-config {params.log_config} "
@@ -164,6 +179,7 @@ rule build_aoe_calibration:
         "--eres-file {input.eres_file} "
         "--ecal-file {input.ecal_file} "
         "{input.files}"
+        + fingerprint_cmd()
 
 
 # This rule builds the lq calibration using the calibration dsp files
@@ -208,10 +224,14 @@ rule build_lq_calibration:
         measurement="th_[^-]+",
     log:
         get_pattern_log_par(config, "pars_hit_lq_cal", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_hit_lq_cal", time)
     group:
         "par-hit"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_lq_calibration", 300),
+        mem_mb=resource_model.mem_mb("build_lq_calibration"),
     shell:
         execenv_pyexe(config, "par-geds-hit-lq") + "--log {log} "
         "--log-config {params.log_config} "
@@ -224,6 +244,7 @@ rule build_lq_calibration:
         "--inplots {input.inplots} "
         "--eres-file {input.eres_file} "
         "{input.files}"
+        + fingerprint_cmd()
 
 
 # This rule builds the energy calibration using the calibration dsp files
@@ -267,10 +288,14 @@ rule build_energy_calibration_am:
         measurement="am_[^-]+",
     log:
         get_pattern_log_par(config, "pars_hit_energy_cal_am", time),
+    benchmark:
+        get_pattern_benchmark(config, "pars_hit_energy_cal_am", time)
     group:
         "par-hit"
     resources:
-        runtime=300,
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_energy_calibration_am", 300),
+        mem_mb=resource_model.mem_mb("build_energy_calibration_am"),
     shell:
         execenv_pyexe(config, "par-geds-hit-ecal-am") + "--log {log} "
         "--log-config {params.log_config} "
@@ -285,3 +310,4 @@ rule build_energy_calibration_am:
         "--ctc-dict {input.ctc_dict} "
         "-d "
         "--files {input.files}"
+        + fingerprint_cmd()
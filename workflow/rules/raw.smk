@@ -1,9 +1,12 @@
 from hadesflow.methods.patterns import (
+    get_pattern_benchmark,
     get_pattern_tier_daq,
     get_pattern_tier,
     get_pattern_log,
 )
+from hadesflow.methods.write_profiles import get_write_profile, hdf5_settings
 from legenddataflowscripts.workflow import execenv_pyexe
+import json
 
 
 def get_json_output(output):
@@ -26,15 +29,29 @@ rule build_raw:
             "tier_raw",
             "raw_config",
         ),
+        # the write profile goes to build_raw as its hdf5_settings
+        kwargs=lambda wildcards, output: json.dumps(
+            {
+                "filekey": output[0],
+                "hdf5_settings": hdf5_settings(get_write_profile(config, "raw")),
+            }
+        ),
     output:
         protected(get_pattern_tier(config, "raw", check_in_cycle=check_in_cycle)),
     log:
         get_pattern_log(config, "tier_raw", time),
+    benchmark:
+        get_pattern_benchmark(config, "tier_raw", time)
     group:
         "tier-raw"
+    resources:
+        input_mb=resource_model.input_mb,
+        runtime=resource_model.runtime("build_raw"),
+        mem_mb=resource_model.mem_mb("build_raw"),
     shell:
         execenv_pyexe(config, "legend-daq2lh5") + " "
         "--out-spec {params.config_file} "
         "{input} "
-        "--kwargs " + "'" + '{{"filekey":' + '"{output}"' + "}}'"
+        "--kwargs '{params.kwargs}'"
         " > {log}"
+        + fingerprint_cmd()
@@ -0,0 +1,115 @@
+"""
+This module contains the batching planner of the tier job groups. The jobs of a
+group are packed into batches, each a group id of its own, up to a target of
+input size and of runtime predicted by the resource model, so that many short
+jobs share a cluster submission while large ones are not packed together into
+straggler submissions. The settings are per group in the config:
+
+    batching:
+      tier-dsp:
+        target_mb: 20000
+        target_minutes: 60
+
+The batch ids are registered as parts of the group, so --group-components
+tier-dsp=N merges the jobs of a batch into submissions of up to N jobs (without
+it each job is a submission of its own). The input size of a job is taken from
+the first existing of the input patterns, jobs without input yet count with the
+mean size of the group.
+"""
+
+import os
+
+
+class BatchPlanner:
+    """
+    Assigns the jobs of the groups with batching settings to batches, first-fit
+    in the order the jobs are created. Without settings for a group its jobs
+    keep the plain group.
+    """
+
+    def __init__(self, settings=None, resource_model=None, parent_groupids=None):
+        self.settings = dict(settings or {})
+        self.resource_model = resource_model
+        # batch group id -> group, read by Snakemake for --group-components
+        self.parent_groupids = {} if parent_groupids is None else parent_groupids
+        self.assigned = {}
+        # group -> list of [size_mb, seconds, n_jobs]
+        self.batches = {}
+        # group -> [total size_mb, n_jobs] of the jobs with input
+        self.known = {}
+
+    def group(self, group, rule, input_patterns):
+        """
+        The group directive of a rule, a function of the wildcards assigning the
+        job to a batch if the group has batching settings, the group otherwise
+        """
+        if group not in self.settings:
+            return group
+
+        def groupid(wildcards):
+            return self.assign(group, rule, dict(wildcards.items()), input_patterns)
+
+        return groupid
+
+    def _size_mb(self, group, wildcards, input_patterns):
+        for pattern in input_patterns:
+            try:
+                size = os.stat(str(pattern).format(**wildcards)).st_size / 1024**2
+            except (OSError, KeyError):
+                continue
+            known = self.known.setdefault(group, [0, 0])
+            known[0] += size
+            known[1] += 1
+            return size
+        total, n_jobs = self.known.get(group, (0, 0))
+        return total / n_jobs if n_jobs else 0
+
+    def assign(self, group, rule, wildcards, input_patterns):
+        key = (group, tuple(sorted(wildcards.items())))
+        if key in self.assigned:
+            return self.assigned[key]
+
+        settings = self.settings[group]
+        size = self._size_mb(group, wildcards, input_patterns)
+        seconds = None
+        if self.resource_model is not None:
+            seconds = self.resource_model.predict(
+                rule, wildcards.get("measurement"), "runtime_s", size, margin=False
+            )
+        target_mb = settings.get("target_mb")
+        target_s = settings.get("target_minutes")
+        target_s = None if target_s is None else 60 * target_s
+
+        def fits(batch):
+            if batch[2] == 0:
+                return True
+            if target_mb is not None and batch[0] + size > target_mb:
+                return False
+            return target_s is None or seconds is None or batch[1] + seconds <= target_s
+
+        batches = self.batches.setdefault(group, [])
+        index = next((i for i, batch in enumerate(batches) if fits(batch)), None)
+        if index is None:
+            index = len(batches)
+            batches.append([0, 0, 0])
+        batches[index][0] += size
+        batches[index][1] += seconds or 0
+        batches[index][2] += 1
+
+        groupid = f"{group}-{index}"
+        self.parent_groupids[groupid] = group
+        self.assigned[key] = groupid
+        return groupid
+
+    def report(self):
+        lines = []
+        for group, batches in self.batches.items():
+            jobs = [batch[2] for batch in batches]
+            sizes = [batch[0] for batch in batches]
+            minutes = [batch[1] / 60 for batch in batches]
+            lines.append(
+                f"{group:>20}: {sum(jobs)} jobs in {len(batches)} batches, "
+                f"{min(jobs)}-{max(jobs)} jobs, {min(sizes):.0f}-{max(sizes):.0f} MB, "
+                f"{min(minutes):.0f}-{max(minutes):.0f} min predicted"
+            )
+        return "\n".join(lines)
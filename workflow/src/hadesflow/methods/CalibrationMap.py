@@ -0,0 +1,114 @@
+"""
+This module contains the map of calibration sources, i.e. the measurements whose
+parameters are used to process a measurement of a detector and campaign. The
+measurements available in each (detector, campaign) are read from one scan of
+the DAQ tree, the rules are read from the calibration section of the config:
+
+    calibration:
+      sources: [th_HS2_lat_psa, th_HS2_top_psa]
+      extra_sources:
+        hit:
+          am_HS1_lat_ssh: [am_HS1_lat_dlt]
+          am_HS1_top_ssh: [am_HS1_lat_dlt]
+
+The first of the sources available in the campaign is used (the last one if
+none is available), extra sources are added for the measurements matching the
+shell-style patterns in the given tier.
+"""
+
+import os
+from fnmatch import fnmatchcase
+
+from .DirScanner import get_scanner
+from .FileIndex import get_file_index
+from .paths import file_index_path, tier_daq_path
+
+default_sources = ("th_HS2_lat_psa", "th_HS2_top_psa")
+default_extra_sources = {
+    "hit": {
+        "am_HS1_lat_ssh": ["am_HS1_lat_dlt"],
+        "am_HS1_top_ssh": ["am_HS1_lat_dlt"],
+        "am_HS1_lat_dlt": ["am_HS1_lat_dlt"],
+        "am_HS1_top_dlt": ["am_HS1_lat_dlt"],
+    }
+}
+
+
+class CalibrationMap:
+    """
+    Map of (detector, campaign, measurement, tier) to the calibration
+    measurements, see the module docstring
+    """
+
+    def __init__(self, sources=default_sources, extra_sources=None, measurements=None):
+        if not sources:
+            msg = "at least one calibration source is needed"
+            raise ValueError(msg)
+        self.sources = tuple(sources)
+        self.extra_sources = default_extra_sources if extra_sources is None else extra_sources
+        # (detector, campaign) -> measurement directories
+        self.measurements = {} if measurements is None else measurements
+        self._resolved = {}
+
+    @classmethod
+    def from_config(cls, setup, file_index=None):
+        rules = setup.get("calibration", {})
+        calibration_map = cls(rules.get("sources", default_sources), rules.get("extra_sources"))
+        calibration_map.scan(tier_daq_path(setup), file_index)
+        return calibration_map
+
+    def scan(self, tier_daq, file_index=None):
+        """
+        Reads the measurements of every detector and campaign in the DAQ tree
+        """
+        if file_index is None:
+            file_index = get_file_index()
+        campaign_dirs = file_index.glob(os.path.join(tier_daq, "*", "*"))
+        # files at the campaign level have no listing
+        self.measurements = {
+            tuple(path.split(os.sep)[-2:]): listing[1]
+            for path, listing in file_index.listdirs(campaign_dirs).items()
+            if listing is not None
+        }
+        self._resolved.clear()
+
+    def get_sources(self, detector, campaign, measurement, tier):
+        """
+        Returns the list of measurements to take the parameters of the tier from
+        """
+        key = (detector, campaign, measurement, tier)
+        if key not in self._resolved:
+            available = self.measurements.get((detector, campaign), frozenset())
+            sources = [
+                next((source for source in self.sources if source in available), self.sources[-1])
+            ]
+            for pattern, extra in self.extra_sources.get(tier, {}).items():
+                if fnmatchcase(measurement, pattern):
+                    sources += [source for source in extra if source not in sources]
+            self._resolved[key] = sources
+        return list(self._resolved[key])
+
+    def is_source(self, measurement):
+        """
+        Whether the measurement is a calibration source, in any tier
+        """
+        return measurement in self.sources or any(
+            measurement in extra
+            for patterns in self.extra_sources.values()
+            for extra in patterns.values()
+        )
+
+
+_maps = {}
+
+
+def get_calibration_map(setup):
+    """
+    Returns the CalibrationMap of the setup, built once per process
+    """
+    key = tier_daq_path(setup)
+    if key not in _maps:
+        _maps[key] = CalibrationMap.from_config(
+            setup, get_file_index(file_index_path(setup), get_scanner(setup))
+        )
+    return _maps[key]
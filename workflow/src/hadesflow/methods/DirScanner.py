@@ -0,0 +1,93 @@
+"""
+This module contains the directory scanning layer. On shared filesystems each
+stat and readdir costs milliseconds, so batches of directories are listed
+concurrently over a bounded thread pool. The scandir and stat functions can
+be injected, e.g. to simulate latency in benchmarks.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+default_scan_threads = 16
+
+
+class DirScanner:
+    """
+    Lists and stats batches of directories with at most max_workers concurrent calls
+    """
+
+    def __init__(self, max_workers=default_scan_threads, scandir=os.scandir, stat=os.stat):
+        self.max_workers = max(1, int(max_workers))
+        self.scandir = scandir
+        self.stat = stat
+        self._executor = None
+
+    def _map(self, func, items):
+        items = list(items)
+        if self.max_workers == 1 or len(items) <= 1:
+            return list(map(func, items))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="hadesflow-scan"
+            )
+        return list(self._executor.map(func, items))
+
+    def listdir(self, path):
+        """
+        Returns the sorted (names, directory names) in the directory or None if
+        it is not a directory
+        """
+        names = []
+        dirs = set()
+        try:
+            with self.scandir(path or os.curdir) as it:
+                for entry in it:
+                    names.append(entry.name)
+                    try:
+                        if entry.is_dir():
+                            dirs.add(entry.name)
+                    except OSError:
+                        pass
+        except (NotADirectoryError, FileNotFoundError, PermissionError):
+            return None
+        return tuple(sorted(names)), frozenset(dirs)
+
+    def mtime(self, path):
+        """
+        Returns the mtime in ns or None if the path does not exist
+        """
+        try:
+            return self.stat(path or os.curdir).st_mtime_ns
+        except OSError:
+            return None
+
+    def listdirs(self, paths):
+        paths = list(dict.fromkeys(paths))
+        return dict(zip(paths, self._map(self.listdir, paths), strict=True))
+
+    def mtimes(self, paths):
+        paths = list(dict.fromkeys(paths))
+        return dict(zip(paths, self._map(self.mtime, paths), strict=True))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def scan_threads(setup):
+    return setup.get("scan_threads", default_scan_threads)
+
+
+_scanners = {}
+
+
+def get_scanner(setup=None):
+    """
+    Returns the DirScanner shared by all callers in this process for the
+    concurrency configured in the setup (scan_threads)
+    """
+    max_workers = default_scan_threads if setup is None else scan_threads(setup)
+    if max_workers not in _scanners:
+        _scanners[max_workers] = DirScanner(max_workers)
+    return _scanners[max_workers]
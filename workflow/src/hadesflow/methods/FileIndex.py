@@ -0,0 +1,203 @@
+"""
+This module contains an index of directory listings, used to answer glob queries
+on the tier and DAQ trees from memory. Each directory is read at most once per
+invocation, and the listings are persisted to disk and revalidated per directory
+by mtime, so later invocations only rescan directories that changed. Globs are
+resolved level by level, the directories of a level are listed concurrently
+with a DirScanner.
+"""
+
+import json
+import os
+import re
+import time
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from .DirScanner import get_scanner
+
+_magic_check = re.compile("[*?[]")
+
+# listings of directories modified less than this before the scan may miss files
+# created within the same mtime tick, they are not trusted in later invocations
+_RACY_NS = 2_000_000_000
+
+
+def has_magic(pattern):
+    return _magic_check.search(pattern) is not None
+
+
+class FileIndex:
+    """
+    Index of directory listings, see the module docstring
+    """
+
+    version = 1
+
+    def __init__(self, cache_file=None, scanner=None):
+        self.cache_file = cache_file
+        self.scanner = get_scanner() if scanner is None else scanner
+        # path -> (mtime_ns, scan_ns, names, dir names)
+        self._listings = {}
+        # directories validated in this invocation, path -> (names, dir names) or None
+        self._checked = {}
+        self._dirty = False
+        self.n_scanned = 0
+        if cache_file is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with Path(self.cache_file).open() as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cache.get("version") != self.version:
+            return
+        self._listings = {
+            path: (mtime, scanned, tuple(names), frozenset(dirs))
+            for path, (mtime, scanned, names, dirs) in cache["dirs"].items()
+        }
+
+    def save(self):
+        if self.cache_file is None or not self._dirty:
+            return
+        cache = {
+            "version": self.version,
+            "dirs": {
+                path: [mtime, scanned, list(names), sorted(dirs)]
+                for path, (mtime, scanned, names, dirs) in self._listings.items()
+            },
+        }
+        Path(self.cache_file).parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with Path(tmp_file).open("w") as f:
+            json.dump(cache, f)
+        Path(tmp_file).replace(self.cache_file)
+        self._dirty = False
+
+    def listdirs(self, paths):
+        """
+        Returns a dictionary of path to the (names, directory names) in the
+        directory or None if it is not a directory, directories not validated
+        yet in this invocation are stat'ed and, if changed, listed concurrently
+        """
+        paths = [str(path) for path in dict.fromkeys(paths)]
+        todo = [path for path in paths if path not in self._checked]
+        if todo:
+            to_scan = {}
+            for path, mtime in self.scanner.mtimes(todo).items():
+                cached = self._listings.get(path)
+                if mtime is None:
+                    self._checked[path] = None
+                elif cached is not None and cached[0] == mtime and cached[1] - mtime > _RACY_NS:
+                    self._checked[path] = cached[2:]
+                else:
+                    to_scan[path] = mtime
+
+            scanned = time.time_ns()
+            for path, listing in self.scanner.listdirs(to_scan).items():
+                self._checked[path] = listing
+                if listing is not None:
+                    self.n_scanned += 1
+                    self._listings[path] = (to_scan[path], scanned, *listing)
+                    self._dirty = True
+
+        return {path: self._checked[path] for path in paths}
+
+    def listdir(self, path):
+        """
+        Returns the (names, directory names) in the directory or None if it is not
+        a directory
+        """
+        return self.listdirs([path])[str(path)]
+
+    def invalidate(self, path=None):
+        """
+        Forgets the listing of a directory (or of everything) for this invocation
+        """
+        if path is None:
+            self._checked.clear()
+        else:
+            self._checked.pop(str(path), None)
+
+    def glob(self, pattern, include_hidden=False):
+        """
+        Equivalent of glob.glob (non recursive) answered from the index
+        """
+        return self.glob_many([pattern], include_hidden)[0]
+
+    def glob_many(self, patterns, include_hidden=False):
+        """
+        Returns the glob.glob result of each pattern, the patterns are resolved
+        together so each level is listed in one concurrent batch. As for
+        glob.glob, wildcards only match names starting with a dot if
+        include_hidden is set (pathlib.Path.glob always matches them).
+        """
+        states = []
+        for pattern in map(str, patterns):
+            if pattern.startswith(os.sep):
+                states.append(([os.sep], pattern.lstrip(os.sep).split(os.sep)))
+            else:
+                states.append(([""], pattern.split(os.sep)))
+        results = [[] for _ in states]
+
+        level = 0
+        active = list(range(len(states)))
+        while active:
+            # literal directories are checked when listing the next level
+            listings = self.listdirs(
+                directory
+                for i in active
+                for directory in states[i][0]
+                if has_magic(states[i][1][level]) or level == len(states[i][1]) - 1
+            )
+            still_active = []
+            for i in active:
+                current, parts = states[i]
+                part = parts[level]
+                last = level == len(parts) - 1
+                matched = []
+                for directory in current:
+                    if not has_magic(part) and not last:
+                        matched.append(os.path.join(directory, part))
+                        continue
+                    listing = listings[directory]
+                    if listing is None:
+                        continue
+                    names, dirs = listing
+                    candidates = names if last else [name for name in names if name in dirs]
+                    if has_magic(part):
+                        hidden = include_hidden or part.startswith(".")
+                        candidates = [
+                            name
+                            for name in candidates
+                            if (hidden or not name.startswith(".")) and fnmatchcase(name, part)
+                        ]
+                    else:
+                        candidates = [part] if part in candidates else []
+                    matched += [os.path.join(directory, name) for name in candidates]
+                if last or not matched:
+                    results[i] = matched
+                else:
+                    states[i] = (matched, parts)
+                    still_active.append(i)
+            active = still_active
+            level += 1
+        return results
+
+
+_indices = {}
+
+
+def get_file_index(cache_file=None, scanner=None):
+    """
+    Returns the FileIndex shared by all callers in this process for the cache
+    file, if a scanner is given it becomes the backend of the index
+    """
+    key = None if cache_file is None else str(cache_file)
+    if key not in _indices:
+        _indices[key] = FileIndex(key, scanner)
+    elif scanner is not None:
+        _indices[key].scanner = scanner
+    return _indices[key]
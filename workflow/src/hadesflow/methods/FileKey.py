@@ -3,18 +3,22 @@ This module contains classes to convert between keys and files using the pattern
 """
 
 import re
+import string
 from collections import namedtuple
+from functools import lru_cache
 from pathlib import Path
 
-import snakemake as smk
-
 from .patterns import (
     get_pattern_tier,
     key_pattern,
     processing_pattern,
 )
-from dbetto.time import unix_time
-from .utils import convert_to_legend_timestamp, convert_to_legend_run
+from .utils import (
+    convert_to_legend_run,
+    convert_to_legend_runs,
+    convert_to_legend_timestamp,
+    convert_to_legend_timestamps,
+)
 
 # key_pattern -> key
 
@@ -42,6 +46,130 @@ def regex_from_filepattern(filepattern):
     return "".join(f)
 
 
+class FilePattern:
+    """
+    Compiled form of a file pattern, the regex is only built once per pattern
+    and reused for every filename matched against it.
+    """
+
+    __slots__ = ("_positional", "pattern", "regex", "wildcards")
+
+    def __init__(self, pattern):
+        self.pattern = str(pattern)
+        self.regex = re.compile(regex_from_filepattern(self.pattern))
+        self.wildcards = tuple(self.regex.groupindex)
+        self._positional = {}
+
+    def __repr__(self):
+        return f"FilePattern({self.pattern!r})"
+
+    def match(self, filename):
+        """
+        Returns the dictionary of wildcard values for the filename or None if it
+        does not match the pattern
+        """
+        match = self.regex.match(str(filename))
+        return None if match is None else match.groupdict()
+
+    def match_many(self, filenames):
+        """
+        Returns a list with the wildcard dictionary (or None) for each filename
+        """
+        match = self.regex.match
+        out = []
+        for filename in filenames:
+            m = match(str(filename))
+            out.append(None if m is None else m.groupdict())
+        return out
+
+    def render(self, values=None, **kwargs):
+        """
+        Fills the wildcards of the pattern with the given values, either a mapping
+        or a key, extra wildcards can be given as keyword arguments
+        """
+        values = kwargs if values is None else _as_dict(values)
+        if kwargs and values is not kwargs:
+            values = {**values, **kwargs}
+        try:
+            return self.pattern.format_map(values)
+        except KeyError as e:
+            msg = f"No values given for wildcard {e} in {self.pattern}"
+            raise ValueError(msg) from e
+
+    def render_many(self, keys, **kwargs):
+        """
+        Batch version of render, returns one path for each key
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+        key_type = type(keys[0])
+        positional = None if kwargs else self._positional_template(keys[0])
+        try:
+            if positional is not None:
+                # all fields come from the tuple itself, no dictionary needed per key
+                fmt = positional.format
+                return [fmt(*key) if type(key) is key_type else self.render(key) for key in keys]
+            fmt = self.pattern.format_map
+            if kwargs:
+                return [fmt({**_as_dict(key), **kwargs}) for key in keys]
+            return [fmt(_as_dict(key)) for key in keys]
+        except KeyError as e:
+            msg = f"No values given for wildcard {e} in {self.pattern}"
+            raise ValueError(msg) from e
+
+    def _positional_template(self, key):
+        """
+        Returns the pattern with the wildcards replaced by the tuple indices of
+        the key's fields, or None if the key is not a plain namedtuple holding
+        all the wildcards
+        """
+        key_type = type(key)
+        if key_type not in self._positional:
+            fields = getattr(key_type, "_fields", None)
+            template = None
+            if fields is not None and len(fields) == len(key):
+                parts = []
+                for literal, field, spec, conversion in string.Formatter().parse(self.pattern):
+                    parts.append(literal.replace("{", "{{").replace("}", "}}"))
+                    if field is None:
+                        continue
+                    if field not in fields:
+                        break
+                    conversion_str = f"!{conversion}" if conversion else ""
+                    spec_str = f":{spec}" if spec else ""
+                    parts.append(f"{{{fields.index(field)}{conversion_str}{spec_str}}}")
+                else:
+                    template = "".join(parts)
+            self._positional[key_type] = template
+        return self._positional[key_type]
+
+
+def _as_dict(values):
+    return values._asdict() if hasattr(values, "_asdict") else values
+
+
+def _is_multi_valued(value):
+    if isinstance(value, tuple):
+        return not hasattr(value, "_fields")
+    return isinstance(value, list | set)
+
+
+@lru_cache(maxsize=256)
+def _compile_file_pattern(pattern):
+    return FilePattern(pattern)
+
+
+def get_file_pattern(pattern):
+    """
+    Pattern registry, returns the compiled FilePattern for the given pattern,
+    compiling it on first use
+    """
+    if isinstance(pattern, FilePattern):
+        return pattern
+    return _compile_file_pattern(str(pattern))
+
+
 class FileKey(
     namedtuple(
         "FileKey", ["experiment", "detector", "campaign", "measurement", "run", "timestamp"]
@@ -83,31 +211,80 @@ class FileKey(
 
     @classmethod
     def get_filekey_from_pattern(cls, filename, pattern=None):
-        key_pattern_rx = re.compile(
-            regex_from_filepattern(str(cls.key_pattern) if pattern is None else str(pattern))
-        )
-        if key_pattern_rx.match(filename) is None:
+        d = get_file_pattern(cls.key_pattern if pattern is None else pattern).match(filename)
+        if d is None:
             return None
-        else:
-            d = key_pattern_rx.match(filename).groupdict()
-            for entry in list(d):
-                if entry not in cls._fields:
-                    d.pop(entry)
-            for wildcard in cls._fields:
-                if wildcard not in d:
-                    d[wildcard] = "*"
-            if d["timestamp"][-1] != "Z":
-                d["timestamp"] = convert_to_legend_timestamp(d["timestamp"])
-            if "run" in d["run"]:
-                d["run"] = convert_to_legend_run(d["run"])
-            return cls(**d)
+        return cls._from_wildcards(d)
+
+    @classmethod
+    def get_filekeys_from_pattern(cls, filenames, pattern=None):
+        """
+        Batch version of get_filekey_from_pattern, parses all filenames against the
+        same compiled pattern in one pass. The returned list is aligned with the
+        input, filenames not matching the pattern give None.
+        """
+        file_pattern = get_file_pattern(cls.key_pattern if pattern is None else pattern)
+        fields = cls._fields
+        present = [field for field in fields if field in file_pattern.wildcards]
+        missing = {field: "*" for field in fields if field not in file_pattern.wildcards}
+        match = file_pattern.regex.match
+
+        parsed = []
+        for filename in filenames:
+            m = match(str(filename))
+            if m is None:
+                parsed.append(None)
+                continue
+            groups = m.groupdict()
+            d = {field: groups[field] for field in present}
+            d.update(missing)
+            parsed.append(d)
+
+        # normalise the daq timestamps and runs of all keys at once
+        matched = [d for d in parsed if d is not None]
+        daq_timestamps = [d for d in matched if d["timestamp"][-1] != "Z"]
+        for d, timestamp in zip(
+            daq_timestamps,
+            convert_to_legend_timestamps([d["timestamp"] for d in daq_timestamps]),
+            strict=True,
+        ):
+            d["timestamp"] = timestamp
+        daq_runs = [d for d in matched if "run" in d["run"]]
+        for d, run in zip(
+            daq_runs, convert_to_legend_runs([d["run"] for d in daq_runs]), strict=True
+        ):
+            d["run"] = run
+
+        return [None if d is None else cls(**d) for d in parsed]
+
+    @classmethod
+    def _from_wildcards(cls, d):
+        for entry in list(d):
+            if entry not in cls._fields:
+                d.pop(entry)
+        for wildcard in cls._fields:
+            if wildcard not in d:
+                d[wildcard] = "*"
+        return cls._normalise(d)
+
+    @classmethod
+    def _normalise(cls, d):
+        if d["timestamp"][-1] != "Z":
+            d["timestamp"] = convert_to_legend_timestamp(d["timestamp"])
+        if "run" in d["run"]:
+            d["run"] = convert_to_legend_run(d["run"])
+        return cls(**d)
 
     @classmethod
     def unix_time_from_string(cls, value):
+        from dbetto.time import unix_time
+
         key_class = cls.from_string(value)
         return unix_time(key_class.timestamp)
 
     def get_unix_timestamp(self):
+        from dbetto.time import unix_time
+
         return unix_time(self.timestamp)
 
     @classmethod
@@ -120,16 +297,18 @@ class FileKey(
         return cls(**d)
 
     def get_path_from_filekey(self, pattern, **kwargs):
-        if kwargs is None:
-            return smk.io.expand(pattern, **self._asdict())
-        else:
-            for entry, value in kwargs.items():
-                if isinstance(value, dict):
-                    if len(next(iter(set(value).intersection(self._list())))) > 0:
-                        kwargs[entry] = value[next(iter(set(value).intersection(self._list())))]
-                    else:
-                        kwargs.pop(entry)
-            return smk.io.expand(pattern, **self._asdict(), **kwargs)
+        for entry, value in kwargs.items():
+            if isinstance(value, dict):
+                if len(next(iter(set(value).intersection(self._list())))) > 0:
+                    kwargs[entry] = value[next(iter(set(value).intersection(self._list())))]
+                else:
+                    kwargs.pop(entry)
+        if any(_is_multi_valued(value) for value in kwargs.values()):
+            # several values for a wildcard, needs the full cartesian expansion
+            from snakemake.io import expand
+
+            return expand(pattern, **self._asdict(), **kwargs)
+        return [get_file_pattern(pattern).render(self._asdict(), **kwargs)]
 
     # get_path_from_key
     @classmethod
@@ -140,14 +319,8 @@ class FileKey(
 
     @staticmethod
     def tier_files(setup, keys, tier):
-        fn_pattern = get_pattern_tier(setup, tier)
-        files = []
-        for line in keys:
-            tier_filename = FileKey.get_full_path_from_filename(
-                line, FileKey.key_pattern, fn_pattern
-            )
-            files += tier_filename
-        return files
+        fn_pattern = get_file_pattern(get_pattern_tier(setup, tier))
+        return fn_pattern.render_many(FileKey.get_filekeys_from_pattern(keys, FileKey.key_pattern))
 
 
 class ProcessingFileKey(FileKey):
@@ -195,13 +368,4 @@ class ProcessingFileKey(FileKey):
             pattern = str(pattern)
         if not isinstance(pattern, str):
             pattern = pattern(self.tier, self.identifier)
-        if kwargs is None:
-            return smk.io.expand(pattern, **self._asdict())
-        else:
-            for entry, value in kwargs.items():
-                if isinstance(value, dict):
-                    if len(next(iter(set(value).intersection(self._list())))) > 0:
-                        kwargs[entry] = value[next(iter(set(value).intersection(self._list())))]
-                    else:
-                        kwargs.pop(entry)
-            return smk.io.expand(pattern, **self._asdict(), **kwargs)
+        return super().get_path_from_filekey(pattern, **kwargs)
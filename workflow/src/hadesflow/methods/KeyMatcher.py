@@ -0,0 +1,216 @@
+"""
+This module contains the compiled matcher of ignored keys. The sections of the
+ignore file (removed, unprocessable) list rules of three kinds:
+
+- full keys, e.g. char_data-V01-c1-th_HS2_top_psa-r001-20230101T000000Z
+- partial keys, optionally ending in -*, matching every key starting with the
+  given fields, e.g. char_data-V01-c1-th_HS2_top_psa-r001 for a whole run
+- timestamp ranges, given as a mapping {key: <partial key>, from: <timestamp>,
+  to: <timestamp>}, with inclusive bounds, either of which may be omitted. A
+  mapping with a full key and no bounds is the same as the full key.
+
+Full keys are kept in a set, partial keys and ranges in a trie over the key
+fields, so membership tests are linear in the length of the key.
+"""
+
+import os
+import pickle
+from bisect import bisect_right
+from pathlib import Path
+
+from dbetto import Props
+
+from .utils import convert_to_legend_timestamp
+
+sections = ("removed", "unprocessable")
+
+# bumped whenever the pickled layout of the matchers changes
+_CACHE_VERSION = 2
+
+_MIN_TIMESTAMP = "00000000T000000Z"
+_MAX_TIMESTAMP = "99999999T999999Z"
+_N_FIELDS = 6
+
+
+def _as_timestamp(timestamp, default):
+    if timestamp is None:
+        return default
+    timestamp = str(timestamp)
+    if timestamp[-1] != "Z":
+        timestamp = convert_to_legend_timestamp(timestamp)
+    return timestamp
+
+
+class _Node:
+    __slots__ = ("children", "ignored", "starts", "stops")
+
+    def __init__(self):
+        self.children = {}
+        self.ignored = False
+        # sorted, non overlapping timestamp ranges
+        self.starts = []
+        self.stops = []
+
+    def add_range(self, start, stop):
+        ranges = sorted([*zip(self.starts, self.stops, strict=True), (start, stop)])
+        merged = [ranges[0]]
+        for _start, _stop in ranges[1:]:
+            if _start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], _stop))
+            else:
+                merged.append((_start, _stop))
+        self.starts = [_start for _start, _ in merged]
+        self.stops = [_stop for _, _stop in merged]
+
+    def in_range(self, timestamp):
+        i = bisect_right(self.starts, timestamp) - 1
+        return i >= 0 and timestamp <= self.stops[i]
+
+
+class KeyMatcher:
+    """
+    Compiled set of ignore rules, see the module docstring
+    """
+
+    def __init__(self, rules=()):
+        self.exact = set()
+        self.root = _Node()
+        for rule in rules:
+            self.add(rule)
+
+    def _node(self, prefix):
+        node = self.root
+        for field in prefix:
+            node = node.children.setdefault(field, _Node())
+        return node
+
+    def add(self, rule):
+        if isinstance(rule, dict):
+            if "key" not in rule:
+                msg = f"ignore rule {rule} has no key"
+                raise ValueError(msg)
+            fields = self._fields(rule["key"])
+            if len(fields) == _N_FIELDS:
+                if "from" in rule or "to" in rule:
+                    msg = f"ignore rule {rule} has a full key and a timestamp range"
+                    raise ValueError(msg)
+                self.exact.add("-".join(fields))
+                return
+            start = _as_timestamp(rule.get("from"), _MIN_TIMESTAMP)
+            stop = _as_timestamp(rule.get("to"), _MAX_TIMESTAMP)
+            if start > stop:
+                msg = f"ignore rule {rule} has an empty timestamp range"
+                raise ValueError(msg)
+            self._node(fields[: _N_FIELDS - 1]).add_range(start, stop)
+        else:
+            fields = self._fields(rule)
+            if len(fields) == _N_FIELDS:
+                self.exact.add("-".join(fields))
+            else:
+                self._node(fields).ignored = True
+
+    @staticmethod
+    def _fields(rule):
+        fields = str(rule).strip().split("-")
+        if fields[-1] == "*":
+            fields = fields[:-1]
+        if not fields or len(fields) > _N_FIELDS or "" in fields:
+            msg = f"invalid ignore rule: {rule}"
+            raise ValueError(msg)
+        return fields
+
+    def __contains__(self, name):
+        if name in self.exact:
+            return True
+        fields = name.split("-")
+        timestamp = fields[-1]
+        node = self.root
+        for field in fields[:-1]:
+            node = node.children.get(field)
+            if node is None:
+                return False
+            if node.ignored or (node.starts and node.in_range(timestamp)):
+                return True
+        return False
+
+    def __len__(self):
+        def count(node):
+            return (
+                node.ignored
+                + len(node.starts)
+                + sum(count(child) for child in node.children.values())
+            )
+
+        return len(self.exact) + count(self.root)
+
+
+def compile_ignore_keys(ignore_keys):
+    """
+    Compiles the content of an ignore file into a dictionary of section to
+    KeyMatcher, a plain list of keys (keylist) is taken as unprocessable
+    """
+    if ignore_keys is None:
+        return {}
+    if not isinstance(ignore_keys, dict):
+        ignore_keys = {"unprocessable": ignore_keys}
+    return {
+        section: KeyMatcher(rules or [])
+        for section, rules in ignore_keys.items()
+        if section in sections
+    }
+
+
+def read_ignore_keys(ignore_keys_file):
+    """
+    Reads the ignore file (json, yaml or keylist)
+    """
+    if not Path(ignore_keys_file).is_file():
+        msg = f"no ignore_keys file found: {ignore_keys_file}"
+        raise ValueError(msg)
+
+    if Path(ignore_keys_file).suffix in (".json", ".yaml", ".yml"):
+        return Props.read_from(ignore_keys_file)
+    if Path(ignore_keys_file).suffix == ".keylist":
+        with Path(ignore_keys_file).open() as f:
+            lines = [line.split("#")[0].strip() for line in f.read().splitlines()]
+        return [line for line in lines if line]
+
+    msg = "ignore_keys_file file not in json, yaml or keylist format"
+    raise ValueError(msg)
+
+
+def _cache_file(ignore_keys_file):
+    path = Path(ignore_keys_file)
+    return path.with_name(f".{path.name}.matcher.pkl")
+
+
+def load_ignore_keys(ignore_keys_file):
+    """
+    Returns the compiled ignore file, the compiled matchers are pickled next to
+    the file and reused as long as its mtime and size are unchanged
+    """
+    if not Path(ignore_keys_file).is_file():
+        msg = f"no ignore_keys file found: {ignore_keys_file}"
+        raise ValueError(msg)
+    stat = Path(ignore_keys_file).stat()
+    state = (_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    cache_file = _cache_file(ignore_keys_file)
+    try:
+        with cache_file.open("rb") as f:
+            cached_state, matchers = pickle.load(f)
+        if cached_state == state:
+            return matchers
+    except Exception:
+        # a stale or broken cache is rebuilt
+        pass
+
+    matchers = compile_ignore_keys(read_ignore_keys(ignore_keys_file))
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_file.open("wb") as f:
+            pickle.dump((state, matchers), f)
+        tmp_file.replace(cache_file)
+    except OSError:
+        # the config directory may be read only
+        tmp_file.unlink(missing_ok=True)
+    return matchers
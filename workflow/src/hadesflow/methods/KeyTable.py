@@ -0,0 +1,319 @@
+"""
+This module contains a columnar table of file keys, to handle large numbers of
+cycles without one FileKey object per cycle
+"""
+
+from fnmatch import fnmatchcase
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+
+from .FileKey import FileKey
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _intern(values):
+    """
+    Interns the values into sorted categories, returns the categories and the codes
+    """
+    categories = sorted(dict.fromkeys(values))
+    lookup = {category: code for code, category in enumerate(categories)}
+    codes = np.fromiter(
+        map(lookup.__getitem__, values), dtype=_code_dtype(len(categories)), count=len(values)
+    )
+    return np.array(categories, dtype=object), codes
+
+
+def _digits(chars, positions):
+    value = np.zeros(len(chars), dtype=np.int64)
+    for pos in positions:
+        value = 10 * value + chars[:, pos]
+    return value
+
+
+def timestamps_to_unix(timestamps):
+    """
+    Converts timestamps in the format %Y%m%dT%H%M%SZ to an int64 array of unix
+    time (seconds since epoch, UTC), the fields are read with fixed-width
+    slicing of the character array
+    """
+    ts = np.asarray(timestamps if isinstance(timestamps, np.ndarray) else list(timestamps))
+    if len(ts) == 0:
+        return np.empty(0, dtype=np.int64)
+    if ts.dtype != np.dtype("U16"):
+        msg = "timestamps must be in the format %Y%m%dT%H%M%SZ"
+        raise ValueError(msg)
+
+    chars = ts.reshape(-1).view(np.uint32).reshape(-1, 16).astype(np.int64) - ord("0")
+    digits = np.delete(chars, (8, 15), axis=1)
+    year = _digits(chars, range(4))
+    month = _digits(chars, (4, 5))
+    day = _digits(chars, (6, 7))
+    hour = _digits(chars, (9, 10))
+    minute = _digits(chars, (11, 12))
+    second = _digits(chars, (13, 14))
+
+    month_start = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    days = month_start.astype("datetime64[D]").astype(np.int64)
+    days_in_month = (month_start + 1).astype("datetime64[D]").astype(np.int64) - days
+
+    valid = (
+        ((digits >= 0) & (digits <= 9)).all(axis=1)
+        & (chars[:, 8] == ord("T") - ord("0"))
+        & (chars[:, 15] == ord("Z") - ord("0"))
+        & (year >= 1)
+        & (month >= 1)
+        & (month <= 12)
+        & (day >= 1)
+        & (day <= days_in_month)
+        & (hour < 24)
+        & (minute < 60)
+        & (second < 60)
+    )
+    if not valid.all():
+        msg = f"timestamp {ts[np.argmin(valid)]} not in the format %Y%m%dT%H%M%SZ"
+        raise ValueError(msg)
+
+    return (days + day - 1) * 86400 + hour * 3600 + minute * 60 + second
+
+
+def unix_to_timestamps(unix):
+    """
+    Converts an array of unix time back to timestamps in the format %Y%m%dT%H%M%SZ
+    """
+    unix = np.asarray(unix, dtype=np.int64)
+    days, seconds = np.divmod(unix, 86400)
+    date = days.astype("datetime64[D]")
+    year = date.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = date.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    day = (date - date.astype("datetime64[M]")).astype(np.int64) + 1
+
+    chars = np.empty((len(unix), 16), dtype=np.uint32)
+    chars[:, 8] = ord("T")
+    chars[:, 15] = ord("Z")
+    for column, positions in (
+        (year, range(4)),
+        (month, (4, 5)),
+        (day, (6, 7)),
+        (seconds // 3600, (9, 10)),
+        (seconds // 60 % 60, (11, 12)),
+        (seconds % 60, (13, 14)),
+    ):
+        value = column
+        for pos in positions[::-1]:
+            value, digit = np.divmod(value, 10)
+            chars[:, pos] = digit + ord("0")
+    return chars.view("U16").reshape(-1)
+
+
+class KeyTable:
+    """
+    Columnar table of file keys. The experiment, detector, campaign, measurement
+    and run are stored as codes into sorted categories, the timestamp as int64
+    unix time, so selections and groupings are done on integer arrays.
+    """
+
+    categorical = ("experiment", "detector", "campaign", "measurement", "run")
+
+    def __init__(self, categories, codes, timestamp):
+        self.categories = {field: categories[field] for field in self.categorical}
+        self.codes = {field: codes[field] for field in self.categorical}
+        self.timestamp = np.asarray(timestamp, dtype=np.int64)
+        for field in self.categorical:
+            if len(self.codes[field]) != len(self.timestamp):
+                msg = f"column {field} has a different length than the timestamps"
+                raise ValueError(msg)
+
+    @classmethod
+    def from_columns(cls, **columns):
+        categories = {}
+        codes = {}
+        for field in cls.categorical:
+            categories[field], codes[field] = _intern(columns[field])
+        return cls(categories, codes, timestamps_to_unix(columns["timestamp"]))
+
+    @classmethod
+    def from_filekeys(cls, keys):
+        keys = list(keys)
+        columns = {field: [key[i] for key in keys] for i, field in enumerate(FileKey._fields)}
+        return cls.from_columns(**columns)
+
+    @classmethod
+    def from_names(cls, names):
+        """
+        Builds the table from key names of the form
+        {experiment}-{detector}-{campaign}-{measurement}-{run}-{timestamp}
+        """
+        names = list(names)
+        n_fields = len(FileKey._fields)
+        if set(map(str.count, names, repeat("-"))) - {n_fields - 1}:
+            bad = next(name for name in names if name.count("-") != n_fields - 1)
+            msg = f"invalid key name: {bad}"
+            raise ValueError(msg)
+        # a single split of the joined names avoids one list per key
+        parts = "-".join(names).split("-") if names else []
+        return cls.from_columns(
+            **{field: parts[i::n_fields] for i, field in enumerate(FileKey._fields)}
+        )
+
+    @classmethod
+    def from_keylist(cls, keylist_file):
+        with Path(keylist_file).open() as f:
+            lines = [line.split("#")[0].strip() for line in f.read().splitlines()]
+        return cls.from_names([line for line in lines if line])
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __repr__(self):
+        return f"KeyTable({len(self)} keys)"
+
+    def __eq__(self, other):
+        if not isinstance(other, KeyTable):
+            return NotImplemented
+        return self.to_names() == other.to_names()
+
+    # mutable, like the arrays it holds
+    __hash__ = None
+
+    @property
+    def nbytes(self):
+        return self.timestamp.nbytes + sum(codes.nbytes for codes in self.codes.values())
+
+    def column(self, field):
+        """
+        Returns the column as an array of strings
+        """
+        if field == "timestamp":
+            return unix_to_timestamps(self.timestamp).astype(object)
+        return self.categories[field][self.codes[field]]
+
+    def take(self, indices):
+        return KeyTable(
+            self.categories,
+            {field: codes[indices] for field, codes in self.codes.items()},
+            self.timestamp[indices],
+        )
+
+    def mask(self, start=None, stop=None, **selection):
+        """
+        Returns a boolean mask of the keys matching the selection. Each field can be
+        given a value or list of values, which may contain shell-style wildcards,
+        "*" (as in a parsed keypart) selects everything. start and stop select
+        an inclusive range of timestamps, given as strings or unix time.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for field, values in selection.items():
+            if field not in self.categorical:
+                msg = f"cannot select on field {field}"
+                raise ValueError(msg)
+            patterns = [values] if isinstance(values, str) else values
+            if "*" in patterns:
+                continue
+            selected = [
+                code
+                for code, category in enumerate(self.categories[field])
+                if any(fnmatchcase(category, pattern) for pattern in patterns)
+            ]
+            mask &= np.isin(self.codes[field], selected)
+        if start is not None:
+            mask &= self.timestamp >= self._as_unix(start)
+        if stop is not None:
+            mask &= self.timestamp <= self._as_unix(stop)
+        return mask
+
+    def filter(self, start=None, stop=None, **selection):
+        return self.take(np.flatnonzero(self.mask(start=start, stop=stop, **selection)))
+
+    def select(self, keypart):
+        """
+        Selects the keys matching a keypart, e.g. -{experiment}-{detector}-{campaign}
+        """
+        key = FileKey.parse_keypart(keypart)
+        selection = {field: getattr(key, field) for field in self.categorical}
+        if key.timestamp == "*":
+            return self.filter(**selection)
+        return self.filter(start=key.timestamp, stop=key.timestamp, **selection)
+
+    def argsort(self, by=("timestamp",)):
+        if isinstance(by, str):
+            by = (by,)
+        # lexsort uses the last key as primary key
+        return np.lexsort(
+            [self.timestamp if field == "timestamp" else self.codes[field] for field in by[::-1]]
+        )
+
+    def sort(self, by=("timestamp",)):
+        return self.take(self.argsort(by))
+
+    def _run_ids(self):
+        """
+        Returns the unique run ids, the run index of each key and the number of
+        keys in each run, run ids combine the codes of all categorical fields
+        """
+        dims = tuple(len(self.categories[field]) for field in self.categorical)
+        ids = np.ravel_multi_index(
+            tuple(self.codes[field].astype(np.int64) for field in self.categorical), dims
+        )
+        return np.unique(ids, return_inverse=True, return_counts=True)
+
+    def _run_name(self, run_id):
+        dims = tuple(len(self.categories[field]) for field in self.categorical)
+        return tuple(
+            self.categories[field][code]
+            for field, code in zip(self.categorical, np.unravel_index(run_id, dims), strict=True)
+        )
+
+    def group_by_run(self):
+        """
+        Returns a dictionary of (experiment, detector, campaign, measurement, run)
+        to the KeyTable of that run, sorted by timestamp
+        """
+        if len(self) == 0:
+            return {}
+        runs, inverse, counts = self._run_ids()
+        order = np.lexsort((self.timestamp, inverse))
+        bounds = np.cumsum(counts)[:-1]
+        return {
+            self._run_name(run): self.take(indices)
+            for run, indices in zip(runs, np.split(order, bounds), strict=True)
+        }
+
+    def longest_run(self):
+        """
+        Returns the KeyTable of the run with the most keys, ties go to the run
+        with the latest first key
+        """
+        if len(self) == 0:
+            return self
+        runs, inverse, counts = self._run_ids()
+        first = np.full(len(runs), np.iinfo(np.int64).max)
+        np.minimum.at(first, inverse, self.timestamp)
+        longest = np.lexsort((first, counts))[-1]
+        return self.take(np.flatnonzero(inverse == longest)).sort()
+
+    def to_names(self):
+        columns = [self.column(field) for field in FileKey._fields]
+        return ["-".join(row) for row in zip(*columns, strict=True)]
+
+    def to_filekeys(self):
+        columns = [self.column(field) for field in FileKey._fields]
+        return [FileKey._make(row) for row in zip(*columns, strict=True)]
+
+    def to_keylist(self, keylist_file):
+        Path(keylist_file).parent.mkdir(parents=True, exist_ok=True)
+        with Path(keylist_file).open("w") as f:
+            f.writelines(f"{name}\n" for name in self.to_names())
+
+    @staticmethod
+    def _as_unix(value):
+        if isinstance(value, str):
+            return timestamps_to_unix([value])[0]
+        return np.int64(value)
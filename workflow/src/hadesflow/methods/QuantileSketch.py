@@ -0,0 +1,118 @@
+"""
+This module contains a streaming quantile sketch with relative accuracy (the
+DDSketch of Masson et al.): the values are counted in logarithmic buckets,
+bucket i of the positive values holding (gamma^(i-1), gamma^i] with
+gamma = (1 + a) / (1 - a), and the negative values mirrored. A quantile is
+returned within a relative error a of the order statistics np.percentile
+interpolates between, the memory grows with the logarithm of the value range
+only. Values far from 0 with a small spread (baselines) are sketched relative
+to an offset near them, the error is then relative to the distance to it.
+"""
+
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """
+    Quantile sketch of the values added chunk by chunk, the NaNs are skipped
+    """
+
+    def __init__(self, relative_accuracy=1e-3, min_value=1e-9, offset=0):
+        if not 0 < relative_accuracy < 1:
+            msg = f"relative_accuracy must be in (0, 1), got {relative_accuracy}"
+            raise ValueError(msg)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # values closer to 0 count as 0
+        self.min_value = min_value
+        self.offset = offset
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _add_to(self, store, values):
+        index, counts = np.unique(
+            np.ceil(np.log(values) / self._log_gamma).astype(np.int64), return_counts=True
+        )
+        for i, n in zip(index.tolist(), counts.tolist()):
+            store[i] = store.get(i, 0) + n
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel() - self.offset
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()) + self.offset)
+        self.max = max(self.max, float(values.max()) + self.offset)
+        self._add_to(self.positive, values[values > self.min_value])
+        self._add_to(self.negative, -values[values < -self.min_value])
+        self.zeros += int(np.count_nonzero(np.abs(values) <= self.min_value))
+
+    def buckets(self):
+        """
+        The buckets in increasing order of value, as (low edge, high edge, count),
+        relative to the offset
+        """
+        buckets = [
+            (-(self.gamma**i), -(self.gamma ** (i - 1)), self.negative[i])
+            for i in sorted(self.negative, reverse=True)
+        ]
+        if self.zeros:
+            buckets.append((-self.min_value, self.min_value, self.zeros))
+        buckets += [
+            (self.gamma ** (i - 1), self.gamma**i, self.positive[i]) for i in sorted(self.positive)
+        ]
+        return buckets
+
+    def _value(self, low, high):
+        if low >= 0:
+            value = 2 * high / (self.gamma + 1)
+        elif high <= 0:
+            value = 2 * low / (self.gamma + 1)
+        else:
+            value = 0
+        return min(max(value, self.min - self.offset), self.max - self.offset)
+
+    def _ranked(self, ranks):
+        values = []
+        ranks = iter(sorted(ranks))
+        rank = next(ranks, None)
+        seen = 0
+        for low, high, count in self.buckets():
+            seen += count
+            while rank is not None and rank < seen:
+                values.append(self._value(low, high))
+                rank = next(ranks, None)
+        return values
+
+    def quantile(self, q):
+        """
+        The q quantile (q in [0, 1]) with the linear interpolation of np.quantile
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        low, high = self._ranked([math.floor(rank), math.ceil(rank)])
+        return self.offset + low + (high - low) * (rank - math.floor(rank))
+
+    def percentile(self, p):
+        return self.quantile(p / 100)
+
+    def mode(self, low=-math.inf, high=math.inf):
+        """
+        The value of the highest density (count per unit) between low and high,
+        the buckets narrow towards the offset so the range should keep off it
+        """
+        best, value = -1, math.nan
+        for edge_low, edge_high, count in self.buckets():
+            centre = self.offset + self._value(edge_low, edge_high)
+            if low <= centre <= high and count / (edge_high - edge_low) > best:
+                best, value = count / (edge_high - edge_low), centre
+        return value
@@ -0,0 +1,213 @@
+"""
+This module contains the resource model of the processing rules. The runtime
+and the peak memory of each rule are fitted as linear functions of the input
+size, per measurement where there are enough records and per rule otherwise,
+from the extended Snakemake benchmark records of past jobs. The rules compute
+their runtime and mem_mb per job from the model, scaled by a margin covering
+the spread of the records and by the attempt number, and fall back to their
+static values without history.
+"""
+
+import json
+import math
+import os
+import statistics
+from pathlib import Path
+
+# records needed for a fit, the most recent max_records of a rule are used
+min_records = 5
+max_records = 1000
+# quantile of observed / fitted taken as the safety margin
+margin_quantile = 0.95
+min_mem_mb = 200
+quantities = ("runtime_s", "max_rss_mb")
+
+
+def input_size_mb(files):
+    """
+    Size of the input files in MB, file lists count with the files they list
+    """
+    total = 0
+    for file in files:
+        try:
+            if str(file).endswith(".filelist"):
+                total += input_size_mb(Path(file).read_text().split()) * 1024**2
+            else:
+                total += os.stat(file).st_size
+        except OSError:
+            continue
+    return total / 1024**2
+
+
+def fit(sizes, values):
+    """
+    Fits value = intercept + slope * size, with a non-negative slope, and the
+    margin covering margin_quantile of the records
+    """
+    mean = statistics.fmean(values)
+    slope, intercept = 0, mean
+    if len(set(sizes)) > 1:
+        slope, intercept = statistics.linear_regression(sizes, values)
+        if slope < 0:
+            slope, intercept = 0, mean
+    intercept = max(intercept, 0)
+    ratios = sorted(
+        value / max(intercept + slope * size, 1e-3) for size, value in zip(sizes, values)
+    )
+    margin = ratios[min(len(ratios) - 1, math.ceil(margin_quantile * len(ratios)) - 1)]
+    return {
+        "n": len(values),
+        "intercept": intercept,
+        "slope": slope,
+        "margin": max(margin, 1.0),
+    }
+
+
+def read_benchmark(path):
+    """
+    Records of an extended benchmark file (snakemake --benchmark-extended, in
+    the jsonl format), without the ones lacking the rule or the runtime
+    """
+    records = []
+    with Path(path).open() as f:
+        for line in f:
+            entry = json.loads(line)
+            if "rule_name" not in entry:
+                continue
+            resources = entry.get("resources") or {}
+            input_mb = resources.get("input_mb")
+            if input_mb is None:
+                input_mb = sum((entry.get("input_size_mb") or {}).values())
+            max_rss = entry.get("max_rss")
+            records.append(
+                {
+                    "rule": entry["rule_name"],
+                    "measurement": (entry.get("wildcards") or {}).get("measurement"),
+                    "input_mb": float(input_mb),
+                    "runtime_s": float(entry["s"]),
+                    "max_rss_mb": None if max_rss in (None, "NA") else float(max_rss),
+                    "runtime": resources.get("runtime"),
+                    "mem_mb": resources.get("mem_mb"),
+                }
+            )
+    return records
+
+
+class ResourceModel:
+    """
+    Fits per rule and measurement, persisted in a json file. Without a model file
+    (or history for a rule) the rules get their default resources.
+    """
+
+    version = 1
+
+    def __init__(self, model_file=None):
+        self.model_file = None if model_file is None else Path(model_file)
+        self.rules = {}
+        self._sizes = {}
+        if self.model_file is not None:
+            try:
+                with self.model_file.open() as f:
+                    model = json.load(f)
+                if model.get("version") == self.version:
+                    self.rules = model["rules"]
+            except (OSError, ValueError):
+                pass
+
+    def fit(self, records):
+        """
+        Fits the model to the records (see read_benchmark)
+        """
+        by_rule = {}
+        for record in records:
+            by_rule.setdefault(record["rule"], []).append(record)
+
+        def fit_quantities(rule_records):
+            fits = {}
+            for quantity in quantities:
+                points = [
+                    (record["input_mb"], record[quantity])
+                    for record in rule_records
+                    if record[quantity] is not None
+                ]
+                if len(points) >= min_records:
+                    fits[quantity] = fit(*zip(*points))
+            return fits
+
+        self.rules = {}
+        for rule, records in by_rule.items():
+            rule_records = records[-max_records:]
+            measurements = {}
+            for record in rule_records:
+                measurements.setdefault(record["measurement"], []).append(record)
+            self.rules[rule] = {
+                "all": fit_quantities(rule_records),
+                "measurements": {
+                    measurement: fit_quantities(measurement_records)
+                    for measurement, measurement_records in measurements.items()
+                    if measurement is not None
+                },
+            }
+
+    def save(self, model_file=None):
+        model_file = self.model_file if model_file is None else Path(model_file)
+        model_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = model_file.with_name(f"{model_file.name}.{os.getpid()}.tmp")
+        with tmp_file.open("w") as f:
+            json.dump({"version": self.version, "rules": self.rules}, f, indent=2)
+        tmp_file.replace(model_file)
+
+    def predict(self, rule, measurement, quantity, size_mb, margin=True):
+        """
+        Predicted runtime (s) or peak RSS (MB) of a job, None without a fit
+        """
+        fits = self.rules.get(rule, {})
+        params = fits.get("measurements", {}).get(measurement, {}).get(quantity)
+        if params is None:
+            params = fits.get("all", {}).get(quantity)
+        if params is None:
+            return None
+        value = params["intercept"] + params["slope"] * size_mb
+        return value * params["margin"] if margin else value
+
+    def _size(self, input):
+        key = tuple(map(str, input))
+        if key not in self._sizes:
+            self._sizes[key] = input_size_mb(key)
+        return self._sizes[key]
+
+    def input_mb(self, _wildcards, input):
+        """
+        Input size of the job in MB, as a resource so it is in the benchmark record
+        """
+        return math.ceil(self._size(input))
+
+    def runtime(self, rule, default=None):
+        """
+        The runtime resource (in minutes) of the rule, default without a fit (None
+        leaves it unset)
+        """
+
+        def runtime(wildcards, input, attempt):
+            seconds = self.predict(
+                rule, wildcards.get("measurement"), "runtime_s", self._size(input)
+            )
+            if seconds is None:
+                return None if default is None else default * attempt
+            return max(1, math.ceil(seconds / 60)) * attempt
+
+        return runtime
+
+    def mem_mb(self, rule, default=None):
+        """
+        The mem_mb resource of the rule, default without a fit (None leaves the
+        Snakemake default)
+        """
+
+        def mem_mb(wildcards, input, attempt):
+            rss = self.predict(rule, wildcards.get("measurement"), "max_rss_mb", self._size(input))
+            if rss is None:
+                return None if default is None else default * attempt
+            return max(min_mem_mb, math.ceil(rss)) * attempt
+
+        return mem_mb
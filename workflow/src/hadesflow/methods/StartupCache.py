@@ -0,0 +1,161 @@
+"""
+This module contains the startup cache of the workflow. Each startup step (config
+repository checkout, catalog compilation, environment probes) is keyed on a
+fingerprint of its inputs and skipped when the fingerprint did not change since
+the last successful run. The time spent in each phase is recorded for a report.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from git import Repo
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def git_fingerprint(repo_path, version=None):
+    """
+    Fingerprint of the checked out state of a git repository and its submodules
+    """
+    repo = Repo(repo_path)
+    return _digest(
+        [version, repo.git.rev_parse("HEAD"), repo.git.submodule("status", "--recursive")]
+    )
+
+
+def tree_fingerprint(path, exclude=(".git",)):
+    """
+    Fingerprint of the paths, mtimes and sizes of all files in a directory tree
+    """
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in exclude)
+        for file in sorted(files):
+            try:
+                stat = os.stat(os.path.join(root, file))
+            except OSError:
+                continue
+            entries.append(
+                [os.path.relpath(os.path.join(root, file), path), stat.st_mtime_ns, stat.st_size]
+            )
+    return _digest(entries)
+
+
+def execenv_fingerprint(setup, pyexe):
+    """
+    Fingerprint of the execution environment: the python command, the execenv
+    settings and the mtimes of the software install directory and its
+    site-packages
+    """
+    install = setup["paths"].get("install")
+    mtimes = []
+    if install is not None and Path(install).is_dir():
+        for path in [Path(install), *sorted(Path(install).glob("lib/python*/site-packages"))]:
+            mtimes.append([str(path), path.stat().st_mtime_ns])
+    return _digest([pyexe, setup.get("execenv"), mtimes])
+
+
+class StartupCache:
+    """
+    Fingerprints of the startup steps, persisted in a json file, values returned
+    by cached steps are pickled next to it. Without a cache file every step runs.
+    """
+
+    version = 1
+
+    def __init__(self, cache_file=None):
+        self.cache_file = None if cache_file is None else Path(cache_file)
+        self.fingerprints = {}
+        # phase -> (seconds, skipped)
+        self.timings = {}
+        if self.cache_file is not None:
+            try:
+                with self.cache_file.open() as f:
+                    cache = json.load(f)
+                if cache.get("version") == self.version:
+                    self.fingerprints = cache["fingerprints"]
+            except (OSError, ValueError):
+                pass
+
+    @contextmanager
+    def phase(self, name):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - tic, False)
+
+    def is_current(self, name, fingerprint):
+        return self.cache_file is not None and self.fingerprints.get(name) == fingerprint
+
+    def run(self, name, fingerprint, func):
+        """
+        Runs func unless the fingerprint of the step is unchanged, the fingerprint
+        is given as a function so computing it is part of the phase timing, it
+        is computed again after the step as the step may change its inputs (e.g.
+        a checkout). Returns whether the step ran.
+        """
+        tic = time.perf_counter()
+        skipped = self.is_current(name, fingerprint())
+        if not skipped:
+            func()
+            self._store(name, fingerprint())
+        self.timings[name] = (time.perf_counter() - tic, skipped)
+        return not skipped
+
+    def cached(self, name, fingerprint, func):
+        """
+        Returns the result of func, pickled and reused while the fingerprint of
+        the step is unchanged
+        """
+        tic = time.perf_counter()
+        fingerprint = fingerprint()
+        value_file = (
+            None
+            if self.cache_file is None
+            else self.cache_file.with_name(f"{self.cache_file.stem}.{name}.pkl")
+        )
+        value = None
+        skipped = False
+        if self.is_current(name, fingerprint):
+            try:
+                with value_file.open("rb") as f:
+                    value = pickle.load(f)
+                skipped = True
+            except Exception:
+                # a broken value is recomputed
+                pass
+        if not skipped:
+            value = func()
+            if value_file is not None:
+                value_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = value_file.with_name(f"{value_file.name}.{os.getpid()}.tmp")
+                with tmp_file.open("wb") as f:
+                    pickle.dump(value, f)
+                tmp_file.replace(value_file)
+            self._store(name, fingerprint)
+        self.timings[name] = (time.perf_counter() - tic, skipped)
+        return value
+
+    def _store(self, name, fingerprint):
+        self.fingerprints[name] = fingerprint
+        if self.cache_file is None:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+        with tmp_file.open("w") as f:
+            json.dump({"version": self.version, "fingerprints": self.fingerprints}, f)
+        tmp_file.replace(self.cache_file)
+
+    def report(self):
+        return "\n".join(
+            f"{name:>20}: {seconds:7.3f} s{' (cached)' if skipped else ''}"
+            for name, (seconds, skipped) in self.timings.items()
+        )
@@ -0,0 +1,76 @@
+"""
+This module contains an index of the validity intervals of a pre-compiled
+catalog (see legenddataflowscripts.workflow.pre_compile_catalog). The start
+times of each system are read once, lookups are a binary search, and the
+snakemake_rules block resolved for a (timestamp, system) pair is cached, so all
+the parameters of a job share one resolution.
+"""
+
+from bisect import bisect_right
+from functools import lru_cache
+
+from dbetto.time import unix_time
+
+
+@lru_cache(maxsize=65536)
+def _unix_time(timestamp):
+    return unix_time(timestamp)
+
+
+class ValidityIndex:
+    """
+    Interval index of a Catalog, valid_for returns exactly what Catalog.valid_for returns
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.valid_from = {
+            system: [entry.valid_from for entry in entries]
+            for system, entries in catalog.entries.items()
+        }
+        self._rules = {}
+
+    def valid_for(self, timestamp, system="all", allow_none=False):
+        if system in self.valid_from:
+            pos = bisect_right(self.valid_from[system], _unix_time(timestamp))
+            if pos > 0:
+                return self.catalog.entries[system][pos - 1].file
+
+            if system != "all":
+                return self.valid_for(timestamp, system="all", allow_none=allow_none)
+
+            if allow_none:
+                return None
+
+            msg = f"No valid entries found for timestamp: {timestamp}, system: {system}"
+            raise RuntimeError(msg)
+
+        if system != "all":
+            return self.valid_for(timestamp, system="all", allow_none=allow_none)
+
+        if allow_none:
+            return None
+
+        msg = f"No entries found for system: {system}"
+        raise RuntimeError(msg)
+
+    def snakemake_rules(self, timestamp, system="all"):
+        """
+        Returns the snakemake_rules block valid for the timestamp and system
+        """
+        key = (timestamp, system)
+        if key not in self._rules:
+            self._rules[key] = self.valid_for(timestamp, system=system)["snakemake_rules"]
+        return self._rules[key]
+
+
+_indices = {}
+
+
+def get_validity_index(catalog):
+    """
+    Returns the ValidityIndex of the catalog, built once per process
+    """
+    if id(catalog) not in _indices or _indices[id(catalog)].catalog is not catalog:
+        _indices[id(catalog)] = ValidityIndex(catalog)
+    return _indices[id(catalog)]
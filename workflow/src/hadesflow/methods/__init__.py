@@ -1,6 +1,32 @@
+import sys
+import types
+
 from .FileKey import FileKey, ProcessingFileKey
 
 __all__ = [
     "FileKey",
+    "KeyTable",
     "ProcessingFileKey",
 ]
+
+
+class _Methods(types.ModuleType):
+    def __setattr__(self, name, value):
+        # the import system binds the KeyTable submodule to the package, the
+        # class keeps the name
+        if name == "KeyTable" and isinstance(value, types.ModuleType):
+            value = value.KeyTable
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Methods
+
+
+def __getattr__(name):
+    # KeyTable imports numpy, the key and path utilities do not need it
+    if name == "KeyTable":
+        from .KeyTable import KeyTable  # noqa: PLC0415
+
+        return KeyTable
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
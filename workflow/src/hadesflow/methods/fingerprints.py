@@ -0,0 +1,262 @@
+"""
+This module contains the content fingerprints of the tier and par files. When a
+job ends, a fingerprint is written next to each of its outputs (as the hidden
+file .<name>.fingerprint) with the digests of the inputs (the par databases
+among them), of the config files and the versions of the processing packages.
+Inputs with a fingerprint of their own count with its digest, so the digest of
+an output only changes with the contents it was derived from, never with the
+modification times. Other files are hashed in full (a change anywhere in a
+file changes its digest), file lists by the files they list.
+
+check_outputs compares the fingerprints with the current files, reading only
+the files whose size or modification time differ from the ones recorded.
+"""
+
+import hashlib
+import json
+import os
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+packages = (
+    "hades-dataflow",
+    "dspeed",
+    "pygama",
+    "legend-pydataobj",
+    "legend-daq2lh5",
+    "legend-dataflow-scripts",
+    "dbetto",
+)
+block_bytes = 1024**2
+
+
+def fingerprint_path(path):
+    path = Path(path)
+    return path.with_name(f".{path.name}.fingerprint")
+
+
+def package_versions():
+    versions = {}
+    for package in packages:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def hash_file(path):
+    path = Path(path)
+    digest = hashlib.sha256()
+    if path.is_dir():
+        for file in sorted(path.rglob("*")):
+            if file.is_file():
+                digest.update(f"{file.relative_to(path)}:{hash_file(file)}\n".encode())
+        return digest.hexdigest()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """
+    Returns the digest of a file and the stat of the file it was read from, the
+    stat is None if the digest cannot be reused on an unchanged stat (file lists)
+    or if the file is missing
+    """
+    record = read_fingerprint(path)
+    if record is not None:
+        return record["digest"], _stat(fingerprint_path(path))
+    try:
+        if str(path).endswith(".filelist"):
+            digest = hashlib.sha256()
+            for file in Path(path).read_text().split():
+                digest.update(f"{file_digest(file)[0]}\n".encode())
+            return digest.hexdigest(), None
+        return hash_file(path), _stat(path)
+    except OSError:
+        return None, None
+
+
+def _entries(paths):
+    entries = []
+    for path in paths:
+        digest, stat = file_digest(path)
+        entries.append({"path": str(path), "digest": digest, "stat": stat})
+    return entries
+
+
+def _digest(inputs, configs, versions):
+    content = {
+        "inputs": [entry["digest"] for entry in inputs],
+        "configs": [entry["digest"] for entry in configs],
+        "packages": versions,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def fingerprint(inputs, configs=()):
+    """
+    The fingerprint of an output built from the input and config files
+    """
+    inputs = _entries(inputs)
+    configs = _entries(configs)
+    versions = package_versions()
+    return {
+        "digest": _digest(inputs, configs, versions),
+        "inputs": inputs,
+        "configs": configs,
+        "packages": versions,
+    }
+
+
+def read_fingerprint(path):
+    try:
+        with fingerprint_path(path).open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(outputs, inputs, configs=()):
+    """
+    Writes the fingerprint of the inputs and configs next to each output
+    """
+    record = fingerprint(inputs, configs)
+    for output in outputs:
+        path = fingerprint_path(output)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(record, f, indent=1)
+        tmp_path.replace(path)
+    return record
+
+
+def _upstream(path):
+    """
+    The fingerprinted files an input stands for, itself or the ones it lists
+    """
+    files = [path]
+    if str(path).endswith(".filelist"):
+        try:
+            files = Path(path).read_text().split()
+        except OSError:
+            return []
+    return [file for file in files if fingerprint_path(file).exists()]
+
+
+def _changed(path, entry, digests):
+    if path not in digests:
+        source = fingerprint_path(path) if fingerprint_path(path).exists() else path
+        stat = _stat(source)
+        if stat is not None and stat == entry["stat"]:
+            digests[path] = entry["digest"]
+        else:
+            digests[path] = file_digest(path)[0]
+    return digests[path] != entry["digest"]
+
+
+def check_outputs(outputs):
+    """
+    Returns, for each output and the fingerprinted outputs it was built from,
+    the reasons it is stale: the inputs, config files and packages that changed
+    since it was built, and the inputs that are stale themselves. An empty list
+    means the output is up to date, None that it has no fingerprint.
+    """
+    versions = package_versions()
+    digests = {}
+    results = {}
+
+    def check(output):
+        output = str(output)
+        if output in results:
+            return results[output]
+        results[output] = []
+        record = read_fingerprint(output)
+        if record is None or not Path(output).exists():
+            results[output] = None
+            return None
+        reasons = []
+        for entry in record["inputs"]:
+            if any(check(upstream) for upstream in _upstream(entry["path"])):
+                reasons.append(f"input {entry['path']} is stale")
+            elif _changed(entry["path"], entry, digests):
+                reasons.append(f"input {entry['path']} changed")
+        reasons += [
+            f"config {entry['path']} changed"
+            for entry in record["configs"]
+            if _changed(entry["path"], entry, digests)
+        ]
+        reasons += [
+            f"package {package} {recorded} -> {versions.get(package)}"
+            for package, recorded in record["packages"].items()
+            if versions.get(package) != recorded
+        ]
+        results[output] = reasons
+        return reasons
+
+    for output in outputs:
+        check(output)
+    return results
+
+
+def find_outputs(paths):
+    """
+    The fingerprinted outputs among the paths, directories are searched
+    """
+    outputs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            outputs += [
+                fp.with_name(fp.name[1 : -len(".fingerprint")])
+                for fp in sorted(path.rglob(".*.fingerprint"))
+            ]
+        else:
+            outputs.append(path)
+    return outputs
+
+
+def mark_stale(output):
+    """
+    Sets the modification time of the output to the epoch, so Snakemake rebuilds it
+    """
+    os.utime(output, ns=(0, 0))
+
+
+def align_mtimes(results):
+    """
+    Sets the modification time of the up to date outputs (the ones with an empty
+    list in the results of check_outputs) older than one of their inputs to the
+    one of their newest input, upstream outputs first, so Snakemake does not
+    rebuild them. Returns the outputs changed.
+    """
+    aligned = []
+    done = set()
+
+    def align(output):
+        if output in done or results.get(output) != []:
+            return
+        done.add(output)
+        newest = 0
+        for entry in read_fingerprint(output)["inputs"]:
+            for upstream in _upstream(entry["path"]):
+                align(upstream)
+            stat = _stat(entry["path"])
+            if stat is not None:
+                newest = max(newest, stat[1])
+        if _stat(output)[1] < newest:
+            os.utime(output, ns=(newest, newest))
+            aligned.append(output)
+
+    for output in results:
+        align(output)
+    return aligned
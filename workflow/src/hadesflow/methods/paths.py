@@ -102,5 +102,29 @@ def tmp_log_path(setup):
     return setup["paths"]["tmp_log"]
 
 
+def tmp_benchmark_path(setup):
+    return setup["paths"]["tmp_benchmark"]
+
+
 def filelist_path(setup):
     return setup["paths"]["tmp_filelists"]
+
+
+def file_index_path(setup):
+    # optional, without it the file index is not persisted between invocations
+    return setup["paths"].get("file_index")
+
+
+def startup_cache_path(setup):
+    # optional, without it every startup step runs at each invocation
+    return setup["paths"].get("startup_cache")
+
+
+def resource_model_path(setup):
+    # optional, without it the rules get their static resources
+    return setup["paths"].get("resource_model")
+
+
+def dsp_tuning_path(setup):
+    # optional, without it build_dsp uses the buffer_len and block_width of the settings
+    return setup["paths"].get("dsp_tuning")
@@ -11,6 +11,7 @@ from .paths import (
     plts_path,
     tier_daq_path,
     tier_path,
+    tmp_benchmark_path,
     tmp_log_path,
     tmp_par_path,
     tmp_plts_path,
@@ -160,3 +161,13 @@ def get_pattern_log_par(setup, processing_step, time):
         / "{campaign}"
         / (par_pattern() + f"-{processing_step}.log"),
     )
+
+
+def get_pattern_benchmark(setup, processing_step, time):
+    return (
+        Path(f"{tmp_benchmark_path(setup)}")
+        / time
+        / f"{processing_step}"
+        / "{campaign}"
+        / (key_pattern() + f"-{processing_step}.jsonl")
+    )
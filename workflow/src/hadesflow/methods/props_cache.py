@@ -0,0 +1,98 @@
+"""
+This module contains the cache of parsed parameter files. Props.read_from
+results are pickled, keyed by the hash of the content of the files (in the
+order they are merged), so the per-run par files are parsed once per run
+instead of once per cycle. The cache directory is $HADESFLOW_PARS_CACHE, by
+default pars in $XDG_CACHE_HOME/hadesflow (which the workflow sets to
+.snakemake/cache in the production directory). Files missing from the cache,
+or unreadable, are parsed again.
+"""
+
+import copy
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+from dbetto import Props
+
+_CACHE_VERSION = 1
+
+# in-memory cache, (paths, mtimes) -> value, enabled in long-running
+# processes (see scripts/flow/worker_service.py)
+_memory = None
+
+
+def cache_dir():
+    if os.getenv("HADESFLOW_PARS_CACHE"):
+        return Path(os.getenv("HADESFLOW_PARS_CACHE"))
+    base = os.getenv("XDG_CACHE_HOME") or Path("~/.cache").expanduser()
+    return Path(base) / "hadesflow" / "pars"
+
+
+def enable_memory_cache():
+    global _memory  # noqa: PLW0603
+    if _memory is None:
+        _memory = {}
+
+
+def content_hash(paths, *options):
+    """
+    Hash of the contents and suffixes of the files, in order
+    """
+    digest = hashlib.sha1(repr((_CACHE_VERSION, options)).encode())
+    for path in paths:
+        digest.update(Path(path).suffix.encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def _read(sources, paths, subst_pathvar, trim_null):
+    # with subst_pathvar the result depends on the location of the files
+    locations = [str(Path(path).resolve().parent) for path in paths] if subst_pathvar else []
+    try:
+        key = content_hash(paths, subst_pathvar, trim_null, locations)
+    except OSError:
+        # let Props report the missing file
+        return Props.read_from(sources, subst_pathvar, trim_null)
+
+    cache_file = cache_dir() / key[:2] / f"{key}.pkl"
+    try:
+        with cache_file.open("rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # a missing or broken entry is rebuilt
+        pass
+
+    value = Props.read_from(sources, subst_pathvar, trim_null)
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+        with tmp_file.open("wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)
+    except OSError:
+        pass
+    return value
+
+
+def read_props(sources, subst_pathvar=False, trim_null=False):
+    """
+    Props.read_from through the cache
+    """
+    paths = [sources] if isinstance(sources, (str, Path)) else list(sources)
+    if _memory is None:
+        return _read(sources, paths, subst_pathvar, trim_null)
+
+    try:
+        key = (
+            subst_pathvar,
+            trim_null,
+            *((str(path), os.stat(path).st_mtime_ns) for path in paths),
+        )
+    except OSError:
+        return _read(sources, paths, subst_pathvar, trim_null)
+    if key not in _memory:
+        _memory[key] = _read(sources, paths, subst_pathvar, trim_null)
+    # the callers modify the dictionaries
+    return copy.deepcopy(_memory[key])
@@ -5,43 +5,124 @@ and for substituting the pathvar within, also the conversion
 from timestamp to unix time
 """
 
+import calendar
 import os
 import re
 from datetime import datetime
+from functools import lru_cache
 
 
+@lru_cache(maxsize=65536)
 def convert_to_daq_timestamp(value):
     return datetime.strftime(datetime.strptime(value, "%Y%m%dT%H%M%SZ"), "%y%m%dT%H%M%S")
 
 
+@lru_cache(maxsize=65536)
 def convert_to_legend_timestamp(value):
     return datetime.strftime(datetime.strptime(value, "%y%m%dT%H%M%S"), "%Y%m%dT%H%M%SZ")
 
 
+@lru_cache(maxsize=4096)
 def convert_to_legend_run(value):
     return re.sub(r"run\d{1}(\d{3})", r"r\1", value)
 
 
+@lru_cache(maxsize=4096)
 def convert_to_daq_run(value):
     return re.sub(r"r(\d{3})", r"run0\1", value)
 
 
+# canonical fixed-width timestamps with a valid time of day, the date is checked separately
+_daq_timestamp_rx = re.compile(r"\d{6}T(?:[01]\d|2[0-3])[0-5]\d[0-5]\d", re.ASCII)
+_legend_timestamp_rx = re.compile(r"\d{8}T(?:[01]\d|2[0-3])[0-5]\d[0-5]\dZ", re.ASCII)
+
+
+@lru_cache(maxsize=4096)
+def _is_valid_date(yyyymmdd):
+    year, month, day = int(yyyymmdd[:4]), int(yyyymmdd[4:6]), int(yyyymmdd[6:8])
+    return year >= 1 and 1 <= month <= 12 and 1 <= day <= calendar.monthrange(year, month)[1]
+
+
+@lru_cache(maxsize=4096)
+def _daq_date_to_legend(yymmdd):
+    # %y maps 69-99 to 1969-1999 and 00-68 to 2000-2068
+    century = "19" if int(yymmdd[:2]) >= 69 else "20"
+    return century + yymmdd if _is_valid_date(century + yymmdd) else None
+
+
+def _is_digits(value):
+    return value.isascii() and value.isdigit()
+
+
+def convert_to_legend_timestamps(values):
+    """
+    Batch version of convert_to_legend_timestamp. Timestamps in the canonical
+    %y%m%dT%H%M%S form are converted by fixed-width slicing, anything else goes
+    through the scalar conversion so results (and errors) are identical.
+    """
+    match = _daq_timestamp_rx.fullmatch
+    out = []
+    for value in values:
+        date = _daq_date_to_legend(value[:6]) if match(value) else None
+        out.append(
+            f"{date}{value[6:]}Z" if date is not None else convert_to_legend_timestamp(value)
+        )
+    return out
+
+
+def convert_to_daq_timestamps(values):
+    """
+    Batch version of convert_to_daq_timestamp, see convert_to_legend_timestamps
+    """
+    match = _legend_timestamp_rx.fullmatch
+    return [
+        (
+            value[2:15]
+            if match(value) and _is_valid_date(value[:8])
+            else convert_to_daq_timestamp(value)
+        )
+        for value in values
+    ]
+
+
+def convert_to_legend_runs(values):
+    """
+    Batch version of convert_to_legend_run, run0123 -> r123 by slicing
+    """
+    return [
+        (
+            f"r{value[4:]}"
+            if len(value) == 7 and value.startswith("run") and _is_digits(value[3:])
+            else convert_to_legend_run(value)
+        )
+        for value in values
+    ]
+
+
+def convert_to_daq_runs(values):
+    """
+    Batch version of convert_to_daq_run, r123 -> run0123 by slicing
+    """
+    return [
+        (
+            f"run0{value[1:]}"
+            if len(value) == 4 and value[0] == "r" and _is_digits(value[1:])
+            else convert_to_daq_run(value)
+        )
+        for value in values
+    ]
+
+
 def run_splitter(files):
     """
     Returns list containing lists of each run
     """
 
-    runs = []
-    run_files = []
+    run_files = {}
     for file in files:
         base = os.path.basename(file)
         file_name = os.path.splitext(base)[0]
         parts = file_name.split("-")
         run_no = parts[3]
-        if run_no not in runs:
-            runs.append(run_no)
-            run_files.append([])
-        for i, run in enumerate(runs):
-            if run == run_no:
-                run_files[i].append(file)
-    return run_files
+        run_files.setdefault(run_no, []).append(file)
+    return list(run_files.values())
@@ -0,0 +1,100 @@
+"""
+This module contains the LH5 write profiles of the tiers, set in the config:
+
+    lh5_write_profiles:
+      dsp:
+        compression: gzip
+        compression_opts: 4
+        shuffle: true
+        chunk_rows: 16384
+
+compression, compression_opts and shuffle are the h5py dataset options passed
+to lh5.write (compression null disables it). chunk_rows sets the chunks of the
+datasets created to this number of rows, the other dimensions whole, capped at
+max_chunk_bytes per chunk, through the hdf5_settings attributes lh5.write
+passes to h5py per dataset. Without chunk_rows h5py picks the chunks from the
+size of the first write. Chunks larger than the rows written at once are
+rewritten by every append, which makes the compressed files larger.
+
+dspeed.build_dsp takes no write options, the dsp profile is applied by the
+sharded writer of build-dsp-hades, used with n_workers > 1 in its settings.
+
+The raw files are written by daq2lh5.build_raw, which only takes the h5py
+options of lh5.write (its hdf5_settings), so the raw profile has no chunk_rows.
+"""
+
+from lgdo import types
+
+profile_keys = ("compression", "compression_opts", "shuffle", "chunk_rows")
+max_chunk_bytes = 4 * 1024**2
+
+
+def get_write_profile(setup, tier):
+    """
+    Returns the write profile of the tier, empty if none is configured
+    """
+    profile = dict(setup.get("lh5_write_profiles", {}).get(tier) or {})
+    check_profile(profile)
+    if tier == "raw" and "chunk_rows" in profile:
+        msg = "chunk_rows is not supported in the raw write profile"
+        raise ValueError(msg)
+    return profile
+
+
+def check_profile(profile):
+    unknown = set(profile) - set(profile_keys)
+    if unknown:
+        msg = f"unknown LH5 write profile keys {sorted(unknown)}, allowed are {profile_keys}"
+        raise ValueError(msg)
+    if "chunk_rows" in profile and (
+        not isinstance(profile["chunk_rows"], int) or profile["chunk_rows"] < 1
+    ):
+        msg = f"chunk_rows must be a positive integer, got {profile['chunk_rows']}"
+        raise ValueError(msg)
+
+
+def hdf5_settings(profile):
+    """
+    The h5py dataset options of the profile, keyword arguments of lh5.write
+    """
+    return {
+        key: profile[key]
+        for key in ("compression", "compression_opts", "shuffle")
+        if key in profile
+    }
+
+
+def chunk_shape(shape, itemsize, chunk_rows):
+    row_bytes = itemsize
+    for dim in shape[1:]:
+        row_bytes *= dim
+    rows = max(1, min(chunk_rows, max_chunk_bytes // max(row_bytes, 1)))
+    return (rows, *(max(dim, 1) for dim in shape[1:]))
+
+
+def set_chunks(obj, chunk_rows):
+    """
+    Sets the chunks of the datasets of the LGDO to chunk_rows rows, in the
+    hdf5_settings attributes of its arrays
+    """
+    if isinstance(obj, types.VectorOfVectors):
+        set_chunks(obj.flattened_data, chunk_rows)
+        set_chunks(obj.cumulative_length, chunk_rows)
+    elif isinstance(obj, types.Array):
+        settings = obj.attrs.get("hdf5_settings", {})
+        chunks = chunk_shape(obj.nda.shape, obj.nda.dtype.itemsize, chunk_rows)
+        obj.attrs["hdf5_settings"] = {**settings, "chunks": chunks}
+    elif isinstance(obj, types.Struct):
+        for field in obj.values():
+            set_chunks(field, chunk_rows)
+
+
+def apply_profile(obj, profile):
+    """
+    Applies the profile to the LGDO and returns the keyword arguments of
+    lh5.write to write it with
+    """
+    check_profile(profile)
+    if "chunk_rows" in profile:
+        set_chunks(obj, profile["chunk_rows"])
+    return hdf5_settings(profile)
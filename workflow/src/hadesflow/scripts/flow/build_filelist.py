@@ -1,38 +1,81 @@
-import glob
+from collections import Counter
 from pathlib import Path
 
-from dbetto import Props
 import hadesflow.methods.patterns as patt
 from hadesflow.methods import FileKey
+from hadesflow.methods.DirScanner import get_scanner
+from hadesflow.methods.FileIndex import get_file_index
+from hadesflow.methods.FileKey import get_file_pattern
+from hadesflow.methods.KeyMatcher import KeyMatcher, compile_ignore_keys, load_ignore_keys
+from hadesflow.methods.paths import file_index_path
 from hadesflow.methods.utils import convert_to_daq_run
 
 
-def get_ignored_keys(ignore_keys_file):
+class FilelistCache:
     """
-    This function reads in the ignore_keys and analysis_runs files and returns the dictionaries
+    Workflow scoped cache for the filelist resolution, every Snakemake job asks
+    for the same few calibration runs so results are computed once per
+    invocation. Hits and misses are counted per kind of query.
     """
-    ignore_keys = []
-
-    if ignore_keys_file is not None:
-        if Path(ignore_keys_file).is_file():
-            if Path(ignore_keys_file).suffix in (".json", ".yaml", ".yml"):
-                ignore_keys = Props.read_from(ignore_keys_file)
-            elif Path(ignore_keys_file).suffix == ".keylist":
-                with Path(ignore_keys_file).open() as f:
-                    ignore_keys = f.read().splitlines()
-                ignore_keys = [  # remove any comments in the keylist
-                    key.split("#")[0].strip() if "#" in key else key.strip() for key in ignore_keys
-                ]
-
-            else:
-                msg = "ignore_keys_file file not in json, yaml or keylist format"
-                raise ValueError(msg)
 
+    def __init__(self):
+        self.results = {}
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get(self, kind, key, func):
+        key = (kind, *key)
+        if key in self.results:
+            self.hits[kind] += 1
         else:
-            msg = f"no ignore_keys file found: {ignore_keys_file}"
-            raise ValueError(msg)
+            self.misses[kind] += 1
+            self.results[key] = func()
+        return self.results[key]
+
+    def clear(self):
+        self.results.clear()
+        self.hits.clear()
+        self.misses.clear()
+
+    def info(self):
+        kinds = sorted(set(self.hits) | set(self.misses))
+        return "\n".join(
+            f"{kind}: {self.hits[kind]} hits, {self.misses[kind]} misses" for kind in kinds
+        )
 
-    return ignore_keys
+
+filelist_cache = FilelistCache()
+
+
+def _file_state(file):
+    """
+    Identifies a file and its version for the cache keys
+    """
+    if file is None:
+        return None, None
+    try:
+        return str(file), Path(file).stat().st_mtime_ns
+    except OSError:
+        return str(file), None
+
+
+def get_ignored_keys(ignore_keys_file):
+    """
+    This function reads in the ignore_keys file and returns a dictionary of section
+    to compiled KeyMatcher, the result is cached for the invocation as long as the
+    file is not modified
+    """
+    return filelist_cache.get(
+        "ignored_keys",
+        _file_state(ignore_keys_file),
+        lambda: _read_ignored_keys(ignore_keys_file),
+    )
+
+
+def _read_ignored_keys(ignore_keys_file):
+    if ignore_keys_file is None:
+        return {}
+    return load_ignore_keys(ignore_keys_file)
 
 
 def get_keys(
@@ -83,73 +126,99 @@ def build_filelist(
 ):
     """
     This function builds the filelist for the given filekeys, search pattern
-    and tier. It will ignore any keys in the ignore_keys list and only include
-    the keys specified in the analysis_runs dict.
+    and tier. It will ignore any keys matched by the ignore_keys sections, given
+    either as read from the ignore file or compiled with compile_ignore_keys.
     """
-    # the ignore_keys dictionary organizes keys in sections, gather all the
-    # section contents in a single list
-    if ignore_keys is not None:
-        if tier in ("raw"):
-            ignore_keys = ignore_keys.get("unprocessable", [])
-        else:
-            _ignore_keys = ignore_keys.get("removed", [])
-            _ignore_keys += ignore_keys.get("unprocessable", [])
-            ignore_keys = sorted(_ignore_keys)
-    else:
-        ignore_keys = []
+    # the ignore_keys dictionary organizes keys in sections, the raw tier only
+    # skips the unprocessable ones
+    if ignore_keys is None:
+        ignore_keys = {}
+    elif not isinstance(ignore_keys, dict) or not all(
+        isinstance(matcher, KeyMatcher) for matcher in ignore_keys.values()
+    ):
+        ignore_keys = compile_ignore_keys(ignore_keys)
+    ignore_sections = ("unprocessable",) if tier == "raw" else ("removed", "unprocessable")
+    matchers = [ignore_keys[section] for section in ignore_sections if section in ignore_keys]
 
     fn_pattern = get_pattern(config, tier)
+    fn_template = get_file_pattern(fn_pattern)
+    file_index = get_file_index(file_index_path(config), get_scanner(config))
     filenames = []
 
-    for key in filekeys:
-        if not isinstance(search_pattern, list):
-            search_pattern = [search_pattern]
-        for _search_pat in search_pattern:
-            if Path(_search_pat).suffix == ".*":
-                search_pat = Path(_search_pat).with_suffix(".{ext}")
-            else:
-                search_pat = _search_pat
-            fn_glob_pattern = key.get_path_from_filekey(search_pat, ext="*")[0]
-            files = glob.glob(fn_glob_pattern)
-
-            for f in files:
-                _key = FileKey.get_filekey_from_pattern(f, search_pat)
-                if _key.name in ignore_keys:
-                    pass
+    if not isinstance(search_pattern, list):
+        search_pattern = [search_pattern]
+    search_pats = [
+        (
+            Path(_search_pat).with_suffix(".{ext}")
+            if Path(_search_pat).suffix == ".*"
+            else _search_pat
+        )
+        for _search_pat in search_pattern
+    ]
+    # glob all keys at once so the directory listings are fanned out together
+    globs = [
+        (search_pat, key.get_path_from_filekey(search_pat, ext="*")[0])
+        for key in filekeys
+        for search_pat in search_pats
+    ]
+    globbed = file_index.glob_many(fn_glob_pattern for _, fn_glob_pattern in globs)
+
+    for (search_pat, _), files in zip(globs, globbed, strict=True):
+        keys = FileKey.get_filekeys_from_pattern(files, search_pat)
+        kept = [
+            (f, _key)
+            for f, _key in zip(files, keys, strict=True)
+            if not any(_key.name in matcher for matcher in matchers)
+        ]
+
+        if tier == "daq":
+            for f, _key in kept:
+                filenames += FileKey.get_path_from_filekey(
+                    _key, fn_pattern.with_suffix("".join(Path(f).suffixes))
+                )
+        elif tier == "daq_compress":
+            for f, _key in kept:
+                if Path(f).suffix == ".orca":
+                    filenames += FileKey.get_path_from_filekey(
+                        _key, fn_pattern.with_suffix(".orca.bz2")
+                    )
                 else:
-                    if tier == "daq":
-                        filename = FileKey.get_path_from_filekey(
-                            _key, fn_pattern.with_suffix("".join(Path(f).suffixes))
-                        )
-                    elif tier == "daq_compress":
-                        if Path(f).suffix == ".orca":
-                            filename = FileKey.get_path_from_filekey(
-                                _key, fn_pattern.with_suffix(".orca.bz2")
-                            )
-                        else:
-                            filename = FileKey.get_path_from_filekey(
-                                _key, fn_pattern.with_suffix("".join(Path(f).suffixes))
-                            )
-                    else:
-                        filename = FileKey.get_path_from_filekey(_key, fn_pattern)
-
-                    filenames += filename
+                    filenames += FileKey.get_path_from_filekey(
+                        _key, fn_pattern.with_suffix("".join(Path(f).suffixes))
+                    )
+        else:
+            filenames += fn_template.render_many(_key for _, _key in kept)
 
+    file_index.save()
     return sorted(filenames)
 
 
+def _cached_filelist(kind, keypart, config, search_pattern, tier, ignore_keys_file):
+    key = (
+        FileKey.parse_keypart(keypart).name,
+        tier,
+        str(search_pattern),
+        *_file_state(ignore_keys_file),
+    )
+
+    def resolve():
+        return build_filelist(
+            config,
+            get_keys(keypart),
+            search_pattern,
+            tier,
+            get_ignored_keys(ignore_keys_file),
+        )
+
+    # callers may modify the returned list
+    return list(filelist_cache.get(kind, key, resolve))
+
+
 def get_filelist(wildcards, config, search_pattern, ignore_keys_file=None):
     # remove the file selection from the keypart
     keypart = f"-{wildcards.label.split('-', 1)[1]}"
-    ignore_keys = get_ignored_keys(ignore_keys_file)
-    filekeys = get_keys(keypart)
-
-    return build_filelist(
-        config,
-        filekeys,
-        search_pattern,
-        wildcards.tier,
-        ignore_keys,
+    return _cached_filelist(
+        "filelist", keypart, config, search_pattern, wildcards.tier, ignore_keys_file
     )
 
 
@@ -161,14 +230,6 @@ def get_filelist_full_wildcards(
     ignore_keys_file=None,
 ):
     keypart = f"-{wildcards.experiment}-{wildcards.detector}-{wildcards.campaign}-{wildcards.measurement}-{wildcards.run}"
-
-    ignore_keys = get_ignored_keys(ignore_keys_file)
-
-    filekeys = get_keys(keypart)
-    return build_filelist(
-        config,
-        filekeys,
-        search_pattern,
-        tier,
-        ignore_keys,
+    return _cached_filelist(
+        "filelist_full_wildcards", keypart, config, search_pattern, tier, ignore_keys_file
     )
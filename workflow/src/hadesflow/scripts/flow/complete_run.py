@@ -12,6 +12,8 @@ from legenddataflowscripts.workflow import as_ro, execenv_pyexe
 from legenddataflowscripts.workflow.execenv import _execenv2str
 from dbetto import Props
 from hadesflow.methods.FileKey import FileKey
+from hadesflow.methods.DirScanner import get_scanner
+from hadesflow.methods.FileIndex import FileIndex
 
 from snakemake.script import snakemake  # snakemake > 8.16
 
@@ -84,9 +86,10 @@ def check_log_files(log_path, output_file, gen_output, warning_file=None):
             Path(path).rmdir()
 
 
-def find_gen_runs(gen_tier_path):
-    # first look for non-concat tiers
-    paths = gen_tier_path.glob("*/*/*/*")
+def find_gen_runs(gen_tier_path, scanner=None):
+    # first look for non-concat tiers, the levels are listed concurrently,
+    # hidden directories are included as with Path.glob
+    paths = FileIndex(scanner=scanner).glob(str(gen_tier_path / "*/*/*/*"), include_hidden=True)
     # use the directories to build a tier/detector/campaign/measurement string
     return {"/".join(str(p).split("/")[-3:]) for p in paths}
 
@@ -98,7 +101,7 @@ def build_file_dbs(gen_tier_path, outdir, ignore_keys_file=None):
     outdir = Path(outdir)
 
     # find generated directories
-    runs = find_gen_runs(gen_tier_path)
+    runs = find_gen_runs(gen_tier_path, get_scanner(snakemake.params.config))
 
     if not runs:
         print(f"WARNING: did not find any processed runs in {gen_tier_path}")
@@ -0,0 +1,64 @@
+# ruff: noqa: T201
+"""
+Writing and checking of the content fingerprints of the outputs (see
+hadesflow/methods/fingerprints.py). The rules write the fingerprints of their
+outputs when the job ends, the check lists the outputs whose inputs, config
+files or packages changed since. With --mark these are set older than their
+inputs, so the next Snakemake run rebuilds them, and with --align-mtimes the
+up to date outputs older than their inputs (e.g. after a par file was written
+again with the same content) are set as new as them, so it does not.
+"""
+
+import argparse
+
+from hadesflow.methods.fingerprints import (
+    align_mtimes,
+    check_outputs,
+    find_outputs,
+    mark_stale,
+    write_fingerprint,
+)
+
+
+def hades_fingerprint(argv=None):
+    argparser = argparse.ArgumentParser()
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+
+    write = subparsers.add_parser("write", help="write the fingerprints of the outputs of a job")
+    write.add_argument("--outputs", help="output files", nargs="+", required=True)
+    write.add_argument("--inputs", help="input files", nargs="*", default=[])
+    write.add_argument("--configs", help="config files", nargs="*", default=[])
+
+    check = subparsers.add_parser("check", help="list the stale outputs")
+    check.add_argument("paths", help="output files or directories to search", nargs="+")
+    check.add_argument("--mark", help="mark the stale outputs for rebuild", action="store_true")
+    check.add_argument(
+        "--align-mtimes",
+        help="set the up to date outputs as new as their inputs",
+        action="store_true",
+    )
+    check.add_argument("--verbose", help="print the reasons", action="store_true")
+    args = argparser.parse_args(argv)
+
+    if args.command == "write":
+        write_fingerprint(args.outputs, args.inputs, args.configs)
+        return
+
+    results = check_outputs(find_outputs(args.paths))
+    stale = [output for output, reasons in results.items() if reasons]
+    missing = [output for output, reasons in results.items() if reasons is None]
+    for output in stale:
+        print(f"stale: {output}")
+        if args.verbose:
+            for reason in results[output]:
+                print(f"    {reason}")
+    for output in missing:
+        print(f"no fingerprint: {output}")
+    if args.mark:
+        for output in stale:
+            mark_stale(output)
+    aligned = align_mtimes(results) if args.align_mtimes else []
+    print(
+        f"{len(results)} outputs: {len(stale)} stale{' (marked)' if args.mark else ''}, "
+        f"{len(missing)} without fingerprint, {len(aligned)} with aligned mtimes"
+    )
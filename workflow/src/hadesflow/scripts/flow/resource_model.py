@@ -0,0 +1,184 @@
+# ruff: noqa: T201
+"""
+Harvesting of the benchmark records into the resource model (see
+hadesflow/methods/ResourceModel.py) and the report of its accuracy. The records
+are appended to a history next to the model file, each benchmark file is read
+once, and the model is fitted again to the whole history.
+
+The report compares, per rule, the resources the jobs requested when they ran
+with the ones the current model requests for them: the utilisation of the
+requested runtime and memory (memory weighted by the runtime), the fraction of
+jobs exceeding the request (which the cluster kills) and the median relative
+error, and lists the utilisation per workflow invocation.
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+
+from hadesflow.methods.ResourceModel import ResourceModel, read_benchmark
+
+
+def history_path(model_file):
+    return Path(model_file).with_suffix(".history.jsonl")
+
+
+def read_history(model_file):
+    try:
+        with history_path(model_file).open() as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def update_resource_model(benchmark_dir, model_file):
+    """
+    Adds the new benchmark records found in benchmark_dir to the history and
+    fits the model again, returns the number of new records
+    """
+    history = read_history(model_file)
+    known = {record["source"] for record in history}
+    benchmark_dir = Path(benchmark_dir)
+    new = []
+    for path in sorted(benchmark_dir.rglob("*.jsonl")):
+        if str(path) in known:
+            continue
+        try:
+            records = read_benchmark(path)
+        except (OSError, ValueError, KeyError):
+            continue
+        # the benchmarks are in a directory per workflow invocation
+        invocation = path.relative_to(benchmark_dir).parts[0]
+        new += [{**record, "source": str(path), "invocation": invocation} for record in records]
+    if not new:
+        return 0
+
+    history_path(model_file).parent.mkdir(parents=True, exist_ok=True)
+    with history_path(model_file).open("a") as f:
+        for record in new:
+            f.write(json.dumps(record) + "\n")
+    model = ResourceModel()
+    model.fit(history + new)
+    model.save(model_file)
+    return len(new)
+
+
+def summarize(records, requested):
+    """
+    Utilisation, fraction exceeded and median relative error of the requests,
+    requested(record) gives the runtime (min) and mem_mb, None where unknown
+    """
+    points = {"runtime": [], "mem": []}
+    for record in records:
+        runtime, mem = requested(record)
+        minutes = record["runtime_s"] / 60
+        if runtime is not None:
+            points["runtime"].append((minutes, runtime, 1))
+        if mem is not None and record["max_rss_mb"] is not None:
+            points["mem"].append((record["max_rss_mb"], mem, minutes))
+
+    stats = {}
+    for name, values in points.items():
+        if not values:
+            stats[name] = None
+            continue
+        errors = sorted(abs(req - used) / max(used, 1e-9) for used, req, _ in values)
+        stats[name] = {
+            "utilisation": sum(used * w for used, _, w in values)
+            / max(sum(req * w for _, req, w in values), 1e-9),
+            "exceeded": sum(used > req for used, req, _ in values) / len(values),
+            "error": errors[len(errors) // 2],
+        }
+    return stats
+
+
+def model_requests(model, margin=True):
+    def requested(record):
+        runtime, rss = (
+            model.predict(
+                record["rule"], record["measurement"], quantity, record["input_mb"], margin
+            )
+            for quantity in ("runtime_s", "max_rss_mb")
+        )
+        if margin:
+            runtime = None if runtime is None else max(1, math.ceil(runtime / 60))
+            rss = None if rss is None else math.ceil(rss)
+        else:
+            runtime = None if runtime is None else runtime / 60
+        return runtime, rss
+
+    return requested
+
+
+def recorded_requests(record):
+    return record["runtime"], record["mem_mb"]
+
+
+def _percent(fraction):
+    return f"{100 * fraction:>6.0f}%" if fraction < 10 else f"{'>999':>6}%"
+
+
+def _format(stats):
+    cells = []
+    for name in ("runtime", "mem"):
+        if stats[name] is None:
+            cells.append(f"{'-':>7} {'-':>7} {'-':>7}")
+        else:
+            cells.append(
+                " ".join(
+                    _percent(stats[name][key]) for key in ("utilisation", "exceeded", "error")
+                )
+            )
+    return " | ".join(cells)
+
+
+def report(model_file):
+    records = read_history(model_file)
+    if not records:
+        return f"no benchmark records for {model_file}"
+    model = ResourceModel(model_file)
+
+    by_rule = {}
+    for record in records:
+        by_rule.setdefault(record["rule"], []).append(record)
+    lines = [
+        f"{'':<48}{'runtime':^23} | {'mem':^23}",
+        f"{'':<41}{'jobs':>6} "
+        + " | ".join(f"{'util':>7} {'exceed':>7} {'error':>7}" for _ in range(2)),
+    ]
+    for rule, rule_records in sorted(by_rule.items()):
+        for label, requested in (
+            ("requested", recorded_requests),
+            ("model", model_requests(model)),
+            ("fit", model_requests(model, margin=False)),
+        ):
+            lines.append(
+                f"{rule if label == 'requested' else '':<30} {label:>9} {len(rule_records):>6} "
+                + _format(summarize(rule_records, requested))
+            )
+
+    lines.append("\nrequested resources per invocation")
+    by_invocation = {}
+    for record in records:
+        by_invocation.setdefault(record["invocation"], []).append(record)
+    for invocation, invocation_records in sorted(by_invocation.items()):
+        lines.append(
+            f"{invocation:<40} {len(invocation_records):>6} "
+            + _format(summarize(invocation_records, recorded_requests))
+        )
+    return "\n".join(lines)
+
+
+def hades_resource_model():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--model", help="resource model file", required=True)
+    argparser.add_argument(
+        "--benchmarks", help="benchmark directories to harvest first", nargs="*", default=[]
+    )
+    args = argparser.parse_args()
+
+    for benchmark_dir in args.benchmarks:
+        n_records = update_resource_model(benchmark_dir, args.model)
+        print(f"{n_records} new records from {benchmark_dir}")
+    print(report(args.model))
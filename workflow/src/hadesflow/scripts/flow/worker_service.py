@@ -0,0 +1,195 @@
+# ruff: noqa: T201
+"""
+Persistent worker service for the tier processing CLIs. The service keeps a pool
+of worker processes with dspeed/pygama imported and the numba kernels loaded, and
+listens on a Unix socket. build-dsp-hades, build-hit-hades and build-dsp-hit-hades
+hand their job to the service if it is running, and run in-process if it is not
+reachable or its worker pool broke while running the job (the pool is then
+replaced). A job failing in a worker fails the CLI with the error of the worker,
+as do replies taking longer than $HADESFLOW_WORKER_TIMEOUT seconds (no limit by
+default).
+
+The service must run in the same software environment as the jobs, e.g.
+
+    dataflow exec -- hades-worker-service --workers 16 &
+
+The protocol is one JSON line per request, {"task": ..., "argv": [...], "cwd": ...},
+answered with one JSON line, {"status": "ok"}, {"status": "error", "error": ...}
+for a failed job or {"status": "broken", "error": ...} for a broken worker pool.
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from hadesflow.methods.props_cache import enable_memory_cache
+
+# entry points run by the workers, they take the CLI arguments
+tasks = {
+    "dsp": ("hadesflow.scripts.tier.dsp", "run_build_dsp"),
+    "hit": ("hadesflow.scripts.tier.hit", "run_build_hit"),
+    "dsp_hit": ("hadesflow.scripts.tier.dsp_hit", "run_build_dsp_hit"),
+}
+
+
+def socket_path():
+    """
+    Path of the service socket, $HADESFLOW_WORKER_SOCKET or a per-user default
+    """
+    if os.getenv("HADESFLOW_WORKER_SOCKET"):
+        return os.getenv("HADESFLOW_WORKER_SOCKET")
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return str(Path(runtime_dir) / f"hadesflow-worker-{os.getuid()}.sock")
+
+
+def worker_timeout():
+    """
+    Timeout of the jobs handed to the service in seconds,
+    $HADESFLOW_WORKER_TIMEOUT, None (no limit) if not set
+    """
+    timeout = os.getenv("HADESFLOW_WORKER_TIMEOUT")
+    return float(timeout) if timeout else None
+
+
+def submit(task, argv, path=None, timeout=None):
+    """
+    Runs the task in the service. Returns False if no service is reachable or
+    its worker pool broke while running the task, the caller then runs
+    in-process. Raises RuntimeError if the task failed in the service and
+    TimeoutError if the reply took longer than timeout seconds (worker_timeout()
+    by default), the job may then still be running in the service.
+    """
+    path = socket_path() if path is None else path
+    timeout = worker_timeout() if timeout is None else timeout
+    if os.getenv("HADESFLOW_NO_WORKER") or not Path(path).exists():
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return False
+    try:
+        with sock, sock.makefile("rw") as f:
+            f.write(json.dumps({"task": task, "argv": list(argv), "cwd": os.getcwd()}) + "\n")
+            f.flush()
+            reply = f.readline()
+    except TimeoutError as e:
+        msg = f"no reply from the worker service at {path} to the {task} job in {timeout} s"
+        raise TimeoutError(msg) from e
+    except OSError:
+        reply = ""
+    if not reply:
+        print(f"WARNING: worker service at {path} closed the connection, running in-process")
+        return False
+    reply = json.loads(reply)
+    if reply["status"] == "broken":
+        print(f"WARNING: worker pool broken running the {task} job, running in-process:")
+        print(reply["error"], flush=True)
+        return False
+    if reply["status"] != "ok":
+        msg = f"{task} job failed in the worker service:\n{reply['error']}"
+        raise RuntimeError(msg)
+    return True
+
+
+def _init_worker():
+    # parameter files are kept in memory while unchanged
+    enable_memory_cache()
+    # the imports and the numba kernels are loaded once per worker
+    for module in ("dspeed.processors", "pygama.hit"):
+        importlib.import_module(module)
+
+
+def _run_task(task, argv, cwd):
+    module, func = tasks[task]
+    os.chdir(cwd)
+    getattr(importlib.import_module(module), func)(argv)
+
+
+def _new_executor(n_workers):
+    return ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def serve(path, n_workers):
+    executor = _new_executor(n_workers)
+    executor_lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            nonlocal executor
+            try:
+                request = json.loads(self.rfile.readline())
+                if request["task"] not in tasks:
+                    msg = f"unknown task {request['task']}"
+                    raise ValueError(msg)
+                pool = executor
+                pool.submit(_run_task, request["task"], request["argv"], request["cwd"]).result()
+                reply = {"status": "ok"}
+            except BrokenProcessPool:
+                # a worker died (e.g. killed for its memory use), the jobs running
+                # in the pool are run in-process by the clients and the next ones
+                # get a new pool
+                with executor_lock:
+                    if executor is pool:
+                        print("WARNING: worker pool broken, starting new workers", flush=True)
+                        executor = _new_executor(n_workers)
+                        pool.shutdown(wait=False)
+                reply = {"status": "broken", "error": traceback.format_exc()}
+            except Exception:
+                # the job failed, the client fails with the error
+                reply = {"status": "error", "error": traceback.format_exc()}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    Path(path).unlink(missing_ok=True)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+    print(f"INFO: worker service with {n_workers} workers listening on {path}", flush=True)
+    # shut down the workers and remove the socket on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Path(path).unlink(missing_ok=True)
+        executor.shutdown(cancel_futures=True)
+
+
+def worker_service():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("--socket", help="socket path", default=None)
+    argparser.add_argument(
+        "--workers",
+        help="number of worker processes",
+        type=int,
+        default=int(os.getenv("HADESFLOW_WORKERS", os.cpu_count())),
+    )
+    args = argparser.parse_args()
+
+    serve(socket_path() if args.socket is None else args.socket, args.workers)
@@ -8,16 +8,11 @@ from datetime import datetime
 from pathlib import Path
 
 import matplotlib as mpl
-import matplotlib.pyplot as plt
 import numpy as np
-import pygama.math.distributions as pgf
-import pygama.math.histogram as pgh
 from dbetto.catalog import Props
 from lgdo import lh5
-from matplotlib.colors import LogNorm
 from pygama.math.distributions import nb_poly
 from pygama.pargen.data_cleaning import get_mode_stdev
-from pygama.pargen.energy_cal import FWHMLinear, FWHMQuadratic, HPGeCalibration
 from pygama.pargen.utils import load_data
 from scipy.stats import binned_statistic
 
@@ -26,6 +21,22 @@ from legenddataflowscripts.utils import (
     convert_dict_np_to_float,
 )
 
+from hadesflow.methods.props_cache import read_props
+from hadesflow.scripts.pars.hit.ecal_am_streaming import streaming_calibration
+
+# bin_baseline and bin_spectrum are plot functions named in the config
+from hadesflow.scripts.pars.hit.ecal_am_utils import (
+    bin_baseline,
+    bin_spectrum,
+    calibrate_energy,
+    energy_guess,
+    guess_histogram,
+    survival_counts,
+    survival_fraction,
+    time_bins,
+    timemap_figure,
+)
+
 mpl.use("agg")
 sto = lh5.LH5Store()
 
@@ -45,40 +56,21 @@ def plot_2614_timemap(
     erange=(2580, 2630),
     dx=1,
     time_dx=180,
+    time_range=None,
 ):
-    plt.rcParams["figure.figsize"] = figsize
-    plt.rcParams["font.size"] = fontsize
-
     selection = data.query(f"{cal_energy_param}>2560&{cal_energy_param}<2660&{selection_string}")
-
-    fig = plt.figure()
-    if len(selection) == 0:
-        pass
-    else:
-        time_bins = np.arange(
-            (np.amin(data["timestamp"]) // time_dx) * time_dx,
-            ((np.amax(data["timestamp"]) // time_dx) + 2) * time_dx,
-            time_dx,
-        )
-
-        plt.hist2d(
-            selection["timestamp"],
-            selection[cal_energy_param],
-            bins=[time_bins, np.arange(erange[0], erange[1] + dx, dx)],
-            norm=LogNorm(),
-        )
-
-    ticks, _ = plt.xticks()
-    plt.xlabel(f"Time starting : {datetime.utcfromtimestamp(ticks[0]).strftime('%d/%m/%y %H:%M')}")
-    plt.ylabel("Energy(keV)")
-    plt.ylim([erange[0], erange[1]])
-
-    plt.xticks(
-        ticks,
-        [datetime.utcfromtimestamp(tick).strftime("%H:%M") for tick in ticks],
+    return timemap_figure(
+        selection["timestamp"],
+        selection[cal_energy_param],
+        [
+            time_bins(data["timestamp"], time_dx, time_range),
+            np.arange(erange[0], erange[1] + dx, dx),
+        ],
+        "Energy(keV)",
+        [erange[0], erange[1]],
+        figsize=figsize,
+        fontsize=fontsize,
     )
-    plt.close()
-    return fig
 
 
 def get_median(x):
@@ -99,21 +91,17 @@ def bin_stability(
     selection_string,
     time_slice=180,
     energy_range=(2585, 2660),
+    time_range=None,
 ):
     selection = data.query(
         f"{cal_energy_param}>{energy_range[0]}&{cal_energy_param}<{energy_range[1]}&{selection_string}"
     )
 
-    utime_array = data["timestamp"]
     select_energies = selection[cal_energy_param].to_numpy()
 
-    time_bins = np.arange(
-        (np.amin(utime_array) // time_slice) * time_slice,
-        ((np.amax(utime_array) // time_slice) + 2) * time_slice,
-        time_slice,
-    )
+    bins = time_bins(data["timestamp"], time_slice, time_range)
     # bin time values
-    times_average = (time_bins[:-1] + time_bins[1:]) / 2
+    times_average = (bins[:-1] + bins[1:]) / 2
 
     if len(selection) == 0:
         return {
@@ -123,34 +111,15 @@ def bin_stability(
         }
 
     par_average, _, _ = binned_statistic(
-        selection["timestamp"], select_energies, statistic=get_median, bins=time_bins
+        selection["timestamp"], select_energies, statistic=get_median, bins=bins
     )
     par_error, _, _ = binned_statistic(
-        selection["timestamp"], select_energies, statistic=get_err, bins=time_bins
+        selection["timestamp"], select_energies, statistic=get_err, bins=bins
     )
 
     return {"time": times_average, "energy": par_average, "spread": par_error}
 
 
-def bin_spectrum(
-    data,
-    cal_energy_param,
-    selection_string,
-    cut_field="is_valid_cal",
-    erange=(0, 3000),
-    dx=0.5,
-):
-    bins = np.arange(erange[0], erange[1] + dx, dx)
-    return {
-        "bins": pgh.get_bin_centers(bins),
-        "counts": np.histogram(data.query(selection_string)[cal_energy_param], bins)[0],
-        "cut_counts": np.histogram(
-            data.query(f"(~{cut_field})")[cal_energy_param],
-            bins,
-        )[0],
-    }
-
-
 def bin_survival_fraction(
     data,
     cal_energy_param,
@@ -159,16 +128,9 @@ def bin_survival_fraction(
     erange=(0, 3000),
     dx=6,
 ):
-    counts_pass, bins_pass, _ = pgh.get_hist(
-        data.query(selection_string)[cal_energy_param],
-        bins=np.arange(erange[0], erange[1] + dx, dx),
+    return survival_fraction(
+        survival_counts(data, cal_energy_param, selection_string, cut_field, erange, dx)
     )
-    counts_fail, _, _ = pgh.get_hist(
-        data.query(f"(~{cut_field})")[cal_energy_param],
-        bins=np.arange(erange[0], erange[1] + dx, dx),
-    )
-    sf = 100 * (counts_pass + 10 ** (-6)) / (counts_pass + counts_fail + 10 ** (-6))
-    return {"bins": pgh.get_bin_centers(bins_pass), "sf": sf}
 
 
 def plot_baseline_timemap(
@@ -180,52 +142,28 @@ def plot_baseline_timemap(
     n_spread=5,
     time_dx=180,
 ):
-    plt.rcParams["figure.figsize"] = figsize
-    plt.rcParams["font.size"] = fontsize
-
-    time_bins = np.arange(
-        (np.amin(data["timestamp"]) // time_dx) * time_dx,
-        ((np.amax(data["timestamp"]) // time_dx) + 2) * time_dx,
-        time_dx,
-    )
-
     mean = np.nanpercentile(data[parameter], 50)
     spread = mean - np.nanpercentile(data[parameter], 10)
-    fig = plt.figure()
-    plt.hist2d(
+    return timemap_figure(
         data["timestamp"],
         data[parameter],
-        bins=[
-            time_bins,
+        [
+            time_bins(data["timestamp"], time_dx),
             np.arange(mean - n_spread * spread, mean + n_spread * spread + dx, dx),
         ],
-        norm=LogNorm(),
-    )
-
-    ticks, _ = plt.xticks()
-    plt.xlabel(f"Time starting : {datetime.utcfromtimestamp(ticks[0]).strftime('%d/%m/%y %H:%M')}")
-    plt.ylabel("Baseline Value")
-    plt.ylim([mean - n_spread * spread, mean + n_spread * spread])
-
-    plt.xticks(
-        ticks,
-        [datetime.utcfromtimestamp(tick).strftime("%H:%M") for tick in ticks],
+        "Baseline Value",
+        [mean - n_spread * spread, mean + n_spread * spread],
+        figsize=figsize,
+        fontsize=fontsize,
     )
-    plt.close()
-    return fig
 
 
 def bin_bl_stability(data, time_slice=180, parameter="bl_mean"):
-    utime_array = data["timestamp"]
     select_bls = data[parameter].to_numpy()
 
-    time_bins = np.arange(
-        (np.amin(utime_array) // time_slice) * time_slice,
-        ((np.amax(utime_array) // time_slice) + 2) * time_slice,
-        time_slice,
-    )
+    bins = time_bins(data["timestamp"], time_slice)
     # bin time values
-    times_average = (time_bins[:-1] + time_bins[1:]) / 2
+    times_average = (bins[:-1] + bins[1:]) / 2
 
     def nanmedian(x):
         return np.nanpercentile(x, 50) if len(x) >= 10 else np.nan
@@ -234,24 +172,13 @@ def bin_bl_stability(data, time_slice=180, parameter="bl_mean"):
         return np.nanvar(x) / np.sqrt(len(x)) if len(x) >= 10 else np.nan
 
     par_average, _, _ = binned_statistic(
-        data["timestamp"], select_bls, statistic=nanmedian, bins=time_bins
-    )
-    par_error, _, _ = binned_statistic(
-        data["timestamp"], select_bls, statistic=error, bins=time_bins
+        data["timestamp"], select_bls, statistic=nanmedian, bins=bins
     )
+    par_error, _, _ = binned_statistic(data["timestamp"], select_bls, statistic=error, bins=bins)
 
     return {"time": times_average, "baseline": par_average, "spread": par_error}
 
 
-def bin_baseline(data, parameter="bl_mean-baseline", dx=1, bl_range=None):
-    if bl_range is None:
-        bl_range = [-500, 500]
-    par_array = data.eval(parameter)
-    bins = np.arange(bl_range[0], bl_range[1], dx)
-    bl_array, bins, _ = pgh.get_hist(par_array, bins=bins)
-    return {"bl_array": bl_array, "bins": (bins[1:] + bins[:-1]) / 2}
-
-
 def baseline_tracking_plots(files, lh5_path, plot_options=None):
     if plot_options is None:
         plot_options = {}
@@ -274,6 +201,21 @@ def monitor_parameters(files, lh5_path, parameters):
     return out_dict
 
 
+def calibration_plots(ecal, e_uncal, option_plots):
+    """
+    The plots of the calibration of one energy parameter, with the plots of the
+    plot options
+    """
+    if np.isnan(ecal.pars).all():
+        return {}
+    return {
+        "fwhm_fit": ecal.plot_eres_fit(e_uncal),
+        "cal_fit": ecal.plot_cal_fit(e_uncal),
+        "peak_fits": ecal.plot_fits(e_uncal),
+        **option_plots,
+    }
+
+
 def get_results_dict(ecal_class, data, cal_energy_param, selection_string):  # noqa : ARG001
     if np.isnan(ecal_class.pars).all():
         return {}
@@ -345,7 +287,7 @@ def par_geds_hit_ecal_am() -> None:
     log = build_log(args.log_config, args.log)
 
     if args.in_hit_dict:
-        hit_dict = Props.read_from(args.in_hit_dict)
+        hit_dict = read_props(args.in_hit_dict)
         in_results_dict = hit_dict.get("results", {})
         hit_dict = hit_dict.get("operations", hit_dict)
 
@@ -355,7 +297,7 @@ def par_geds_hit_ecal_am() -> None:
         if Path(par_file).suffix in (".json", ".yml", ".yaml")
     ]
 
-    database_dic = Props.read_from(db_files)
+    database_dic = read_props(db_files)
 
     if args.channel and args.channel in database_dic:
         database_dic = database_dic[args.channel]
@@ -377,28 +319,6 @@ def par_geds_hit_ecal_am() -> None:
         files = f.read().splitlines()
     files = sorted(files)
 
-    # load data in
-    data, _ = load_data(
-        files,
-        args.table_name,
-        hit_dict,
-        params=[
-            *kwarg_dict["energy_params"],
-            kwarg_dict["cut_param"],
-            "timestamp",
-            "trapTmax",
-        ],
-        threshold=kwarg_dict["threshold"],
-        return_selection_mask=True,
-        cal_energy_param="trapTmax",
-    )
-
-    pk_pars = [
-        (59.5409, (5, 5), pgf.hpge_peak),
-    ]
-
-    glines = [pk_par[0] for pk_par in pk_pars]
-
     if "cal_energy_params" not in kwarg_dict:
         cal_energy_params = [energy_param + "_cal" for energy_param in kwarg_dict["energy_params"]]
     else:
@@ -409,135 +329,124 @@ def par_geds_hit_ecal_am() -> None:
     results_dict = {}
     plot_dict = {}
     full_object_dict = {}
-
-    for energy_param, cal_energy_param in zip(
-        kwarg_dict["energy_params"], cal_energy_params, strict=False
-    ):
-        e_uncal = data.query(selection_string)[energy_param].to_numpy()
-
-        if len(e_uncal) > 0:
-            if isinstance(e_uncal[0], np.ndarray | list):
-                e_uncal = np.concatenate([arr for arr in e_uncal if len(arr) > 0])
-            hist, bins, _ = pgh.get_hist(
-                e_uncal[
-                    (e_uncal > np.nanpercentile(e_uncal, 1))
-                    & (e_uncal < np.nanpercentile(e_uncal, 99.9))
-                ],
-                dx=1,
-                range=[
-                    np.nanpercentile(e_uncal, 1),
-                    np.nanpercentile(e_uncal, 99.9),
-                ],
-            )
-        else:
-            msg = f"e_uncal should not be empty! energy_param: {energy_param}"
-            raise ValueError(msg)
-
-        guess = 59.5409 / bins[np.nanargmax(hist)]
-        full_object_dict[cal_energy_param] = HPGeCalibration(
-            energy_param,
-            glines,
-            guess,
-            kwarg_dict.get("deg", 0),
-            debug_mode=kwarg_dict.get("debug_mode", False) | args.debug,
+    option_plots = {}
+
+    if kwarg_dict.get("streaming", False):
+        streamed = streaming_calibration(
+            files,
+            args.table_name,
+            hit_dict,
+            kwarg_dict,
+            cal_energy_params,
+            plot_options=kwarg_dict.get("plot_options", {}) if args.plot_path else {},
+            bl_plot_options=bl_plots if args.plot_path else {},
+            det_status=args.det_status,
+            debug=args.debug,
         )
-        full_object_dict[cal_energy_param].hpge_get_energy_peaks(
-            e_uncal,
-            etol_kev=2 if args.det_status == "on" else 5,
+        full_object_dict = streamed["calibrations"]
+        option_plots = streamed["plots"]
+        if args.plot_path:
+            for cal_energy_param, ecal in full_object_dict.items():
+                plot_dict[cal_energy_param] = calibration_plots(
+                    ecal, streamed["e_uncal"][cal_energy_param], option_plots[cal_energy_param]
+                )
+        del streamed["e_uncal"]
+    else:
+        # load data in
+        data, _ = load_data(
+            files,
+            args.table_name,
+            hit_dict,
+            params=[
+                *kwarg_dict["energy_params"],
+                kwarg_dict["cut_param"],
+                "timestamp",
+                "trapTmax",
+            ],
+            threshold=kwarg_dict["threshold"],
+            return_selection_mask=True,
+            cal_energy_param="trapTmax",
         )
-        if 59.5409 not in full_object_dict[cal_energy_param].peaks_kev:
-            full_object_dict[cal_energy_param] = HPGeCalibration(
+
+        for energy_param, cal_energy_param in zip(
+            kwarg_dict["energy_params"], cal_energy_params, strict=False
+        ):
+            e_uncal = data.query(selection_string)[energy_param].to_numpy()
+
+            if len(e_uncal) > 0:
+                if isinstance(e_uncal[0], np.ndarray | list):
+                    e_uncal = np.concatenate([arr for arr in e_uncal if len(arr) > 0])
+                hist, bins, _ = guess_histogram(
+                    e_uncal, np.nanpercentile(e_uncal, 1), np.nanpercentile(e_uncal, 99.9)
+                )
+            else:
+                msg = f"e_uncal should not be empty! energy_param: {energy_param}"
+                raise ValueError(msg)
+
+            full_object_dict[cal_energy_param] = calibrate_energy(
+                e_uncal,
                 energy_param,
-                glines,
-                guess,
-                kwarg_dict.get("deg", 0),
-                debug_mode=kwarg_dict.get("debug_mode", False),
+                energy_guess(hist, bins),
+                kwarg_dict,
+                args.det_status,
+                args.debug,
             )
-            full_object_dict[cal_energy_param].hpge_get_energy_peaks(
-                e_uncal, etol_kev=5 if args.det_status == "on" else 30, n_sigma=2
-            )
-        full_object_dict[cal_energy_param].hpge_fit_energy_peaks(
-            e_uncal,
-            peaks_kev=[59.5409],
-            peak_pars=pk_pars,
-            tail_weight=kwarg_dict.get("tail_weight", 0),
-            n_events=kwarg_dict.get("n_events", None),
-            allowed_p_val=kwarg_dict.get("p_val", 0),
-            update_cal_pars=True,
-            bin_width_kev=0.1,
-        )
 
-        full_object_dict[cal_energy_param].get_energy_res_curve(
-            FWHMLinear,
-        )
-        full_object_dict[cal_energy_param].get_energy_res_curve(
-            FWHMQuadratic,
-        )
+            energy = data[energy_param].to_numpy()
+            if isinstance(energy[0], np.ndarray | list):
+                energy = np.concatenate(energy)
 
-        energy = data[energy_param].to_numpy()
-        if isinstance(energy[0], np.ndarray | list):
-            energy = np.concatenate(energy)
+            if len(energy) < len(data):
+                log.warning("len(energy) and len(data) are not the same")
+                energy = np.pad(energy, (0, len(data) - len(energy)), constant_values=np.nan)
 
-        if len(energy) < len(data):
-            log.warning("len(energy) and len(data) are not the same")
-            energy = np.pad(energy, (0, len(data) - len(energy)), constant_values=np.nan)
+            if len(data) < len(energy):
+                energy = energy[: len(data)]
 
-        if len(data) < len(energy):
-            energy = energy[: len(data)]
+            data[cal_energy_param] = nb_poly(energy, full_object_dict[cal_energy_param].pars)
 
-        data[cal_energy_param] = nb_poly(energy, full_object_dict[cal_energy_param].pars)
+            option_plots[cal_energy_param] = {}
+            if (
+                args.plot_path
+                and ~np.isnan(full_object_dict[cal_energy_param].pars).all()
+                and "plot_options" in kwarg_dict
+            ):
+                for key, item in kwarg_dict["plot_options"].items():
+                    if item["options"] is not None:
+                        option_plots[cal_energy_param][key] = item["function"](
+                            data,
+                            cal_energy_param,
+                            selection_string,
+                            **item["options"],
+                        )
+                    else:
+                        option_plots[cal_energy_param][key] = item["function"](
+                            data,
+                            cal_energy_param,
+                            selection_string,
+                        )
+            # the energies of the parameter are freed once its plots are made
+            if args.plot_path:
+                plot_dict[cal_energy_param] = calibration_plots(
+                    full_object_dict[cal_energy_param], e_uncal, option_plots[cal_energy_param]
+                )
+            del e_uncal, energy
+        del data
 
+    for cal_energy_param, ecal in full_object_dict.items():
         results_dict[cal_energy_param] = get_results_dict(
-            full_object_dict[cal_energy_param], data, cal_energy_param, selection_string
+            ecal, None, cal_energy_param, selection_string
         )
 
-        hit_dict.update({cal_energy_param: full_object_dict[cal_energy_param].gen_pars_dict()})
+        hit_dict.update({cal_energy_param: ecal.gen_pars_dict()})
 
-        if args.plot_path:
-            param_plot_dict = {}
-            if ~np.isnan(full_object_dict[cal_energy_param].pars).all():
-                param_plot_dict["fwhm_fit"] = full_object_dict[cal_energy_param].plot_eres_fit(
-                    e_uncal
-                )
-                param_plot_dict["cal_fit"] = full_object_dict[cal_energy_param].plot_cal_fit(
-                    e_uncal
-                )
-                param_plot_dict["peak_fits"] = full_object_dict[cal_energy_param].plot_fits(
-                    e_uncal
-                )
-
-                if "plot_options" in kwarg_dict:
-                    for key, item in kwarg_dict["plot_options"].items():
-                        if item["options"] is not None:
-                            param_plot_dict[key] = item["function"](
-                                data,
-                                cal_energy_param,
-                                selection_string,
-                                **item["options"],
-                            )
-                        else:
-                            param_plot_dict[key] = item["function"](
-                                data,
-                                cal_energy_param,
-                                selection_string,
-                            )
-            plot_dict[cal_energy_param] = param_plot_dict
-
-        for peak_dict in (
-            full_object_dict[cal_energy_param]
-            .results["hpge_fit_energy_peaks"]["peak_parameters"]
-            .values()
-        ):
+        for peak_dict in ecal.results["hpge_fit_energy_peaks"]["peak_parameters"].values():
             peak_dict["function"] = peak_dict["function"].name
             peak_dict["parameters"] = peak_dict["parameters"].to_dict()
             peak_dict["uncertainties"] = peak_dict["uncertainties"].to_dict()
 
         if args.det_status != "on":
-            for peak_dict in (
-                full_object_dict[cal_energy_param]
-                .results["hpge_cal_energy_peak_tops"]["peak_parameters"]
-                .values()
-            ):
+            for peak_dict in ecal.results["hpge_cal_energy_peak_tops"]["peak_parameters"].values():
                 peak_dict["function"] = peak_dict["function"].name
                 peak_dict["parameters"] = peak_dict["parameters"].to_dict()
                 peak_dict["uncertainties"] = peak_dict["uncertainties"].to_dict()
@@ -566,16 +475,22 @@ def par_geds_hit_ecal_am() -> None:
             hit_dict.update(extra_block)
 
     if "monitoring_parameters" in kwarg_dict:
-        monitor_dict = monitor_parameters(
-            files, args.table_name, kwarg_dict["monitoring_parameters"]
-        )
+        if kwarg_dict.get("streaming", False):
+            monitor_dict = streamed["monitoring_parameters"]
+        else:
+            monitor_dict = monitor_parameters(
+                files, args.table_name, kwarg_dict["monitoring_parameters"]
+            )
         results_dict.update({"monitoring_parameters": monitor_dict})
 
     # get baseline plots and save all plots to file
     if args.plot_path:
-        common_dict = baseline_tracking_plots(
-            sorted(files), args.table_name, plot_options=bl_plots
-        )
+        if kwarg_dict.get("streaming", False):
+            common_dict = streamed["baseline_plots"]
+        else:
+            common_dict = baseline_tracking_plots(
+                sorted(files), args.table_name, plot_options=bl_plots
+            )
 
         for plot in list(common_dict):
             if plot not in common_plots:
@@ -0,0 +1,568 @@
+"""
+Streaming mode of par-geds-hit-ecal-am, enabled with ``streaming: true`` in its
+config, for runs too large to load at once. The files are read ``buffer_len``
+rows at a time (default 100000) in two passes, three with plots:
+
+1. quantile sketches (see hadesflow/methods/QuantileSketch.py, relative accuracy
+   ``sketch_accuracy``, default 1e-3) of the energies, baselines and monitored
+   parameters, and the time ranges of the run
+2. the 1 unit histograms of the energies between their sketched 1% and 99.9%
+   quantiles giving the guesses, the events around the 59.5 keV peak, which the
+   peak search and the unbinned fit run on as in memory, and the histograms of
+   the baselines and the monitored parameters
+3. the spectra, survival fractions and the rows selected by the time maps, with
+   the calibrated energies
+
+The memory taken is the one of a chunk, of the histograms and of the events
+around the peak. Compared with the in-memory mode:
+
+- the edges of the guess histograms come from the sketched quantiles, so the
+  guesses can move by one unit, the peak search and the fit run on the same
+  events and the calibrations agree within their uncertainties
+- the spectra, survival fractions, baseline histograms and time maps of the
+  calibrated energies are identical
+- the ranges of the baseline time maps and the medians of the baseline
+  stability are within sketch_accuracy of their distance to the run median
+- the modes and widths of the monitored parameters are within about a bin of
+  the histograms get_mode_stdev fits
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pygama.math.histogram as pgh
+from lgdo import Array, lh5
+from lgdo.lh5 import LH5Iterator
+from pygama.math.binned_fitting import gauss_mode_width_max
+from pygama.math.distributions import nb_poly
+
+from hadesflow.methods.QuantileSketch import QuantileSketch
+from hadesflow.scripts.pars.hit.ecal_am_utils import (
+    am_peak,
+    bin_baseline,
+    bin_spectrum,
+    calibrate_energy,
+    energy_guess,
+    guess_histogram,
+    survival_counts,
+    survival_fraction,
+    time_bins,
+    timemap_figure,
+)
+
+# the events kept around the peak estimate, and the range around the final peak
+# position they must cover: the peak search histogram spans 0.9-1.1 of it and
+# the fit +-5 keV around the peak found
+window = (0.75, 1.35)
+needed_window = (0.8, 1.25)
+# the plot options the streaming mode computes
+streamed_plots = {"bin_spectrum", "bin_survival_fraction", "plot_2614_timemap", "bin_stability"}
+streamed_bl_plots = {"plot_baseline_timemap", "bin_bl_stability", "bin_baseline"}
+
+
+def _column(table, name, n_rows):
+    column = table[name]
+    if not isinstance(column, Array) or column.nda.ndim != 1:
+        msg = f"streaming mode needs scalar columns, {name} is a {type(column).__name__}"
+        raise ValueError(msg)
+    return column.nda[:n_rows]
+
+
+def read_chunks(files, lh5_path, hit_dict, params, raw_params=(), buffer_len=100000):
+    """
+    Yields the table buffer_len rows at a time, as a dataframe of the params
+    with the hit_dict operations evaluated (as pygama's load_data) and one of
+    the raw_params as stored in the files
+    """
+    file_keys = {key.split("/")[-1] for key in lh5.ls(files[0], lh5_path.rstrip("/") + "/")}
+    cal_keys = {
+        name
+        for info in hit_dict.values()
+        for name in compile(info["expression"], "0vbb is real!", "eval").co_names
+    } & file_keys
+    params = set(params)
+    raw_params = set(raw_params) & file_keys
+    fields = cal_keys | (file_keys & params) | raw_params
+    params &= fields | set(hit_dict)
+
+    for table in LH5Iterator(files, lh5_path, field_mask=fields, buffer_len=buffer_len):
+        n_rows = len(table)
+        raw = pd.DataFrame({name: _column(table, name, n_rows) for name in raw_params})
+        for outname, info in hit_dict.items():
+            table[outname] = table.eval(info["expression"], info.get("parameters", None))
+        data = pd.DataFrame({name: _column(table, name, n_rows) for name in params})
+        yield data, raw
+
+
+def _extend(time_range, timestamps):
+    if len(timestamps) > 0:
+        time_range[0] = min(time_range[0], np.nanmin(timestamps))
+        time_range[1] = max(time_range[1], np.nanmax(timestamps))
+
+
+def _centre(values):
+    values = np.asarray(values, dtype=np.float64)
+    return float(np.nanmedian(values)) if np.any(~np.isnan(values)) else 0
+
+
+class SummedCounts:
+    """
+    A histogram function of the plots applied to each chunk, its entries other
+    than the bins summed, and passed to finish at the end
+    """
+
+    def __init__(self, function, *args, finish=None, **options):
+        self.function = function
+        self.args = args
+        self.finish = finish
+        self.options = options
+        self.counts = None
+
+    def add(self, data):
+        counts = self.function(data, *self.args, **self.options)
+        if self.counts is None:
+            self.counts = counts
+        else:
+            for key, value in counts.items():
+                if key != "bins":
+                    self.counts[key] = self.counts[key] + value
+
+    def result(self):
+        return self.counts if self.finish is None else self.finish(self.counts)
+
+
+class SelectedRows:
+    """
+    A time map of the calibrated energies on the rows in the energy range it
+    selects, with the time range of the run
+    """
+
+    def __init__(
+        self, function, cal_energy_param, selection_string, energies, time_range, options
+    ):
+        self.function = function
+        self.args = (cal_energy_param, selection_string)
+        self.energies = energies
+        self.options = dict(options, time_range=tuple(time_range))
+        self.rows = []
+
+    def add(self, data):
+        energy = data[self.args[0]]
+        self.rows.append(data[(energy > self.energies[0]) & (energy < self.energies[1])].copy())
+
+    def result(self):
+        return self.function(pd.concat(self.rows, ignore_index=True), *self.args, **self.options)
+
+
+def option_plot(item, cal_energy_param, selection_string, time_range):
+    """
+    The accumulator of an energy plot option (one of streamed_plots)
+    """
+    name = item["function"].__name__
+    options = item["options"] or {}
+    if name == "bin_spectrum":
+        return SummedCounts(bin_spectrum, cal_energy_param, selection_string, **options)
+    if name == "bin_survival_fraction":
+        return SummedCounts(
+            survival_counts,
+            cal_energy_param,
+            selection_string,
+            finish=survival_fraction,
+            **options,
+        )
+    if name == "plot_2614_timemap":
+        return SelectedRows(
+            item["function"],
+            cal_energy_param,
+            selection_string,
+            (2560, 2660),
+            time_range,
+            options,
+        )
+    return SelectedRows(
+        item["function"],
+        cal_energy_param,
+        selection_string,
+        options.get("energy_range", (2585, 2660)),
+        time_range,
+        options,
+    )
+
+
+class BaselineTimemap:
+    """
+    plot_baseline_timemap from the 2d histogram of the chunks, the baseline range
+    from the sketched quantiles
+    """
+
+    def __init__(
+        self,
+        sketches,
+        time_range,
+        figsize=(8, 6),
+        fontsize=12,
+        parameter="bl_mean",
+        dx=1,
+        n_spread=5,
+        time_dx=180,
+    ):
+        mean = sketches[parameter].percentile(50)
+        spread = mean - sketches[parameter].percentile(10)
+        self.parameter = parameter
+        self.figure = {"figsize": figsize, "fontsize": fontsize}
+        self.limits = [mean - n_spread * spread, mean + n_spread * spread]
+        self.bins = [
+            time_bins(None, time_dx, time_range),
+            np.arange(self.limits[0], self.limits[1] + dx, dx),
+        ]
+        self.counts = np.zeros((len(self.bins[0]) - 1, len(self.bins[1]) - 1))
+
+    def add(self, raw):
+        self.counts += np.histogram2d(raw["timestamp"], raw[self.parameter], bins=self.bins)[0]
+
+    def result(self):
+        times, values = np.meshgrid(*map(pgh.get_bin_centers, self.bins), indexing="ij")
+        filled = self.counts > 0
+        return timemap_figure(
+            times[filled],
+            values[filled],
+            self.bins,
+            "Baseline Value",
+            self.limits,
+            weights=self.counts[filled],
+            **self.figure,
+        )
+
+
+class BaselineStability:
+    """
+    bin_bl_stability from a sketch and the moments of the baselines per time bin
+    """
+
+    def __init__(self, sketches, time_range, time_slice=180, parameter="bl_mean"):
+        self.parameter = parameter
+        self.relative_accuracy = sketches[parameter].relative_accuracy
+        self.offset = sketches[parameter].percentile(50)
+        self.bins = time_bins(None, time_slice, time_range)
+        n_bins = len(self.bins) - 1
+        # rows (NaNs too, as the in-memory statistics count them), values and
+        # sums of the values minus the offset
+        self.n_rows = np.zeros(n_bins)
+        self.n_values = np.zeros(n_bins)
+        self.sum = np.zeros(n_bins)
+        self.sum2 = np.zeros(n_bins)
+        self.sketches = {}
+
+    def add(self, raw):
+        n_bins = len(self.bins) - 1
+        index = np.searchsorted(self.bins, raw["timestamp"].to_numpy(), side="right") - 1
+        values = raw[self.parameter].to_numpy(dtype=np.float64) - self.offset
+        inside = (index >= 0) & (index < n_bins)
+        self.n_rows += np.bincount(index[inside], minlength=n_bins)
+        valid = inside & ~np.isnan(values)
+        index, values = index[valid], values[valid]
+        self.n_values += np.bincount(index, minlength=n_bins)
+        self.sum += np.bincount(index, values, minlength=n_bins)
+        self.sum2 += np.bincount(index, values**2, minlength=n_bins)
+
+        order = np.argsort(index, kind="stable")
+        bin_ids, starts = np.unique(index[order], return_index=True)
+        for bin_id, bin_values in zip(bin_ids, np.split(values[order], starts[1:])):
+            if bin_id not in self.sketches:
+                self.sketches[bin_id] = QuantileSketch(self.relative_accuracy)
+            self.sketches[bin_id].add(bin_values)
+
+    def result(self):
+        filled = self.n_rows >= 10
+        baseline = np.full(len(self.n_rows), np.nan)
+        spread = np.full(len(self.n_rows), np.nan)
+        for bin_id in np.flatnonzero(filled):
+            if bin_id in self.sketches:
+                baseline[bin_id] = self.offset + self.sketches[bin_id].percentile(50)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = self.sum / self.n_values
+            variance = np.maximum(self.sum2 / self.n_values - mean**2, 0)
+        spread[filled] = variance[filled] / np.sqrt(self.n_rows[filled])
+        return {
+            "time": (self.bins[:-1] + self.bins[1:]) / 2,
+            "baseline": baseline,
+            "spread": spread,
+        }
+
+
+def baseline_plot(item, sketches, time_range):
+    """
+    The accumulator of a baseline plot option (one of streamed_bl_plots)
+    """
+    name = item["function"].__name__
+    options = item["options"] or {}
+    if name == "plot_baseline_timemap":
+        return BaselineTimemap(sketches, time_range, **options)
+    if name == "bin_bl_stability":
+        return BaselineStability(sketches, time_range, **options)
+    return SummedCounts(bin_baseline, **options)
+
+
+class MonitoredParameter:
+    """
+    get_mode_stdev from a histogram of the values between the sketched 1% and
+    99% quantiles, in bins of a tenth of the finest width it uses, the
+    percentiles of the values between them from the sketch of all values
+    """
+
+    max_bins = 10**6
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.offset = sketch.offset
+        low, high = sketch.percentile(1), sketch.percentile(99)
+        self.bin_width = self.percentile(55) - self.percentile(50)
+        self.dx = self.percentile(52) - self.percentile(50)
+        widths = [width for width in (self.bin_width, self.dx) if width > 0]
+        fine = max(min(widths, default=(high - low) / 1000) / 10, (high - low) / self.max_bins)
+        self.edges = np.arange(low, high + fine, fine) if high > low else np.array([low, high])
+        self.counts = np.zeros(len(self.edges) - 1)
+        self.moments = np.zeros(3)
+
+    def percentile(self, p):
+        # percentile of the values between the 1% and 99% quantiles
+        return self.sketch.quantile(0.01 + 0.98 * p / 100)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[(values > self.edges[0]) & (values < self.edges[-1])]
+        self.counts += np.histogram(values, self.edges)[0]
+        values = values - self.offset
+        self.moments += [len(values), np.sum(values), np.sum(values**2)]
+
+    def _histogram(self, dx, hist_range):
+        counts, bins, _ = pgh.get_hist(
+            pgh.get_bin_centers(self.edges), range=hist_range, dx=dx, wts=self.counts
+        )
+        return counts, bins
+
+    def result(self):
+        n_values, total, total2 = self.moments
+        if n_values == 0:
+            return {"mode": np.nan, "stdev": np.nan}
+        std = np.sqrt(max(total2 / n_values - (total / n_values) ** 2, 0))
+        low, high = self.edges[0], self.edges[-1]
+        bin_width = self.bin_width if self.bin_width != 0 else std / 4
+
+        counts, bins = self._histogram(bin_width, (low, high))
+        mu = bins[np.argmax(counts)]
+        try:
+            guess_sig = pgh.get_fwhm(counts, bins)[0] / 2.355
+            lower_bound = mu - 10 * guess_sig
+            upper_bound = mu + 10 * guess_sig
+        except Exception:
+            lower_bound = self.percentile(5)
+            upper_bound = self.percentile(95)
+        if not low <= lower_bound <= high:
+            lower_bound = low
+        if not low <= upper_bound <= high:
+            upper_bound = high
+
+        dx = self.dx if self.dx != 0 else bin_width
+        try:
+            counts, bins = self._histogram(dx, (lower_bound, upper_bound))
+            bin_centres = pgh.get_bin_centers(bins)
+            fwhm = pgh.get_fwhm(counts, bins)[0]
+            mean = float(bin_centres[np.argmax(counts)])
+            pars, _ = gauss_mode_width_max(
+                counts,
+                bins,
+                mode_guess=mean,
+                n_bins=20,
+                cost_func="Least Squares",
+                inflate_errors=False,
+                gof_method="var",
+            )
+            mean = pars[0]
+            stdev = fwhm / 2.355
+            if (
+                mean < np.nanmin(bins)
+                or mean > np.nanmax(bins)
+                or (mean + stdev) < mu
+                or (mean - stdev) > mu
+            ):
+                raise IndexError
+        except IndexError:
+            try:
+                fwhm = pgh.get_fwhm(counts, bins)[0]
+                mean = float(bin_centres[np.argmax(counts)])
+                stdev = fwhm / 2.355
+            except Exception:
+                counts, bins = self._histogram(dx, (self.percentile(5), self.percentile(95)))
+                bin_centres = pgh.get_bin_centers(bins)
+                mean = float(bin_centres[np.argmax(counts)])
+                try:
+                    stdev = pgh.get_fwhm(counts, bins)[0] / 2.355
+                except Exception:
+                    stdev = std
+        return {"mode": mean, "stdev": stdev}
+
+
+def _window(e_uncal, peak):
+    return e_uncal[(e_uncal > window[0] * peak) & (e_uncal < window[1] * peak)]
+
+
+def streaming_calibration(
+    files,
+    lh5_path,
+    hit_dict,
+    kwarg_dict,
+    cal_energy_params,
+    plot_options=None,
+    bl_plot_options=None,
+    det_status="on",
+    debug=False,
+):
+    """
+    The calibrations of the energy params reading the files in chunks, with the
+    events around the peak they were fit on, the energy and baseline plots and
+    the modes and widths of the monitored parameters
+    """
+    plot_options = plot_options or {}
+    bl_plot_options = bl_plot_options or {}
+    for options, supported in (
+        (plot_options, streamed_plots),
+        (bl_plot_options, streamed_bl_plots),
+    ):
+        for item in options.values():
+            if item["function"].__name__ not in supported:
+                msg = f"plot option {item['function'].__name__} is not supported in streaming mode"
+                raise ValueError(msg)
+    energy_params = kwarg_dict["energy_params"]
+    selection_string = f"{kwarg_dict['cut_param']}"
+    accuracy = kwarg_dict.get("sketch_accuracy", 1e-3)
+    monitored = list(kwarg_dict.get("monitoring_parameters", []))
+    sketched = [*monitored, *(["bl_mean", "baseline"] if bl_plot_options else [])]
+
+    def chunks():
+        for data, raw in read_chunks(
+            files,
+            lh5_path,
+            hit_dict,
+            [*energy_params, kwarg_dict["cut_param"], "timestamp", "trapTmax"],
+            ["timestamp", *sketched],
+            kwarg_dict.get("buffer_len", 100000),
+        ):
+            yield data[data["trapTmax"] > kwarg_dict["threshold"]].reset_index(drop=True), raw
+
+    # pass 1: quantile sketches and time ranges
+    energy_sketches = {param: QuantileSketch(accuracy) for param in energy_params}
+    sketches = {}
+    t_data = [np.inf, -np.inf]
+    t_all = [np.inf, -np.inf]
+    for data, raw in chunks():
+        selected = data.query(selection_string)
+        for param, sketch in energy_sketches.items():
+            sketch.add(selected[param])
+        _extend(t_data, data["timestamp"])
+        _extend(t_all, raw["timestamp"])
+        for param in set(sketched) & set(raw):
+            if param not in sketches:
+                sketches[param] = QuantileSketch(accuracy, offset=_centre(raw[param]))
+            sketches[param].add(raw[param])
+
+    for param, sketch in energy_sketches.items():
+        if sketch.count == 0:
+            msg = f"e_uncal should not be empty! energy_param: {param}"
+            raise ValueError(msg)
+
+    # pass 2: guess histograms, events around the peak, baselines and monitoring
+    ranges = {
+        param: (sketch.percentile(1), sketch.percentile(99.9))
+        for param, sketch in energy_sketches.items()
+    }
+    peaks = {param: sketch.mode(*ranges[param]) for param, sketch in energy_sketches.items()}
+    histograms = {}
+    windows = {param: [] for param in energy_params}
+    baseline_plots = {
+        key: baseline_plot(item, sketches, t_all) for key, item in bl_plot_options.items()
+    }
+    monitors = {param: MonitoredParameter(sketches[param]) for param in monitored}
+    for data, raw in chunks():
+        selected = data.query(selection_string)
+        for param in energy_params:
+            e_uncal = selected[param].to_numpy()
+            hist, bins, _ = guess_histogram(e_uncal, *ranges[param])
+            if param in histograms:
+                hist = hist + histograms[param][0]
+            histograms[param] = (hist, bins)
+            windows[param].append(_window(e_uncal, peaks[param]))
+        for accumulator in baseline_plots.values():
+            accumulator.add(raw)
+        for param, monitor in monitors.items():
+            monitor.add(raw[param])
+
+    guesses = {param: energy_guess(*histograms[param]) for param in energy_params}
+    # collect the events again around the guessed peaks the estimate missed
+    missed = [
+        param
+        for param in energy_params
+        if window[0] * peaks[param] > needed_window[0] * am_peak / guesses[param]
+        or window[1] * peaks[param] < needed_window[1] * am_peak / guesses[param]
+    ]
+    if missed:
+        for param in missed:
+            peaks[param] = am_peak / guesses[param]
+            windows[param] = []
+        for data, _ in chunks():
+            selected = data.query(selection_string)
+            for param in missed:
+                windows[param].append(_window(selected[param].to_numpy(), peaks[param]))
+
+    calibrations = {}
+    e_uncals = {}
+    for energy_param, cal_energy_param in zip(energy_params, cal_energy_params, strict=False):
+        e_uncals[cal_energy_param] = np.concatenate(windows[energy_param])
+        calibrations[cal_energy_param] = calibrate_energy(
+            e_uncals[cal_energy_param],
+            energy_param,
+            guesses[energy_param],
+            kwarg_dict,
+            det_status,
+            debug,
+        )
+
+    # pass 3: plots of the calibrated energies
+    calibrated = {
+        energy_param: cal_energy_param
+        for energy_param, cal_energy_param in zip(energy_params, cal_energy_params, strict=False)
+        if ~np.isnan(calibrations[cal_energy_param].pars).all()
+    }
+    option_plots = {
+        cal_energy_param: {
+            key: option_plot(item, cal_energy_param, selection_string, t_data)
+            for key, item in plot_options.items()
+        }
+        for cal_energy_param in calibrated.values()
+    }
+    if plot_options and calibrated:
+        for data, _ in chunks():
+            for energy_param, cal_energy_param in calibrated.items():
+                data[cal_energy_param] = nb_poly(
+                    data[energy_param].to_numpy(), calibrations[cal_energy_param].pars
+                )
+            for accumulators in option_plots.values():
+                for accumulator in accumulators.values():
+                    accumulator.add(data)
+
+    return {
+        "calibrations": calibrations,
+        "e_uncal": e_uncals,
+        "plots": {
+            cal_energy_param: {
+                key: accumulator.result()
+                for key, accumulator in option_plots.get(cal_energy_param, {}).items()
+            }
+            for cal_energy_param in cal_energy_params
+        },
+        "baseline_plots": {
+            key: accumulator.result() for key, accumulator in baseline_plots.items()
+        },
+        "monitoring_parameters": {param: monitor.result() for param, monitor in monitors.items()},
+    }
@@ -0,0 +1,161 @@
+"""
+Helpers of par-geds-hit-ecal-am shared by its in-memory mode (ecal_am.py) and
+its streaming mode (ecal_am_streaming.py): the time bins and maps, the binned
+spectra and survival fractions, and the guess and fit of the 59.5 keV peak.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pygama.math.distributions as pgf
+import pygama.math.histogram as pgh
+from matplotlib.colors import LogNorm
+from pygama.pargen.energy_cal import FWHMLinear, FWHMQuadratic, HPGeCalibration
+
+
+def time_bins(timestamps, time_dx, time_range=None):
+    """
+    Time bins of width time_dx covering the timestamps, or time_range if given
+    """
+    t_min, t_max = (np.amin(timestamps), np.amax(timestamps)) if time_range is None else time_range
+    return np.arange((t_min // time_dx) * time_dx, ((t_max // time_dx) + 2) * time_dx, time_dx)
+
+
+def timemap_figure(times, values, bins, ylabel, ylim, weights=None, figsize=(8, 6), fontsize=12):
+    plt.rcParams["figure.figsize"] = figsize
+    plt.rcParams["font.size"] = fontsize
+
+    fig = plt.figure()
+    if len(times) > 0:
+        plt.hist2d(times, values, bins=bins, weights=weights, norm=LogNorm())
+
+    ticks, _ = plt.xticks()
+    plt.xlabel(f"Time starting : {datetime.utcfromtimestamp(ticks[0]).strftime('%d/%m/%y %H:%M')}")
+    plt.ylabel(ylabel)
+    plt.ylim(ylim)
+
+    plt.xticks(
+        ticks,
+        [datetime.utcfromtimestamp(tick).strftime("%H:%M") for tick in ticks],
+    )
+    plt.close()
+    return fig
+
+
+def bin_spectrum(
+    data,
+    cal_energy_param,
+    selection_string,
+    cut_field="is_valid_cal",
+    erange=(0, 3000),
+    dx=0.5,
+):
+    bins = np.arange(erange[0], erange[1] + dx, dx)
+    return {
+        "bins": pgh.get_bin_centers(bins),
+        "counts": np.histogram(data.query(selection_string)[cal_energy_param], bins)[0],
+        "cut_counts": np.histogram(
+            data.query(f"(~{cut_field})")[cal_energy_param],
+            bins,
+        )[0],
+    }
+
+
+def survival_counts(
+    data,
+    cal_energy_param,
+    selection_string,
+    cut_field="is_valid_cal",
+    erange=(0, 3000),
+    dx=6,
+):
+    counts_pass, bins_pass, _ = pgh.get_hist(
+        data.query(selection_string)[cal_energy_param],
+        bins=np.arange(erange[0], erange[1] + dx, dx),
+    )
+    counts_fail, _, _ = pgh.get_hist(
+        data.query(f"(~{cut_field})")[cal_energy_param],
+        bins=np.arange(erange[0], erange[1] + dx, dx),
+    )
+    return {"bins": bins_pass, "pass": counts_pass, "fail": counts_fail}
+
+
+def survival_fraction(counts):
+    sf = 100 * (counts["pass"] + 10 ** (-6)) / (counts["pass"] + counts["fail"] + 10 ** (-6))
+    return {"bins": pgh.get_bin_centers(counts["bins"]), "sf": sf}
+
+
+def bin_baseline(data, parameter="bl_mean-baseline", dx=1, bl_range=None):
+    if bl_range is None:
+        bl_range = [-500, 500]
+    par_array = data.eval(parameter)
+    bins = np.arange(bl_range[0], bl_range[1], dx)
+    bl_array, bins, _ = pgh.get_hist(par_array, bins=bins)
+    return {"bl_array": bl_array, "bins": (bins[1:] + bins[:-1]) / 2}
+
+
+am_peak = 59.5409
+pk_pars = [
+    (am_peak, (5, 5), pgf.hpge_peak),
+]
+glines = [pk_par[0] for pk_par in pk_pars]
+
+
+def guess_histogram(e_uncal, low, high):
+    """
+    The 1 unit histogram of the energies between low and high (the 1% and 99.9%
+    quantiles), its highest bin is the guess of the 59.5 keV peak
+    """
+    return pgh.get_hist(e_uncal[(e_uncal > low) & (e_uncal < high)], dx=1, range=[low, high])
+
+
+def energy_guess(hist, bins):
+    return am_peak / bins[np.nanargmax(hist)]
+
+
+def calibrate_energy(e_uncal, energy_param, guess, kwarg_dict, det_status="on", debug=False):
+    """
+    Finds and fits the 59.5 keV peak in the uncalibrated energies, starting from
+    the guess of keV per unit, returns the HPGeCalibration
+    """
+    ecal = HPGeCalibration(
+        energy_param,
+        glines,
+        guess,
+        kwarg_dict.get("deg", 0),
+        debug_mode=kwarg_dict.get("debug_mode", False) | debug,
+    )
+    ecal.hpge_get_energy_peaks(
+        e_uncal,
+        etol_kev=2 if det_status == "on" else 5,
+    )
+    if am_peak not in ecal.peaks_kev:
+        ecal = HPGeCalibration(
+            energy_param,
+            glines,
+            guess,
+            kwarg_dict.get("deg", 0),
+            debug_mode=kwarg_dict.get("debug_mode", False),
+        )
+        ecal.hpge_get_energy_peaks(e_uncal, etol_kev=5 if det_status == "on" else 30, n_sigma=2)
+    ecal.hpge_fit_energy_peaks(
+        e_uncal,
+        peaks_kev=[am_peak],
+        peak_pars=pk_pars,
+        tail_weight=kwarg_dict.get("tail_weight", 0),
+        n_events=kwarg_dict.get("n_events", None),
+        allowed_p_val=kwarg_dict.get("p_val", 0),
+        update_cal_pars=True,
+        bin_width_kev=0.1,
+    )
+
+    ecal.get_energy_res_curve(
+        FWHMLinear,
+    )
+    ecal.get_energy_res_curve(
+        FWHMQuadratic,
+    )
+    return ecal
@@ -1,13 +1,9 @@
-from dspeed import build_dsp
 import argparse
-from dbetto import Props
+import json
+import sys
 
-from legenddataflowscripts.utils import (
-    build_log,
-)
 
-
-def build_dsp_hades():
+def _parse_args(argv=None):
     # CLI config
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
@@ -17,28 +13,250 @@ def build_dsp_hades():
     argparser.add_argument("--log-config", help="log config file")
 
     argparser.add_argument("--settings", help="settings", required=False, nargs="*")
+    argparser.add_argument(
+        "--write-profile", help="LH5 write profile (JSON)", type=json.loads, default={}
+    )
 
     argparser.add_argument("--database", help="database file for HPGes", nargs="*", default=[])
     argparser.add_argument("--input", help="input file")
+    argparser.add_argument(
+        "--daq-input", help="DAQ file, the raw input is built from it on scratch", default=None
+    )
+    argparser.add_argument("--raw-config", help="raw output specification for --daq-input")
+    argparser.add_argument(
+        "--raw-write-profile",
+        help="LH5 write profile of the raw file",
+        type=json.loads,
+        default={},
+    )
+    argparser.add_argument("--scratch", help="directory of the raw file, default $TMPDIR")
 
     argparser.add_argument("--output", help="output file")
-    args = argparser.parse_args()
+    argparser.add_argument(
+        "--tuning-cache", help="buffer_len and block_width tuned by tune-dsp-hades", default=None
+    )
+    argparser.add_argument(
+        "--n-workers",
+        help="processes the raw table is sharded over, overrides n_workers of the settings",
+        type=int,
+        default=None,
+    )
+    argparser.add_argument(
+        "--in-process", help="do not hand the job to the worker service", action="store_true"
+    )
+    args = argparser.parse_args(argv)
+    if (args.input is None) == (args.daq_input is None):
+        argparser.error("one of --input and --daq-input is needed")
+    if args.daq_input is not None and args.raw_config is None:
+        argparser.error("--daq-input needs --raw-config")
+    return args
+
+
+def run_build_dsp(argv):
+    args = _parse_args(argv)
+
+    # heavy imports only once the arguments are validated
+    from contextlib import nullcontext
+    from pathlib import Path
+
+    from legenddataflowscripts.utils import build_log
+
+    from hadesflow.methods.props_cache import read_props
+    from hadesflow.scripts.tier.raw import scratch_raw_file
 
     build_log(args.log_config, args.log)
 
-    db = Props.read_from(args.database)
-    proc_chain = Props.read_from(args.processing_chain)
+    db = read_props(args.database)
+    proc_chain = read_props(args.processing_chain)
+
+    settings_dict = read_props(args.settings) if args.settings else {}
+    if args.n_workers is not None:
+        settings_dict = {**settings_dict, "n_workers": args.n_workers}
+    if args.daq_input is not None:
+        # the raw file only lives on node-local scratch for this job
+        raw_input = scratch_raw_file(
+            args.daq_input,
+            args.raw_config,
+            Path(args.output).name.replace("tier_dsp", "tier_raw"),
+            scratch=args.scratch,
+            profile=args.raw_write_profile,
+        )
+    else:
+        raw_input = nullcontext(args.input)
+    with raw_input as raw_file:
+        _build_dsp_file(
+            raw_file,
+            args.output,
+            proc_chain,
+            db,
+            settings_dict,
+            args.write_profile,
+            args.tuning_cache,
+        )
+
+
+def _build_dsp_file(raw_file, dsp_file, proc_chain, db, settings_dict, profile, tuning_cache):
+    import logging
+
+    from dspeed import build_dsp
 
-    settings_dict = Props.read_from(args.settings) if args.settings else {}
+    from hadesflow.scripts.tier.dsp_tuning import tuned_settings
 
+    if tuning_cache is not None and (
+        "buffer_len" not in settings_dict or "block_width" not in settings_dict
+    ):
+        # values from tune-dsp-hades, the settings take precedence
+        settings_dict = {**tuned_settings(proc_chain, raw_file, tuning_cache), **settings_dict}
+
+    buffer_len = settings_dict.get("buffer_len", 1000)
+    block_width = settings_dict.get("block_width", 16)
+    n_workers = settings_dict.get("n_workers", 1)
+    if n_workers > 1:
+        build_dsp_sharded(
+            raw_file,
+            dsp_file,
+            proc_chain,
+            db,
+            n_workers=n_workers,
+            rows_per_shard=settings_dict.get("rows_per_shard", 100 * buffer_len),
+            buffer_len=buffer_len,
+            block_width=block_width,
+            profile=profile,
+        )
+        return
+
+    if profile:
+        # build_dsp takes no write options, the profile is applied by the sharded writer
+        logging.getLogger(__name__).warning(
+            "the dsp write profile is only applied with n_workers > 1 in the settings, "
+            "writing with the lgdo defaults"
+        )
     build_dsp(
-        args.input,
-        args.output,
+        raw_file,
+        dsp_file,
         proc_chain,
         database=db,
         write_mode="r",
-        buffer_len=settings_dict.get("buffer_len", 1000),
-        block_width=settings_dict.get("block_width", 16),
+        buffer_len=buffer_len,
+        block_width=block_width,
         lh5_tables="raw",
         base_group="",
     )
+
+
+def _build_dsp_shard(raw_file, proc_chain, db, i_start, n_entries, buffer_len, block_width):
+    from dspeed import build_dsp
+
+    return build_dsp(
+        raw_file,
+        None,
+        proc_chain,
+        database=db,
+        i_start=i_start,
+        n_entries=n_entries,
+        buffer_len=buffer_len,
+        block_width=block_width,
+        lh5_tables="raw",
+        base_group="",
+    )["dsp"]
+
+
+def build_dsp_sharded(
+    raw_file,
+    dsp_file,
+    proc_chain,
+    db,
+    n_workers,
+    rows_per_shard,
+    buffer_len,
+    block_width,
+    profile=None,
+):
+    """
+    Runs the processing chain on row ranges of the raw table in a process pool
+    and writes the shards in order, in pieces of buffer_len rows as build_dsp
+    does, so the output is the same as the one of the serial run. At most two
+    shards per worker are processed or waiting to be written at a time. With a
+    single worker the shards are processed in this process. The LH5 write
+    profile is applied to the writes.
+    """
+    import multiprocessing
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from pathlib import Path
+
+    from lgdo import lh5
+
+    from hadesflow.methods.write_profiles import apply_profile
+
+    if rows_per_shard < 1:
+        msg = f"rows_per_shard must be positive, got {rows_per_shard}"
+        raise ValueError(msg)
+
+    n_rows = lh5.read_n_rows("raw", raw_file)
+    # shards start at a multiple of buffer_len, as the buffers of the serial run
+    rows_per_shard = -(-rows_per_shard // buffer_len) * buffer_len
+    shards = [
+        (start, min(rows_per_shard, n_rows - start)) for start in range(0, n_rows, rows_per_shard)
+    ]
+
+    Path(dsp_file).unlink(missing_ok=True)
+    store = lh5.LH5Store(keep_open=True)
+
+    def write_shard(start, n_entries, table):
+        h5py_kwargs = apply_profile(table, profile or {})
+        for offset in range(0, n_entries, buffer_len):
+            store.write(
+                obj=table,
+                name="dsp",
+                lh5_file=dsp_file,
+                wo_mode="a",
+                start_row=offset,
+                n_rows=min(buffer_len, n_entries - offset),
+                write_start=start + offset,
+                **h5py_kwargs,
+            )
+
+    max_workers = min(n_workers, len(shards))
+    if max_workers <= 1:
+        for start, n_entries in shards:
+            table = _build_dsp_shard(
+                raw_file, proc_chain, db, start, n_entries, buffer_len, block_width
+            )
+            write_shard(start, n_entries, table)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        pending = deque()
+        for start, n_entries in shards:
+            if len(pending) == 2 * max_workers:
+                start_row, n_rows, done = pending.popleft()
+                write_shard(start_row, n_rows, done.result())
+            future = executor.submit(
+                _build_dsp_shard,
+                raw_file,
+                proc_chain,
+                db,
+                start,
+                n_entries,
+                buffer_len,
+                block_width,
+            )
+            pending.append((start, n_entries, future))
+        while pending:
+            start_row, n_rows, done = pending.popleft()
+            write_shard(start_row, n_rows, done.result())
+
+
+def build_dsp_hades(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = _parse_args(argv)
+    if not args.in_process:
+        from hadesflow.scripts.flow.worker_service import submit
+
+        if submit("dsp", argv):
+            return
+    run_build_dsp(argv)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import sys
+
+
+def _parse_args(argv=None):
+    # CLI config
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "--processing-chain", help="path to dataflow config files", required=True, nargs="*"
+    )
+    argparser.add_argument("--database", help="database file for HPGes", nargs="*", default=[])
+    argparser.add_argument(
+        "--config", help="path to hit dataflow config files", required=True, nargs="*"
+    )
+    argparser.add_argument("--pars", help="path to hit pars files", required=True, nargs="*")
+    argparser.add_argument("--log", help="log file name")
+    argparser.add_argument("--log-config", help="log config file")
+
+    argparser.add_argument("--settings", help="settings", required=False, nargs="*")
+    argparser.add_argument(
+        "--write-profile", help="LH5 write profile (JSON)", type=json.loads, default={}
+    )
+
+    argparser.add_argument("--input", help="raw input file")
+    argparser.add_argument(
+        "--daq-input", help="DAQ file, the raw input is built from it on scratch", default=None
+    )
+    argparser.add_argument("--raw-config", help="raw output specification for --daq-input")
+    argparser.add_argument(
+        "--raw-write-profile",
+        help="LH5 write profile of the raw file",
+        type=json.loads,
+        default={},
+    )
+    argparser.add_argument("--scratch", help="directory of the raw file, default $TMPDIR")
+    argparser.add_argument("--output", help="hit output file")
+    argparser.add_argument("--dsp-output", help="also write the dsp file", default=None)
+    argparser.add_argument(
+        "--in-process", help="do not hand the job to the worker service", action="store_true"
+    )
+    args = argparser.parse_args(argv)
+    if (args.input is None) == (args.daq_input is None):
+        argparser.error("one of --input and --daq-input is needed")
+    if args.daq_input is not None and args.raw_config is None:
+        argparser.error("--daq-input needs --raw-config")
+    return args
+
+
+def run_build_dsp_hit(argv):
+    args = _parse_args(argv)
+
+    # heavy imports only once the arguments are validated
+    from contextlib import nullcontext
+    from pathlib import Path
+
+    from dbetto import Props
+    from legenddataflowscripts.utils import build_log
+
+    from hadesflow.methods.props_cache import read_props
+    from hadesflow.scripts.tier.raw import scratch_raw_file
+
+    log = build_log(args.log_config, args.log)
+
+    db = read_props(args.database)
+    proc_chain = read_props(args.processing_chain)
+    hit_config = read_props(args.config)
+    Props.add_to(hit_config, read_props(args.pars)["pars"])
+
+    settings_dict = read_props(args.settings) if args.settings else {}
+
+    if args.daq_input is not None:
+        # the raw file only lives on node-local scratch for this job
+        raw_input = scratch_raw_file(
+            args.daq_input,
+            args.raw_config,
+            Path(args.output).name.replace("tier_hit", "tier_raw"),
+            scratch=args.scratch,
+            profile=args.raw_write_profile,
+        )
+    else:
+        raw_input = nullcontext(args.input)
+    with raw_input as raw_file:
+        outputs = build_dsp_hit(
+            raw_file,
+            args.output,
+            proc_chain,
+            db,
+            hit_config,
+            dsp_file=args.dsp_output,
+            buffer_len=settings_dict.get("buffer_len", 3200),
+            block_width=settings_dict.get("block_width", 16),
+            profile=args.write_profile,
+        )
+    log.info(f"dsp parameters computed: {', '.join(outputs)}")
+
+
+def _head(table, n_rows):
+    """
+    The first n_rows of the table, the columns are views of the processing
+    chain buffers
+    """
+    from lgdo import Table
+
+    if len(table) == n_rows:
+        return table
+    return Table(
+        col_dict={
+            name: type(column)(nda=column.nda[:n_rows], attrs=dict(column.attrs))
+            for name, column in table.items()
+        }
+    )
+
+
+def build_dsp_hit(
+    raw_file,
+    hit_file,
+    proc_chain,
+    db,
+    hit_config,
+    dsp_file=None,
+    buffer_len=3200,
+    block_width=16,
+    profile=None,
+):
+    """
+    Runs the processing chain on chunks of the raw table and evaluates the hit
+    config on the dsp chunks in memory. The hit output is the one of build-dsp-hades
+    followed by build-hit-hades, the dsp file is only written if dsp_file is
+    given, otherwise only the dsp parameters used by the hit config are
+    computed. Both are written with the LH5 write profile. Returns the dsp
+    parameters computed.
+    """
+    from pathlib import Path
+
+    from dspeed.processing_chain import build_processing_chain
+    from lgdo import lh5
+    from lgdo.lh5 import LH5Iterator
+
+    from hadesflow.methods.write_profiles import apply_profile
+    from hadesflow.scripts.tier.hit import hit_table, reorder_operations, required_columns
+
+    if proc_chain.get("inputs"):
+        msg = "processing chains with auxiliary inputs are not supported in the fused mode"
+        raise ValueError(msg)
+
+    outputs = list(proc_chain["outputs"])
+    if dsp_file is None:
+        needed = required_columns(hit_config, outputs)
+        if needed is not None:
+            outputs = [output for output in outputs if output in needed]
+    operations = reorder_operations(hit_config["operations"])
+
+    lh5_it = LH5Iterator(raw_file, "raw", buffer_len=buffer_len)
+    chain, field_mask, tb_out = build_processing_chain(
+        proc_chain["processors"],
+        next(iter(lh5_it)),
+        db_dict=db,
+        outputs=outputs,
+        block_width=block_width,
+    )
+    lh5_it.reset_field_mask(field_mask)
+    h5py_kwargs = apply_profile(tb_out, profile or {})
+
+    if dsp_file is not None:
+        Path(dsp_file).unlink(missing_ok=True)
+        dsp_store = lh5.LH5Store(keep_open=True)
+    wo_mode = "write_safe"
+    for tb_in in lh5_it:
+        start_row = lh5_it.current_i_entry
+        chain.execute(0, len(tb_in))
+        if dsp_file is not None:
+            dsp_store.write(
+                obj=tb_out,
+                name="dsp",
+                lh5_file=dsp_file,
+                wo_mode="a",
+                write_start=start_row,
+                n_rows=len(tb_in),
+                **h5py_kwargs,
+            )
+        hit_tbl = hit_table(_head(tb_out, len(tb_in)), hit_config, operations)
+        lh5.write(
+            obj=hit_tbl,
+            name="/hit",
+            lh5_file=hit_file,
+            n_rows=len(tb_in),
+            wo_mode=wo_mode,
+            write_start=start_row,
+            **apply_profile(hit_tbl, profile or {}),
+        )
+        wo_mode = "append"
+    return outputs
+
+
+def build_dsp_hit_hades(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = _parse_args(argv)
+    if not args.in_process:
+        from hadesflow.scripts.flow.worker_service import submit
+
+        if submit("dsp_hit", argv):
+            return
+    run_build_dsp_hit(argv)
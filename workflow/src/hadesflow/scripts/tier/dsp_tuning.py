@@ -0,0 +1,229 @@
+# ruff: noqa: T201
+"""
+Tuning of the buffer_len and block_width of build-dsp-hades. tune-dsp-hades runs
+the processing chain on a sample of a raw file for a grid of values, each in a
+fresh process, and records the throughput and the peak RSS. The best values are
+written to a cache keyed by the hash of the processing chain and the waveform
+lengths of the raw table, build-dsp-hades uses them unless the settings give
+buffer_len and block_width.
+
+The cache is paths.dsp_tuning of the dataflow config, tune-dsp-hades writes it
+(--config or --cache) and the build_dsp jobs read it (--tuning-cache).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+default_buffer_lens = (500, 1000, 2000, 4000, 8000)
+default_block_widths = (8, 16, 32, 64)
+
+
+def chain_hash(proc_chain):
+    return hashlib.sha1(json.dumps(proc_chain, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def waveform_lengths(raw_file, table="raw"):
+    """
+    Lengths of the array columns of the raw table, e.g. the waveforms
+    """
+    stat = Path(raw_file).stat()
+    return _waveform_lengths(str(raw_file), table, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=256)
+def _waveform_lengths(raw_file, table, _mtime, _size):
+    import h5py
+
+    lengths = set()
+
+    def visit(_, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim == 2:
+            lengths.add(obj.shape[1])
+
+    with h5py.File(raw_file, "r") as f:
+        f[table].visititems(visit)
+    return tuple(sorted(lengths))
+
+
+def tuning_key(proc_chain, raw_file):
+    return f"{chain_hash(proc_chain)}-{'x'.join(map(str, waveform_lengths(raw_file)))}"
+
+
+def _read_cache(cache_file):
+    try:
+        with Path(cache_file).open() as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@lru_cache(maxsize=16)
+def _tuned_entries(cache_file, _mtime, _size):
+    # chain hash -> waveform lengths part of the key -> (buffer_len, block_width)
+    entries = {}
+    for key, entry in _read_cache(cache_file).items():
+        chain, _, lengths = key.partition("-")
+        entries.setdefault(chain, {})[lengths] = (entry["buffer_len"], entry["block_width"])
+    return entries
+
+
+def tuned_settings(proc_chain, raw_file, cache_file):
+    """
+    Returns the tuned buffer_len and block_width for the processing chain and
+    raw file, an empty dictionary if they were not tuned. The cache is parsed
+    once per modification and the raw file is only opened for the waveform
+    lengths if the processing chain was tuned.
+    """
+    try:
+        stat = Path(cache_file).stat()
+    except OSError:
+        return {}
+    entries = _tuned_entries(str(cache_file), stat.st_mtime_ns, stat.st_size)
+    by_lengths = entries.get(chain_hash(proc_chain))
+    if not by_lengths:
+        return {}
+    entry = by_lengths.get("x".join(map(str, waveform_lengths(raw_file))))
+    if entry is None:
+        return {}
+    return {"buffer_len": entry[0], "block_width": entry[1]}
+
+
+def _benchmark(raw_file, proc_chain, db, n_entries, buffer_len, block_width):
+    import resource
+
+    from dspeed import build_dsp
+
+    kwargs = {
+        "database": db,
+        "buffer_len": buffer_len,
+        "block_width": block_width,
+        "lh5_tables": "raw",
+        "base_group": "",
+    }
+    # the first call compiles the kernels
+    build_dsp(raw_file, None, proc_chain, n_entries=min(n_entries, buffer_len), **kwargs)
+    tic = time.perf_counter()
+    n_rows = len(build_dsp(raw_file, None, proc_chain, n_entries=n_entries, **kwargs)["dsp"])
+    seconds = time.perf_counter() - tic
+    # ru_maxrss is in kB on Linux
+    return n_rows / seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def tune_dsp(
+    raw_file,
+    proc_chain,
+    db=None,
+    n_entries=10000,
+    buffer_lens=default_buffer_lens,
+    block_widths=default_block_widths,
+    max_rss=None,
+):
+    """
+    Benchmarks the grid of buffer_len and block_width, returns the results
+    sorted by throughput and the best one within max_rss (in MB)
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    for buffer_len in buffer_lens:
+        for block_width in block_widths:
+            # a fresh process for each point, so the peak RSS is its own
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                rows_per_s, peak_rss = pool.submit(
+                    _benchmark, raw_file, proc_chain, db, n_entries, buffer_len, block_width
+                ).result()
+            results.append(
+                {
+                    "buffer_len": buffer_len,
+                    "block_width": block_width,
+                    "rows_per_s": round(rows_per_s, 1),
+                    "peak_rss_mb": round(peak_rss, 1),
+                }
+            )
+    results.sort(key=lambda result: result["rows_per_s"], reverse=True)
+    allowed = [r for r in results if max_rss is None or r["peak_rss_mb"] <= max_rss]
+    if not allowed:
+        msg = f"no setting stays below {max_rss} MB peak RSS"
+        raise ValueError(msg)
+    return results, allowed[0]
+
+
+def store_tuning(cache_file, key, best, results):
+    cache_file = Path(cache_file)
+    cache = _read_cache(cache_file)
+    cache[key] = {**best, "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    with tmp_file.open("w") as f:
+        json.dump(cache, f, indent=2)
+    tmp_file.replace(cache_file)
+
+
+def tune_dsp_hades():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument(
+        "--processing-chain", help="path to dataflow config files", required=True, nargs="*"
+    )
+    argparser.add_argument("--database", help="database file for HPGes", nargs="*", default=[])
+    argparser.add_argument("--input", help="raw file to take the sample from", required=True)
+    argparser.add_argument("--rows", help="number of rows in the sample", type=int, default=10000)
+    argparser.add_argument(
+        "--buffer-len", help="buffer_len values", type=int, nargs="+", default=default_buffer_lens
+    )
+    argparser.add_argument(
+        "--block-width",
+        help="block_width values",
+        type=int,
+        nargs="+",
+        default=default_block_widths,
+    )
+    argparser.add_argument("--max-rss", help="peak RSS limit in MB", type=float, default=None)
+    cache_arg = argparser.add_mutually_exclusive_group(required=True)
+    cache_arg.add_argument("--cache", help="tuning cache file", default=None)
+    cache_arg.add_argument(
+        "--config", help="dataflow config, the cache is its paths.dsp_tuning", default=None
+    )
+    args = argparser.parse_args()
+
+    from dbetto import Props
+
+    from hadesflow.methods.paths import dsp_tuning_path
+
+    if args.cache is not None:
+        cache_file = Path(args.cache)
+    else:
+        cache_file = dsp_tuning_path(Props.read_from(args.config, subst_pathvar=True))
+        if cache_file is None:
+            argparser.error(f"no paths.dsp_tuning in {args.config}")
+        cache_file = Path(cache_file)
+
+    proc_chain = Props.read_from(args.processing_chain)
+    db = Props.read_from(args.database)
+
+    results, best = tune_dsp(
+        args.input,
+        proc_chain,
+        db,
+        n_entries=args.rows,
+        buffer_lens=args.buffer_len,
+        block_widths=args.block_width,
+        max_rss=args.max_rss,
+    )
+    print(f"{'buffer_len':>10} {'block_width':>11} {'rows/s':>10} {'peak RSS':>10}")
+    for result in results:
+        print(
+            f"{result['buffer_len']:>10} {result['block_width']:>11} "
+            f"{result['rows_per_s']:>10.0f} {result['peak_rss_mb']:>7.0f} MB"
+        )
+    key = tuning_key(proc_chain, args.input)
+    store_tuning(cache_file, key, best, results)
+    print(
+        f"buffer_len={best['buffer_len']} block_width={best['block_width']} "
+        f"stored in {cache_file} for {key}"
+    )
@@ -1,13 +1,9 @@
-from pygama.hit import build_hit
 import argparse
-from dbetto import Props
+import json
+import sys
 
-from legenddataflowscripts.utils import (
-    build_log,
-)
 
-
-def build_hit_hades():
+def _parse_args(argv=None):
     # CLI config
     argparser = argparse.ArgumentParser()
     argparser.add_argument(
@@ -18,17 +14,245 @@ def build_hit_hades():
     argparser.add_argument("--log-config", help="log config file")
 
     argparser.add_argument("--settings", help="settings", required=False, nargs="*")
+    argparser.add_argument(
+        "--write-profile", help="LH5 write profile (JSON)", type=json.loads, default={}
+    )
+
+    argparser.add_argument(
+        "--prune-columns",
+        help="only read the dsp columns the hit config uses, as prune_columns in the settings",
+        action="store_true",
+    )
 
     argparser.add_argument("--input", help="input file")
     argparser.add_argument("--output", help="output file")
-    args = argparser.parse_args()
+    argparser.add_argument(
+        "--in-process", help="do not hand the job to the worker service", action="store_true"
+    )
+    return argparser.parse_args(argv)
+
+
+def run_build_hit(argv):
+    args = _parse_args(argv)
+
+    # heavy imports only once the arguments are validated
+    from dbetto import Props
+    from legenddataflowscripts.utils import build_log
+    from pygama.hit import build_hit
 
-    build_log(args.log_config, args.log)
+    from hadesflow.methods.props_cache import read_props
 
-    db = Props.read_from(args.config)
-    pars = Props.read_from(args.pars)["pars"]
+    log = build_log(args.log_config, args.log)
+
+    db = read_props(args.config)
+    pars = read_props(args.pars)["pars"]
     Props.add_to(db, pars)
 
-    settings_dict = Props.read_from(args.settings) if args.settings else {}
+    settings_dict = read_props(args.settings) if args.settings else {}
+
+    # opt-in, pygama.hit.build_hit cannot read a subset of the columns
+    if settings_dict.pop("prune_columns", False) or args.prune_columns:
+        skipped = build_hit_pruned(
+            args.input, args.output, db, profile=args.write_profile, **settings_dict
+        )
+        if skipped is not None:
+            log.info(f"dsp columns not read: {', '.join(skipped) or 'none'}")
+            log.info(f"skipped {sum(skipped.values()) / 1e6:.1f} MB of dsp data")
+            return
+
+    if args.write_profile:
+        # pygama.hit.build_hit writes with the lgdo defaults
+        write_hit(args.input, args.output, db, profile=args.write_profile, **settings_dict)
+        return
 
     build_hit(args.input, hit_config=db, outfile=args.output, lh5_tables=["/dsp"], **settings_dict)
+
+
+def _expression_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= _expression_names(const)
+    return names
+
+
+def required_columns(hit_config, columns):
+    """
+    Returns the dsp columns needed by the hit config, the names of the
+    expressions resolved as by Table.eval (nested columns scoped with __), None
+    if all columns are needed (no list of outputs or an invalid expression)
+    """
+    if not isinstance(hit_config.get("outputs"), list):
+        return None
+    names = set(hit_config["outputs"])
+    for info in hit_config.get("operations", {}).values():
+        try:
+            names |= _expression_names(compile(info["expression"], "<hit>", "eval"))
+        except SyntaxError:
+            return None
+    for flags in hit_config.get("aggregations", {}).values():
+        names |= set(flags.values())
+    return {
+        column
+        for column in columns
+        if column in names or any(name.startswith(f"{column}__") for name in names)
+    }
+
+
+def _column_sizes(infile, table):
+    import h5py
+
+    def storage_size(obj):
+        if isinstance(obj, h5py.Dataset):
+            return obj.id.get_storage_size()
+        return sum(storage_size(item) for item in obj.values())
+
+    with h5py.File(infile, "r") as f:
+        return {column: storage_size(obj) for column, obj in f[table].items()}
+
+
+def reorder_operations(operations):
+    """
+    Returns the operations ordered so that each comes before the ones using it,
+    in the order pygama.hit.build_hit evaluates them
+    """
+
+    def one_pass(current):
+        ordered = []
+        for outname in current:
+            idx = 0
+            for name in ordered:
+                if outname in compile(current[name]["expression"], "<hit>", "eval").co_names:
+                    break
+                idx += 1
+            ordered.insert(idx, outname)
+        return {name: current[name] for name in ordered}
+
+    current = dict(operations)
+    while True:
+        reordered = one_pass(current)
+        if list(reordered) == list(current):
+            return reordered
+        current = reordered
+
+
+def hit_table(tbl_obj, hit_config, operations):
+    """
+    Evaluates the hit config on a chunk of the dsp table, as the loop of
+    pygama.hit.build_hit does, operations are given by reorder_operations
+    """
+    import lgdo
+    import numpy as np
+
+    outtbl_obj = lgdo.Table(col_dict=tbl_obj)
+
+    for outname, info in operations.items():
+        outcol = outtbl_obj.eval(info["expression"], info.get("parameters", None))
+        if "lgdo_attrs" in info:
+            outcol.attrs |= info["lgdo_attrs"]
+        outtbl_obj.add_column(outname, outcol)
+
+    for high_lvl_flag, flags in hit_config.get("aggregations", {}).items():
+        flags_list = list(flags.values())
+        n_flags = len(flags_list)
+        if n_flags <= 8:
+            flag_dtype = np.uint8
+        elif n_flags <= 16:
+            flag_dtype = np.uint16
+        elif n_flags <= 32:
+            flag_dtype = np.uint32
+        else:
+            flag_dtype = np.uint64
+        flag_values = outtbl_obj.view_as("pd", cols=flags_list).values.astype(flag_dtype)
+        multiplier = 2 ** np.arange(n_flags, dtype=flag_values.dtype)
+        outtbl_obj.add_field(high_lvl_flag, lgdo.Array(np.dot(flag_values, multiplier)))
+
+    if isinstance(hit_config.get("outputs"), list):
+        for out in hit_config["outputs"]:
+            if out not in outtbl_obj:
+                outtbl_obj.add_column(out, tbl_obj[out])
+        for col in list(outtbl_obj.keys()):
+            if col not in hit_config["outputs"]:
+                outtbl_obj.remove_column(col, delete=True)
+    return outtbl_obj
+
+
+def write_hit(
+    infile,
+    outfile,
+    hit_config,
+    columns=None,
+    table="/dsp",
+    wo_mode="write_safe",
+    buffer_len=3200,
+    profile=None,
+):
+    """
+    pygama.hit.build_hit for one table, reading only the given dsp columns (all
+    if None) and writing with the LH5 write profile. Other options of build_hit
+    are not supported.
+    """
+    from lgdo import lh5
+    from lgdo.lh5 import LH5Iterator
+
+    from hadesflow.methods.write_profiles import apply_profile
+
+    operations = reorder_operations(hit_config["operations"])
+    wo_current = "o" if wo_mode in ("overwrite", "o") else wo_mode
+    field_mask = None if columns is None else sorted(columns)
+    lh5_it = LH5Iterator(infile, table, buffer_len=buffer_len, field_mask=field_mask)
+    for tbl_obj in lh5_it:
+        hit_tbl = hit_table(tbl_obj, hit_config, operations)
+        lh5.write(
+            obj=hit_tbl,
+            name=table.replace("/dsp", "/hit"),
+            lh5_file=outfile,
+            n_rows=len(tbl_obj),
+            wo_mode=wo_current,
+            write_start=lh5_it.current_i_entry,
+            **apply_profile(hit_tbl, profile or {}),
+        )
+        wo_current = "append"
+
+
+def build_hit_pruned(
+    infile,
+    outfile,
+    hit_config,
+    table="/dsp",
+    wo_mode="write_safe",
+    buffer_len=3200,
+    profile=None,
+):
+    """
+    write_hit reading only the dsp columns used by the hit config. Returns the
+    storage size of the columns that were not read, or None (and does nothing)
+    if the config needs all columns.
+    """
+    sizes = _column_sizes(infile, table)
+    columns = required_columns(hit_config, sizes)
+    if columns is None:
+        return None
+
+    write_hit(
+        infile,
+        outfile,
+        hit_config,
+        columns=columns,
+        table=table,
+        wo_mode=wo_mode,
+        buffer_len=buffer_len,
+        profile=profile,
+    )
+    return {column: size for column, size in sizes.items() if column not in columns}
+
+
+def build_hit_hades(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = _parse_args(argv)
+    if not args.in_process:
+        from hadesflow.scripts.flow.worker_service import submit
+
+        if submit("hit", argv):
+            return
+    run_build_hit(argv)
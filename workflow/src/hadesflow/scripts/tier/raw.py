@@ -0,0 +1,46 @@
+import os
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def build_raw_file(in_stream, out_spec, profile=None, **kwargs):
+    """
+    Runs build_raw on a DAQ file with the LH5 write profile applied, kwargs are
+    passed to build_raw (e.g. the filekey)
+    """
+    from daq2lh5 import build_raw
+
+    from hadesflow.methods.write_profiles import hdf5_settings
+
+    build_raw(
+        in_stream,
+        out_spec=out_spec,
+        orig_basename=os.path.splitext(os.path.basename(in_stream))[0],
+        hdf5_settings=hdf5_settings(profile or {}),
+        **kwargs,
+    )
+
+
+@contextmanager
+def scratch_raw_file(in_stream, out_spec, raw_name, scratch=None, profile=None):
+    """
+    Builds the raw file of a DAQ file in a temporary directory on node-local
+    scratch (by default in $TMPDIR) and yields its path, the directory is removed
+    on exit, on errors and on SIGTERM too
+    """
+    import signal
+    import tempfile
+    import threading
+
+    previous = None
+    if threading.current_thread() is threading.main_thread():
+        previous = signal.signal(signal.SIGTERM, lambda *_: sys.exit(128 + signal.SIGTERM))
+    try:
+        with tempfile.TemporaryDirectory(prefix="hadesflow-raw-", dir=scratch) as tmpdir:
+            raw_file = str(Path(tmpdir) / raw_name)
+            build_raw_file(in_stream, out_spec, profile, filekey=raw_file)
+            yield raw_file
+    finally:
+        if previous is not None:
+            signal.signal(signal.SIGTERM, previous)